@@ -1,12 +1,20 @@
-from command import Command, CommType
+import math
+import time
+
+import numpy
+
+from command import CommandEncoder, CommType
 from game_objects.map import Map
-from game_objects.obstacle import Obstacle
-from game_objects.player import Player
-from game_objects.projectile import Projectile
-from game_objects.tank import Tank
+from game_objects.projectile_table import ProjectileTable
+from game_objects.tank_table import TankTable
+from game_state import GameState
+from map_cache import MapCache
+from pathfinding.astar import path_cost
+from pathfinding.theta import smooth_path
+from targeting import TargetAssigner
 
 
-class Algorithm:
+class Algorithm(object):
     """
     Calculates the actions for the current game state.
     TODO: This algorithm only works when the map is small and there are a few number of tanks!
@@ -20,59 +28,273 @@ class Algorithm:
     client_token = ""
     time_remaining = ""
     map = None
-    players = []
+    map_cache = None
+    game_state = None
+    delta = None
+    projectile_table = None
+    table_dtype = numpy.float64
+    tick_budget = None
+    tick_started = None
+    command_filter = None
+    encoder = None
+    path_pool = None
+    incremental = False
+    # Seconds ahead a predicted projectile impact makes a tank dodge
+    DODGE_HORIZON = 1.5
+    # Metres a dodging tank keeps between its hit circle and the line of fire
+    DODGE_MARGIN = 1.0
+    # Projectile speed in m/s assumed until one of our projectiles has been seen in flight
+    PROJECTILE_SPEED = 30.0
+    # Target assignment costs are metres of path, a radian of turret turn and a point of enemy health are worth
+    AIM_COST = 10.0
+    HEALTH_COST = 0.5
+    # Added to the straight distance to an enemy no path leads to
+    UNREACHABLE_COST = 1000.0
+    # Added where there is no safe shot in range at the enemy right now
+    NO_SHOT_COST = 100.0
+    # Most of our tanks sent after one enemy, and the relative cost change that makes the assignment solve again
+    FOCUS_LIMIT = 2
+    ASSIGNMENT_THRESHOLD = 0.1
+    # Share of the tick budget the path searches may take, the rest is left for targeting and the commands
+    SEARCH_SHARE = 0.8
 
-    def __init__(self, team_name, client_token):
+    def __init__(self, team_name, client_token, map_cache=None, table_dtype=numpy.float64, tick_budget=None,
+                 command_filter=None, path_pool=None, incremental=False):
+        """
+        :param tick_budget: Number, seconds from the start of parse_game_state that generate_actions may take,
+                            None for no limit. Distance fields not finished in time are resumed on the next tick and
+                            the tanks that needed them drive straight at their target meanwhile.
+        :param command_filter: CommandFilter, drops the commands that repeat the running ones, None sends every
+                               command every tick
+        :param path_pool: PathPool, searches the paths to the enemies in worker processes instead of this one
+        :param incremental: Boolean, search every (our tank, enemy tank) pair with its own D* Lite planner, which
+                            repairs the search of the previous tick, instead of one distance field per enemy
+        """
         self.team_name = team_name
         self.client_token = client_token
+        self.map_cache = map_cache if map_cache is not None else MapCache()
+        self.game_state = GameState()
+        self.players = []
+        self.tank_tables = {}
+        self.table_dtype = table_dtype
+        self.target_assigner = TargetAssigner(self.FOCUS_LIMIT, self.ASSIGNMENT_THRESHOLD)
+        self.tick_budget = tick_budget
+        self.command_filter = command_filter
+        self.path_pool = path_pool
+        self.incremental = incremental
+        # Ticks planned, ticks that went over the budget and tanks that fell back to the direct approach for it
+        self.ticks = 0
+        self.overruns = 0
+        self.fallbacks = 0
 
     def parse_game_state(self, json_game_state, parse_map=False):
         """
         json_game_state structure
         Populate self with the json_game_state.
+        Players, tanks and projectiles are long lived and only have their volatile fields updated, what spawned,
+        respawned or died since the previous call is left in self.delta.
+        The same tanks and projectiles are also laid out as numpy tables, self.tank_tables per player name and
+        self.projectile_table, for the vectorized geometry in generate_actions.
         :param json_game_state: Json object of the current game state
+        :param parse_map: Boolean, look up the map in the map cache (building it if it is new). Set on the first
+                          GAMESTATE of every game, which also forgets the objects of the previous game.
         """
+        self.tick_started = time.time()
         self.time_remaining = json_game_state['timeRemaining']
         if parse_map:
-            map_size = json_game_state['map']['size'][0], json_game_state['map']['size'][1]
-            map_obstacles = []
-            for terrain in json_game_state['map']['terrain']:
-                map_obstacles.append(
-                        Obstacle(terrain['type'], terrain['boundingBox']['corner'], terrain['boundingBox']['size'])
-                )
-            self.map = Map(map_size, map_obstacles)
+            self.map = self.map_cache.get_map(json_game_state['map'])
+            self.game_state.reset()
+            self.encoder = None
+            if self.command_filter is not None:
+                self.command_filter.reset()
 
-        self.players = []
-        for player in json_game_state['players']:
-            score = player['score']
-            name = player['name']
-            tanks = []
-            for tank in player['tanks']:
-                id = tank['id']
-                health = tank['health']
-                hit_radius = tank['hitRadius']
-                collision_radius = tank['collisionRadius']
-                type = tank['type']
-                position = tank['position']
-                tracks = tank['tracks']
-                turret = tank['turret']
-                speed = tank['speed']
-                projectiles = []
-                for projectile in tank['projectiles']:
-                    p_id = projectile['id']
-                    p_position = projectile['position']
-                    p_direction = projectile['direction']
-                    p_speed = projectile['speed']
-                    p_damage = projectile['damage']
-                    p_range = projectile['range']
-                    projectiles.append(Projectile(p_id, p_position, p_direction, p_speed, p_damage, p_range))
-                tanks.append(
-                        Tank(id, health, hit_radius, collision_radius, type, position, tracks, turret, speed,
-                             projectiles))
-            self.players.append(Player(name, score, tanks))
+        self.delta = self.game_state.update(json_game_state)
+        self.players = self.game_state.players
+        self.tank_tables = dict((raw_player['name'], TankTable.from_json(raw_player['tanks'], self.table_dtype))
+                                for raw_player in json_game_state['players'])
+        self.projectile_table = ProjectileTable.from_json(json_game_state['players'], self.table_dtype)
+
+    def get_tank_table(self, player):
+        """
+        The table parsed for a player, or one built from its tanks if the players were set some other way.
+        """
+        table = self.tank_tables.get(player.name)
+        if table is None or table.ids != [tank.id for tank in player.tanks]:
+            table = TankTable.from_tanks(player.tanks, self.table_dtype)
+        return table
+
+    def get_projectile_table(self, players):
+        """
+        The parsed projectile table, or one built from the projectiles of the tanks of players if the players were
+        set some other way.
+        """
+        tanks = [tank for player in players for tank in player.tanks]
+        table = self.projectile_table
+        if table is None or table.ids != [projectile.id for tank in tanks for projectile in tank.projectiles]:
+            table = ProjectileTable.from_tanks(tanks, self.table_dtype)
+        return table
+
+    def get_dodges(self, my_table, projectiles):
+        """
+        Evasive moves for our tanks that a projectile is predicted to hit within DODGE_HORIZON seconds.
+        Every projectile is swept up to its range or the first SOLID cell at once, a threatened tank turns its
+        tracks square to the line of fire of the earliest impact and backs out of it, or crosses it if terrain
+        blocks that side.
+        :param my_table: TankTable of our tanks
+        :param projectiles: ProjectileTable of every projectile in flight
+        :return dict, row of my_table -> (rotation direction, rads, movement direction, distance) of the track
+                rotation and movement commands
+        """
+        if not len(projectiles) or not len(my_table):
+            return {}
+        reach = self.map.get_projectile_reach(projectiles.positions, projectiles.direction, projectiles.range)
+        impact_times = projectiles.get_impact_times(my_table, reach)
+        earliest = impact_times.argmin(axis=0)
+        threatened = numpy.flatnonzero(impact_times[earliest, numpy.arange(len(my_table))] <= self.DODGE_HORIZON)
+        dodges = {}
+        for i in threatened:
+            k = earliest[i]
+            direction = float(projectiles.direction[k])
+            position = my_table.positions[i]
+            offset = position - projectiles.positions[k]
+            # Signed distance from the line of fire, positive on its left
+            side = math.cos(direction) * offset[1] - math.sin(direction) * offset[0]
+            sign = 1 if side >= 0 else -1
+            distance = float(my_table.hit_radius[i]) - abs(side) + self.DODGE_MARGIN
+            heading = direction + sign * math.pi / 2
+            destination = (position[0] + distance * math.cos(heading), position[1] + distance * math.sin(heading))
+            if not self.map.is_passable(destination, my_table.collision_radius[i]):
+                distance = float(my_table.hit_radius[i]) + abs(side) + self.DODGE_MARGIN
+                heading -= sign * math.pi
+            rotation = (heading - my_table.tracks[i] + math.pi) % (2 * math.pi) - math.pi
+            movement = 'FWD'
+            if abs(rotation) > math.pi / 2:
+                # Driving backwards needs less turning
+                rotation = (rotation + 2 * math.pi) % (2 * math.pi) - math.pi
+                movement = 'REV'
+            tra_dir, tra_rad = TankTable.get_direction_rotation(rotation)
+            dodges[i] = (tra_dir, tra_rad, movement, distance)
+        return dodges
+
+    def get_targets(self, my_table, enemy_table, path_lengths, turret_rotations, can_fire):
+        """
+        Team wide target assignment, see TargetAssigner. Taking an enemy costs the path length to it, or the
+        straight distance plus UNREACHABLE_COST if no path leads there, plus AIM_COST per radian the turret has to
+        turn, HEALTH_COST per point of health the enemy has left and NO_SHOT_COST if it can't be shot at yet.
+        :param my_table: TankTable of our tanks
+        :param enemy_table: TankTable of the enemy tanks
+        :param path_lengths: numpy.array, (len(my_table), len(enemy_table)) path lengths in metres, numpy.inf where
+                             there is no path
+        :param turret_rotations: numpy.array, (len(my_table), len(enemy_table)) turret rotations in radians
+        :param can_fire: numpy.array, (len(my_table), len(enemy_table)) booleans, True where firing is worth it
+        :return numpy.array, row of enemy_table assigned to every row of my_table
+        """
+        travel = numpy.where(numpy.isfinite(path_lengths), path_lengths,
+                             my_table.get_distances(enemy_table) + self.UNREACHABLE_COST)
+        costs = travel + self.AIM_COST * numpy.abs(turret_rotations) + self.HEALTH_COST * enemy_table.health[None, :]
+        costs += numpy.where(can_fire, 0, self.NO_SHOT_COST)
+        targets = self.target_assigner.assign(my_table.ids, enemy_table.ids, costs)
+        # Tanks left over once every enemy has FOCUS_LIMIT tanks after it take their cheapest enemy
+        return numpy.where(targets >= 0, targets, costs.argmin(axis=1))
+
+    def get_tank_actions(self, my_tank, tur_dir, tur_rad, tra_dir, tra_rad, movement, dist, fire):
+        """
+        The commands of one tank, without those command_filter finds the same as the ones already running.
+        :param my_tank: Tank
+        :param tur_dir: String, CW or CCW, with tur_rad the turret rotation
+        :param tra_dir: String, CW or CCW, with tra_rad the track rotation
+        :param movement: String, FWD or REV, with dist the movement
+        :param fire: Boolean, FIRE if True, otherwise STOP the gun
+        :return (comm_type, tank_id, argument, value) Array, actions for CommandEncoder.encode_actions
+        """
+        keep = self.command_filter
+        actions = []
+        if keep is None or keep.keep_rotation(my_tank.id, CommType.TURRET_ROTATE, my_tank.turret, tur_dir, tur_rad):
+            actions.append((CommType.TURRET_ROTATE, my_tank.id, tur_dir, tur_rad))
+        if keep is None or keep.keep_rotation(my_tank.id, CommType.TANK_ROTATE, my_tank.tracks, tra_dir, tra_rad):
+            actions.append((CommType.TANK_ROTATE, my_tank.id, tra_dir, tra_rad))
+        if keep is None or keep.keep_movement(my_tank.id, my_tank.position, movement, dist):
+            actions.append((CommType.MOVEMENT, my_tank.id, movement, dist))
+        if keep is None or keep.keep_fire(my_tank.id, fire):
+            if fire:
+                actions.append((CommType.FIRE, my_tank.id, None, None))
+            else:
+                # don't shoot a friend or SOLID terrain from queued bullet
+                actions.append((CommType.STOP, my_tank.id, CommType.FIRE, None))
+        return actions
+
+    def get_encoder(self):
+        """
+        The CommandEncoder of the current game and client token.
+        """
+        if self.encoder is None or self.encoder.client_token != self.client_token:
+            self.encoder = CommandEncoder(self.client_token)
+        return self.encoder
+
+    def get_field_paths(self, my_player, enemy_player, starts, deadline=None):
+        """
+        One reverse distance field per enemy cell and collision radius, shared by all of our tanks. Fields still
+        building at the deadline only know the cells near their enemy, the rest read as unreachable.
+        :param my_player: Player, us
+        :param enemy_player: Player, the enemy
+        :param starts: list of (x, y) grid cells of our tanks
+        :param deadline: Number, time.time() to stop building fields at, None to complete them
+        :return (numpy.array, numpy.array, function), (len(starts), enemies) path costs in cells, numpy.inf where
+                there is no path, booleans True where the search finished, and waypoint(i, j) the cell our tank i
+                heads for towards enemy j
+        """
+        enemy_fields = {}
+        for radius in set(my_tank.collision_radius for my_tank in my_player.tanks):
+            enemy_fields[radius] = [self.map.get_distance_field(enemy_tank.position, radius, deadline)
+                                    for enemy_tank in enemy_player.tanks]
+        fields = [enemy_fields[my_tank.collision_radius] for my_tank in my_player.tanks]
+        path_lengths = numpy.array([[field.get_distance(start) for field in row] for row, start in zip(fields, starts)],
+                                   dtype=float).reshape(len(starts), len(enemy_player.tanks))
+        searched = numpy.array([[field.is_complete() for field in row] for row in fields],
+                               dtype=bool).reshape(path_lengths.shape)
+        return path_lengths, searched, lambda i, j: fields[i][j].get_waypoint(starts[i])
+
+    def get_pooled_paths(self, my_player, enemy_player, starts, deadline=None):
+        """
+        Same as get_field_paths, searched by the worker processes of path_pool. Queries not answered by the
+        deadline read as unreachable and not searched.
+        """
+        queries = [(start, self.map.get_grid_cell(enemy_tank.position), my_tank.collision_radius)
+                   for my_tank, start in zip(my_player.tanks, starts) for enemy_tank in enemy_player.tanks]
+        answers = self.path_pool.solve(self.map, queries, deadline)
+        shape = len(starts), len(enemy_player.tanks)
+        path_lengths = numpy.array([answer[0] if answer is not None else numpy.inf for answer in answers],
+                                   dtype=float).reshape(shape)
+        searched = numpy.array([answer is not None for answer in answers], dtype=bool).reshape(shape)
+        return path_lengths, searched, lambda i, j: answers[i * shape[1] + j][1]
+
+    def get_incremental_paths(self, my_player, enemy_player, starts, deadline=None):
+        """
+        Same as get_field_paths, searched by the D* Lite planner the map keeps for every pair of our tank and
+        enemy tank. Pairs not reached by the deadline read as unreachable and not searched.
+        """
+        shape = len(starts), len(enemy_player.tanks)
+        path_lengths = numpy.full(shape, numpy.inf)
+        searched = numpy.zeros(shape, dtype=bool)
+        waypoints = {}
+        for i, (my_tank, start) in enumerate(zip(my_player.tanks, starts)):
+            for j, enemy_tank in enumerate(enemy_player.tanks):
+                if deadline is not None and time.time() >= deadline:
+                    break
+                planner = self.map.get_incremental_planner((my_tank.id, enemy_tank.id), my_tank.collision_radius)
+                path = planner.search(start, self.map.get_grid_cell(enemy_tank.position))
+                searched[i, j] = True
+                if path:
+                    path_lengths[i, j] = path_cost(start, path)
+                    waypoints[i, j] = smooth_path(planner.engine, start, path)[0]
+        return path_lengths, searched, lambda i, j: waypoints[i, j]
 
     def generate_actions(self):
         actions = []
+        deadline = None
+        if self.tick_budget is not None:
+            deadline = (self.tick_started or time.time()) + self.tick_budget
+        self.tick_started = None
         my_player = None
         enemy_player = None
 
@@ -82,40 +304,74 @@ class Algorithm:
             else:
                 enemy_player = player
 
-        for my_tank in my_player.tanks:
-            # print "Calculating for %s" % my_tank.id
-            s_path_len = 9999999999
-            s_path = []
-            s_path_tank = None
-            for enemy_dist, enemy_tank in my_tank.get_all_dist_tank(enemy_player.tanks):
-                # print "\t %s" % enemy_tank.id
-                temp_s_path = self.map.get_shortest_path(my_tank.position, enemy_tank.position)
-                if s_path_len > len(temp_s_path) > 0:
-                    s_path = temp_s_path
-                    s_path_tank = enemy_tank
-                    s_path_len = len(temp_s_path)
-            if len(s_path) >= 1:
-                tur_dir, tur_rad = my_tank.get_direction_rotation_turret_to_tank(s_path_tank)
-                tra_dir, tra_rad = my_tank.get_direction_rotation_track_to_point(s_path[0])
-                dist = my_tank.get_dist_to_point(s_path[0])
-                actions.append(Command.get_turret_rotation_command(my_tank.id, tur_dir, tur_rad, self.client_token))
-                actions.append(Command.get_tank_rotation_command(my_tank.id, tra_dir, tra_rad, self.client_token))
-                actions.append(Command.get_movement_command(my_tank.id, 'FWD', dist, self.client_token))
-                if my_tank.no_friendly_fire(my_player.tanks, my_tank.get_dist_to_tank(s_path_tank), s_path_tank):
-                    actions.append(Command.get_fire_command(my_tank.id, self.client_token))
-                else:
-                    # don't shoot friend from queued bullet
-                    actions.append(Command.get_stop_command(my_tank.id, CommType.FIRE, self.client_token))
+        # Geometry between every pair of our tanks and enemy tanks in a few array operations
+        my_table = self.get_tank_table(my_player)
+        enemy_table = self.get_tank_table(enemy_player)
+        distances = my_table.get_distances(enemy_table)
+        # Lead every shot at where the enemy will be, with the projectile speed and range seen for each tank type
+        specs = [self.game_state.projectile_specs.get(my_tank.type, (self.PROJECTILE_SPEED, numpy.inf))
+                 for my_tank in my_player.tanks]
+        turret_rotations, _, in_range = my_table.get_intercepts(
+            enemy_table, self.game_state.get_velocities(enemy_table.ids), [speed for speed, _ in specs],
+            [projectile_range for _, projectile_range in specs])
+        track_rotations = my_table.get_track_rotations(enemy_table)
+        # Shots that neither end in SOLID terrain nor pass through one of our tanks, and meet their target in range
+        can_fire = self.map.get_fire_lanes(my_table.positions, enemy_table.positions)
+        can_fire &= my_table.get_safe_shots(enemy_table)
+        can_fire &= in_range
+        dodges = self.get_dodges(my_table, self.get_projectile_table(self.players))
+
+        search_deadline = None
+        if deadline is not None:
+            search_deadline = deadline - (1 - self.SEARCH_SHARE) * self.tick_budget
+        # Path length from every one of our tanks to every enemy, the whole team picks its targets together
+        starts = [self.map.get_grid_cell(my_tank.position) for my_tank in my_player.tanks]
+        if self.path_pool is not None:
+            path_lengths, searched, get_waypoint = self.get_pooled_paths(my_player, enemy_player, starts,
+                                                                         search_deadline)
+        elif self.incremental:
+            path_lengths, searched, get_waypoint = self.get_incremental_paths(my_player, enemy_player, starts,
+                                                                              search_deadline)
+        else:
+            path_lengths, searched, get_waypoint = self.get_field_paths(my_player, enemy_player, starts,
+                                                                        search_deadline)
+        path_lengths = path_lengths * Map.RESOLUTION
+        targets = self.get_targets(my_table, enemy_table, path_lengths, turret_rotations, can_fire)
+
+        for i, my_tank in enumerate(my_player.tanks):
+            j = targets[i]
+            planned = 0 < path_lengths[i, j] < numpy.inf
+            # Out of time, or the field towards the target did not reach us yet: same as python_naive this tick
+            if planned and deadline is not None and time.time() >= deadline:
+                planned = False
+                self.fallbacks += 1
+            elif not planned and not searched[i, j]:
+                self.fallbacks += 1
+            if planned:
+                # Head for the furthest turning point in sight rather than the adjacent cell
+                s_path_step = Map.get_cell_centre(get_waypoint(i, j))
+                tur_dir, tur_rad = TankTable.get_direction_rotation(turret_rotations[i, j])
+                tra_dir, tra_rad = my_tank.get_direction_rotation_track_to_point(s_path_step)
+                dist = my_tank.get_dist_to_point(s_path_step)
+                movement = 'FWD'
+                if i in dodges:
+                    # Get out of the line of fire first
+                    tra_dir, tra_rad, movement, dist = dodges[i]
+                actions.extend(self.get_tank_actions(my_tank, tur_dir, tur_rad, tra_dir, tra_rad, movement, dist,
+                                                     can_fire[i, j]))
             else:
-                dist, tank = my_tank.get_closest_dist_tank(enemy_player.tanks)
-                tur_dir, tur_rad = my_tank.get_direction_rotation_turret_to_tank(tank)
-                tra_dir, tra_rad = my_tank.get_direction_rotation_track_to_tank(tank)
-                actions.append(Command.get_turret_rotation_command(my_tank.id, tur_dir, tur_rad, self.client_token))
-                actions.append(Command.get_tank_rotation_command(my_tank.id, tra_dir, tra_rad, self.client_token))
-                actions.append(Command.get_movement_command(my_tank.id, 'FWD', dist, self.client_token))
-                if my_tank.no_friendly_fire(my_player.tanks, dist, tank):
-                    actions.append(Command.get_fire_command(my_tank.id, self.client_token))
-                else:
-                    # don't shoot friend from queued bullet
-                    actions.append(Command.get_stop_command(my_tank.id, CommType.FIRE, self.client_token))
+                dist = float(distances[i, j])
+                tur_dir, tur_rad = TankTable.get_direction_rotation(turret_rotations[i, j])
+                tra_dir, tra_rad = TankTable.get_direction_rotation(track_rotations[i, j])
+                movement = 'FWD'
+                if i in dodges:
+                    tra_dir, tra_rad, movement, dist = dodges[i]
+                actions.extend(self.get_tank_actions(my_tank, tur_dir, tur_rad, tra_dir, tra_rad, movement, dist,
+                                                     can_fire[i, j]))
+        actions = self.get_encoder().encode_actions(actions)
+        self.ticks += 1
+        if self.command_filter is not None:
+            self.command_filter.next_tick()
+        if deadline is not None and time.time() > deadline:
+            self.overruns += 1
         return actions
@@ -0,0 +1,1065 @@
+#! /usr/bin/env python
+"""
+Micro benchmarks for the client hot paths.
+Usage: python benchmark.py [benchmark name ...]
+Runs every benchmark when no name is given.
+"""
+import json
+import math
+import multiprocessing
+import optparse
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from heapq import heappop, heappush
+
+import numpy
+import zmq
+
+from algorithm import Algorithm
+from client_pipeline import ClientPipeline
+from command import CommandEncoder, CommType
+from command_filter import CommandFilter
+from communication import Communication
+from game_objects.map import Map
+from game_objects.obstacle import Obstacle
+from game_objects.player import Player
+from game_objects.projectile_table import ProjectileTable
+from game_objects.projectile import Projectile
+from game_objects.tank import Tank
+from game_objects.tank_table import TankTable
+from game_state import GameState
+from map_cache import MapCache
+from path_pool import PathPool
+from pathfinding.astar import GridAStar, path_cost
+from pathfinding.dstar_lite import DStarLite
+from state_decoder import StateDecoder
+from targeting import TargetAssigner, solve_assignment
+
+
+def random_obstacles(size, count, max_extent=120, seed=0):
+    """
+    Build a reproducible list of SOLID and IMPASSABLE obstacles scattered over a map.
+    :param size: 2-tuple, Integers (width, height) of the map in metres
+    :param count: Integer, number of obstacles
+    """
+    rng = random.Random(seed)
+    obstacles = []
+    for i in xrange(count):
+        corner = [rng.randint(0, size[0] - 1), rng.randint(0, size[1] - 1)]
+        extent = [rng.randint(1, max_extent), rng.randint(1, max_extent)]
+        obstacles.append(Obstacle(rng.choice(('SOLID', 'IMPASSABLE')), corner, extent))
+    return obstacles
+
+
+def legacy_col_grid(size, obstacles):
+    """
+    The original per-metre obstacle writer, kept as the baseline for bench_rasterize.
+    """
+    col_grid = numpy.array(
+            [[0 for y in range(size[1] / Map.RESOLUTION)] for x in range(size[0] / Map.RESOLUTION)])
+    for obstacle in obstacles:
+        if obstacle.type == "NORMAL":
+            continue
+        origin_x, origin_y = map(int, obstacle.corner)
+        size_x, size_y = map(int, obstacle.size)
+        for writer_x in xrange(0, size_x):
+            for writer_y in xrange(0, size_y):
+                try:
+                    col_grid[(origin_x + writer_x) / Map.RESOLUTION][(origin_y + writer_y) / Map.RESOLUTION] = 1
+                except IndexError:
+                    pass
+    return col_grid
+
+
+def legacy_shortest_path(col_grid, start, goal):
+    """
+    The original open-list scanning A-star from Map.get_shortest_path, kept as the baseline for bench_astar.
+    :return (path, expansions)
+    """
+    def heuristic(a, b):
+        return (b[0] - a[0]) ** 2 + (b[1] - a[1]) ** 2
+
+    neighbors = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+    close_set = set()
+    came_from = {}
+    gscore = {start: 0}
+    oheap = []
+    expansions = 0
+    heappush(oheap, (heuristic(start, goal), start))
+    while oheap:
+        current = heappop(oheap)[1]
+        expansions += 1
+        if current == goal:
+            data = []
+            while current in came_from:
+                data.append(current)
+                current = came_from[current]
+            data.reverse()
+            return data, expansions
+        close_set.add(current)
+        for i, j in neighbors:
+            neighbor = current[0] + i, current[1] + j
+            tentative_g_score = gscore[current] + heuristic(current, neighbor)
+            if not (0 <= neighbor[0] < col_grid.shape[0] and 0 <= neighbor[1] < col_grid.shape[1]):
+                continue
+            if col_grid[neighbor[0]][neighbor[1]] == 1:
+                continue
+            if neighbor in close_set and tentative_g_score >= gscore.get(neighbor, 0):
+                continue
+            if tentative_g_score < gscore.get(neighbor, 0) or neighbor not in [i[1] for i in oheap]:
+                came_from[neighbor] = current
+                gscore[neighbor] = tentative_g_score
+                heappush(oheap, (tentative_g_score + heuristic(neighbor, goal), neighbor))
+    return [], expansions
+
+
+def legacy_parse_players(json_game_state):
+    """
+    The original Algorithm.parse_game_state loop that rebuilt every object, kept as the baseline for
+    bench_game_state.
+    """
+    players = []
+    for player in json_game_state['players']:
+        tanks = []
+        for tank in player['tanks']:
+            projectiles = [Projectile(projectile['id'], projectile['position'], projectile['direction'],
+                                      projectile['speed'], projectile['damage'], projectile['range'])
+                           for projectile in tank['projectiles']]
+            tanks.append(Tank(tank['id'], tank['health'], tank['hitRadius'], tank['collisionRadius'], tank['type'],
+                              tank['position'], tank['tracks'], tank['turret'], tank['speed'], projectiles))
+        players.append(Player(player['name'], player['score'], tanks))
+    return players
+
+
+def random_game_states(tanks, projectiles, ticks, seed=0):
+    """
+    Reproducible GAMESTATE json objects of two players whose tanks drift around and keep firing.
+    """
+    rng = random.Random(seed)
+    states = []
+    for tick in xrange(ticks):
+        players = []
+        for name in ('testclient', 'testclient2'):
+            raw_tanks = []
+            for i in xrange(tanks):
+                raw_tanks.append({
+                    'id': '%s-tank-%d' % (name, i), 'alive': True, 'health': 100.0, 'hitRadius': 2.0,
+                    'collisionRadius': 2.0, 'type': 'TankFast', 'speed': 10.0,
+                    'position': [rng.uniform(0, 800), rng.uniform(0, 450)], 'tracks': rng.uniform(0, 6.28),
+                    'turret': rng.uniform(0, 6.28),
+                    'projectiles': [{'id': '%s-%d-%d' % (name, i, (tick + j) // 10), 'position': [1.0, 2.0],
+                                     'direction': 0.5, 'speed': 30.0, 'damage': 30.0, 'range': 50.0}
+                                    for j in xrange(projectiles)]})
+            players.append({'name': name, 'score': tick, 'tanks': raw_tanks})
+        states.append({'players': players})
+    return states
+
+
+def random_queries(col_grid, count, seed=0):
+    """
+    Reproducible (start, goal) pairs of free cells.
+    """
+    rng = random.Random(seed)
+    free = zip(*numpy.nonzero(col_grid == 0))
+    return [(tuple(rng.choice(free)), tuple(rng.choice(free))) for i in xrange(count)]
+
+
+def random_tick_sequence(col_grid, ticks, seed=0, goal_move=0.3):
+    """
+    Reproducible (start, goal) cells of one chase over consecutive ticks. The start follows the shortest path
+    about every other tick and the goal wanders to a free neighbouring cell with probability goal_move.
+    """
+    rng = random.Random(seed)
+    engine = GridAStar(col_grid)
+    start, goal = random_queries(col_grid, 1, seed)[0]
+
+    def wander(cell):
+        x = min(max(cell[0] + rng.randint(-1, 1), 0), col_grid.shape[0] - 1)
+        y = min(max(cell[1] + rng.randint(-1, 1), 0), col_grid.shape[1] - 1)
+        return cell if col_grid[x][y] else (x, y)
+
+    sequence = []
+    for i in xrange(ticks):
+        sequence.append((start, goal))
+        if rng.random() < 0.5:
+            path = engine.search(start, goal)
+            start = path[0] if path else wander(start)
+        if rng.random() < goal_move:
+            goal = wander(goal)
+    return sequence
+
+
+def best_time(func, repeat=5, number=1):
+    """
+    Best wall clock time of a single call in seconds.
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def bench_rasterize():
+    print "Map construction (best of 5, milliseconds)"
+    print "%-12s %-10s %-11s %-12s %-12s" % ("size", "obstacles", "resolution", "per-metre", "vectorized")
+    original_resolution = Map.RESOLUTION
+    try:
+        for size in ((200, 100), (800, 450), (1600, 900)):
+            for count in (4, 40, 400):
+                obstacles = random_obstacles(size, count)
+                for resolution in (1, 10):
+                    Map.RESOLUTION = resolution
+                    legacy = best_time(lambda: legacy_col_grid(size, obstacles), repeat=1)
+                    vectorized = best_time(lambda: Map(size, obstacles))
+                    print "%-12s %-10d %-11d %-12.3f %-12.3f" % (
+                        "%dx%d" % size, count, resolution, legacy * 1000, vectorized * 1000)
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_astar():
+    print "A-star searches, expansions per second (20 random queries per map)"
+    print "%-12s %-11s %-10s %-14s %-14s %-14s %-14s" % (
+        "size", "resolution", "obstacles", "legacy exp/s", "legacy ms/q", "flat exp/s", "flat ms/q")
+    original_resolution = Map.RESOLUTION
+    try:
+        for size, resolution in (((800, 450), 10), ((1600, 900), 10), ((800, 450), 5), ((800, 450), 2)):
+            Map.RESOLUTION = resolution
+            t_map = Map(size, random_obstacles(size, 40))
+            engine = t_map.get_path_engine()
+            queries = random_queries(t_map.col_grid, 20)
+
+            def flat_search(start, goal):
+                engine.search(start, goal)
+                return engine.last_expansions
+
+            results = []
+            for search in (lambda s, g: legacy_shortest_path(t_map.col_grid, s, g)[1], flat_search):
+                expansions = 0
+                start_time = time.time()
+                for start, goal in queries:
+                    expansions += search(start, goal)
+                elapsed = time.time() - start_time
+                results.extend([expansions / elapsed, elapsed * 1000 / len(queries)])
+            print "%-12s %-11d %-10d %-14d %-14.3f %-14d %-14.3f" % (
+                ("%dx%d" % size, resolution, 40) + tuple(results))
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_map_cache():
+    print "Map ready at game start (best of 5, milliseconds)"
+    print "%-12s %-11s %-10s %-10s %-12s %-10s" % (
+        "size", "resolution", "obstacles", "rebuild", "disk (mmap)", "memory")
+    original_resolution = Map.RESOLUTION
+    cache_dir = tempfile.mkdtemp()
+    try:
+        for resolution in (10, 1):
+            Map.RESOLUTION = resolution
+            for size, count in (((800, 450), 4), ((800, 450), 40), ((1600, 900), 400)):
+                json_map = {'size': list(size), 'terrain': [
+                    {'type': obstacle.type, 'boundingBox': {'corner': obstacle.corner, 'size': obstacle.size}}
+                    for obstacle in random_obstacles(size, count)]}
+                MapCache(cache_dir=cache_dir).get_map(json_map)
+                warm_cache = MapCache()
+                warm_cache.get_map(json_map)
+                rebuild = best_time(lambda: MapCache().get_map(json_map))
+                disk = best_time(lambda: MapCache(cache_dir=cache_dir).get_map(json_map))
+                memory = best_time(lambda: warm_cache.get_map(json_map))
+                print "%-12s %-11d %-10d %-10.3f %-12.3f %-10.4f" % (
+                    "%dx%d" % size, resolution, count, rebuild * 1000, disk * 1000, memory * 1000)
+    finally:
+        Map.RESOLUTION = original_resolution
+        shutil.rmtree(cache_dir)
+
+
+def bench_hpa():
+    print "HPA* against flat A-star on 800x450 (40 obstacles, 10 random queries, cluster size %d)" % (
+        Map.HPA_CLUSTER_SIZE)
+    print "%-11s %-14s %-13s %-13s %-13s %-13s" % (
+        "resolution", "precompute ms", "flat ms/q", "hpa ms/q", "mean cost", "worst cost")
+    original_resolution = Map.RESOLUTION
+    try:
+        for resolution in (10, 5, 2, 1):
+            Map.RESOLUTION = resolution
+            t_map = Map((800, 450), random_obstacles((800, 450), 40))
+            engine = t_map.get_path_engine()
+            start_time = time.time()
+            hierarchical_engine = t_map.get_hierarchical_engine()
+            precompute = time.time() - start_time
+            queries = random_queries(t_map.col_grid, 10)
+
+            start_time = time.time()
+            flat_paths = [engine.search(start, goal) for start, goal in queries]
+            flat = (time.time() - start_time) / len(queries)
+            start_time = time.time()
+            hierarchical_paths = [hierarchical_engine.search(start, goal) for start, goal in queries]
+            hierarchical = (time.time() - start_time) / len(queries)
+
+            ratios = [path_cost(start, hierarchical_path) / path_cost(start, flat_path)
+                      for (start, goal), flat_path, hierarchical_path in zip(queries, flat_paths, hierarchical_paths)
+                      if flat_path]
+            print "%-11d %-14.1f %-13.3f %-13.3f %-13.3f %-13.3f" % (
+                resolution, precompute * 1000, flat * 1000, hierarchical * 1000,
+                sum(ratios) / max(len(ratios), 1), max(ratios or [1.0]))
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_jps():
+    print "Jump Point Search against flat A-star on 800x450 (40 obstacles, 20 random queries)"
+    print "%-11s %-15s %-13s %-15s %-13s" % ("resolution", "astar exp/q", "astar ms/q", "jps exp/q", "jps ms/q")
+    original_resolution = Map.RESOLUTION
+    try:
+        for resolution in (10, 5, 2):
+            Map.RESOLUTION = resolution
+            t_map = Map((800, 450), random_obstacles((800, 450), 40))
+            queries = random_queries(t_map.col_grid, 20)
+            results = []
+            for engine in (t_map.get_path_engine(), t_map.get_jump_point_engine()):
+                expansions = 0
+                start_time = time.time()
+                for start, goal in queries:
+                    engine.search(start, goal)
+                    expansions += engine.last_expansions
+                elapsed = time.time() - start_time
+                results.extend([expansions / len(queries), elapsed * 1000 / len(queries)])
+            print "%-11d %-15d %-13.3f %-15d %-13.3f" % ((resolution,) + tuple(results))
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_clearance():
+    print "Clearance field and inflated grid, once per map (best of 5, milliseconds, limit %d m)" % Map.CLEARANCE_LIMIT
+    print "%-12s %-11s %-10s %-12s %-12s" % ("size", "resolution", "obstacles", "clearance", "inflate")
+    original_resolution = Map.RESOLUTION
+    try:
+        for size in ((800, 450), (1600, 900)):
+            for resolution in (10, 5, 2, 1):
+                Map.RESOLUTION = resolution
+                t_map = Map(size, random_obstacles(size, 40))
+                clearance = best_time(lambda: Map.get_clearance_field(t_map.col_grid, resolution, Map.CLEARANCE_LIMIT))
+                t_map.get_clearance()
+                inflate = best_time(lambda: (t_map.clearance < 2.0).astype(int))
+                print "%-12s %-11d %-10d %-12.3f %-12.3f" % (
+                    "%dx%d" % size, resolution, 40, clearance * 1000, inflate * 1000)
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_theta():
+    print "Lazy Theta* against flat A-star on 800x450 (40 obstacles, 20 random queries)"
+    print "%-11s %-13s %-15s %-13s %-15s %-13s" % (
+        "resolution", "astar ms/q", "astar points/q", "theta ms/q", "theta points/q", "length ratio")
+    original_resolution = Map.RESOLUTION
+    try:
+        for resolution in (10, 5, 2):
+            Map.RESOLUTION = resolution
+            t_map = Map((800, 450), random_obstacles((800, 450), 40))
+            queries = random_queries(t_map.col_grid, 20)
+            results = []
+            lengths = []
+            for engine in (t_map.get_path_engine(), t_map.get_any_angle_engine()):
+                start_time = time.time()
+                paths = [engine.search(start, goal) for start, goal in queries]
+                elapsed = time.time() - start_time
+                results.extend([elapsed * 1000 / len(queries), sum(len(path) for path in paths) / len(queries)])
+                lengths.append([sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip([start] + path, path))
+                                for (start, goal), path in zip(queries, paths)])
+            ratios = [theta / flat for flat, theta in zip(*lengths) if flat]
+            print "%-11d %-13.3f %-15d %-13.3f %-15d %-13.3f" % (
+                (resolution,) + tuple(results) + (sum(ratios) / max(len(ratios), 1),))
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_fire_lanes():
+    print "Fire lanes on 800x450 (40 obstacles), per pair calls against one batched call"
+    print "%-11s %-8s %-15s %-15s %-9s" % ("resolution", "pairs", "per pair ms", "batched ms", "speedup")
+    rng = random.Random(0)
+    original_resolution = Map.RESOLUTION
+    try:
+        for resolution in (10, 5, 2):
+            Map.RESOLUTION = resolution
+            t_map = Map((800, 450), random_obstacles((800, 450), 40))
+            for tanks in (4, 16):
+                origins = [(rng.uniform(0, 800), rng.uniform(0, 450)) for _ in xrange(tanks)]
+                targets = [(rng.uniform(0, 800), rng.uniform(0, 450)) for _ in xrange(tanks)]
+                per_pair = best_time(lambda: [Map.get_lines_of_sight(t_map.shot_grid, [origin + target], resolution)
+                                              for origin in origins for target in targets])
+                batched = best_time(lambda: t_map.get_fire_lanes(origins, targets))
+                print "%-11d %-8d %-15.3f %-15.3f %-9.1f" % (
+                    resolution, tanks * tanks, per_pair * 1000, batched * 1000, per_pair / batched)
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_dstar():
+    print "D* Lite against fresh A-star per tick on 800x450 (40 obstacles, 4 chases of 100 ticks)"
+    print "%-11s %-10s %-13s %-17s %-13s %-17s" % (
+        "resolution", "goal move", "astar ms/t", "astar expand/t", "dstar ms/t", "dstar expand/t")
+    original_resolution = Map.RESOLUTION
+    try:
+        for resolution in (10, 5, 2):
+            Map.RESOLUTION = resolution
+            t_map = Map((800, 450), random_obstacles((800, 450), 40))
+            engine = t_map.get_path_engine()
+            for goal_move in (0.0, 0.1, 0.3):
+                sequences = [random_tick_sequence(t_map.col_grid, 100, seed, goal_move) for seed in xrange(4)]
+                ticks = sum(len(sequence) for sequence in sequences)
+                totals = []
+                for make_planner in (lambda: engine, lambda: DStarLite(engine)):
+                    expansions = 0
+                    start_time = time.time()
+                    for sequence in sequences:
+                        planner = make_planner()
+                        for start, goal in sequence:
+                            planner.search(start, goal)
+                            expansions += planner.last_expansions
+                    totals.extend([(time.time() - start_time) * 1000 / ticks, expansions / ticks])
+                print "%-11d %-10.1f %-13.3f %-17d %-13.3f %-17d" % ((resolution, goal_move) + tuple(totals))
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_game_state():
+    print "GAMESTATE parsing, rebuilding every object against in-place updates (200 ticks)"
+    print "%-15s %-13s %-16s %-16s %-9s" % ("tanks/player", "projectiles", "rebuild us/tick", "update us/tick",
+                                           "speedup")
+    for tanks, projectiles in ((4, 0), (4, 3), (16, 3), (64, 3)):
+        states = random_game_states(tanks, projectiles, 200)
+
+        def update():
+            state = GameState()
+            for json_game_state in states:
+                state.update(json_game_state)
+
+        rebuild = best_time(lambda: [legacy_parse_players(json_game_state) for json_game_state in states])
+        incremental = best_time(update)
+        print "%-15d %-13d %-16.1f %-16.1f %-9.2f" % (
+            tanks, projectiles, rebuild * 1e6 / len(states), incremental * 1e6 / len(states), rebuild / incremental)
+
+
+def bench_tank_tables():
+    print "Team geometry per tick, per pair Tank methods against TankTable matrices"
+    print "%-15s %-14s %-14s %-14s %-9s" % ("tanks/player", "per pair us", "float64 us", "float32 us", "speedup")
+    for tanks in (4, 16, 64):
+        json_game_state = random_game_states(tanks, 0, 1)[0]
+        raw_allies, raw_enemies = [raw_player['tanks'] for raw_player in json_game_state['players']]
+        allies, enemies = [player.tanks for player in legacy_parse_players(json_game_state)]
+
+        def per_pair():
+            for ally in allies:
+                ally.get_all_dist_tank(enemies)
+                for enemy in enemies:
+                    ally.get_direction_rotation_turret_to_tank(enemy)
+                    ally.get_direction_rotation_track_to_tank(enemy)
+
+        def tables(dtype):
+            ally_table = TankTable.from_json(raw_allies, dtype)
+            enemy_table = TankTable.from_json(raw_enemies, dtype)
+            ally_table.get_nearest(enemy_table, k=len(enemy_table))
+            ally_table.get_turret_rotations(enemy_table)
+            ally_table.get_track_rotations(enemy_table)
+
+        scalar = best_time(per_pair)
+        vector = best_time(lambda: tables(numpy.float64))
+        vector32 = best_time(lambda: tables(numpy.float32))
+        print "%-15d %-14.1f %-14.1f %-14.1f %-9.1f" % (
+            tanks, scalar * 1e6, vector * 1e6, vector32 * 1e6, scalar / vector)
+
+
+class LegacyObject:
+    """
+    Old style instance with a __dict__, what every game object was before __slots__, for bench_value_objects.
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def bench_value_objects():
+    print "Game objects with __slots__ and key hashing against dict instances hashed and ordered through str()"
+    print "%-7s %-12s %-13s %-13s %-16s %-16s %-9s" % (
+        "tanks", "projectiles", "legacy bytes", "slots bytes", "legacy ms/tick", "slots ms/tick", "speedup")
+    for tanks, projectiles in ((64, 2), (256, 4), (512, 4)):
+        json_game_state = random_game_states(tanks / 2, projectiles, 1)[0]
+        players = legacy_parse_players(json_game_state)
+        all_tanks = [tank for player in players for tank in player.tanks]
+        all_projectiles = [projectile for tank in all_tanks for projectile in tank.projectiles]
+
+        slots_bytes = sum(sys.getsizeof(value) for value in all_tanks + all_projectiles)
+        legacy_values = [LegacyObject(**dict((name, getattr(value, name)) for name in value.__slots__))
+                         for value in all_tanks + all_projectiles]
+        legacy_bytes = sum(sys.getsizeof(value) + sys.getsizeof(value.__dict__) for value in legacy_values)
+
+        def legacy():
+            # What __hash__ and __cmp__ through str() cost: deduplicate and sort tanks and projectiles
+            dict((str(tank), tank) for tank in all_tanks)
+            sorted(all_tanks, key=str)
+            dict((str(projectile), projectile) for projectile in all_projectiles)
+            for player in players:
+                str(sorted(player.tanks, key=str))
+
+        def slots():
+            set(all_tanks)
+            sorted(all_tanks)
+            set(all_projectiles)
+            for player in players:
+                sorted(player.tanks)
+
+        legacy_time = best_time(legacy)
+        slots_time = best_time(slots)
+        print "%-7d %-12d %-13d %-13d %-16.3f %-16.3f %-9.1f" % (
+            tanks, tanks * projectiles, legacy_bytes, slots_bytes, legacy_time * 1000, slots_time * 1000,
+            legacy_time / slots_time)
+
+
+def bench_state_decoder():
+    print "GAMESTATE decoding per tick once the map is known, full json.loads against skipping the terrain"
+    print "%-11s %-14s %-12s %-15s %-15s %-9s" % ("obstacles", "tanks/player", "bytes", "full us/tick",
+                                                 "skip us/tick", "speedup")
+    size = (800, 450)
+    for count, tanks in ((40, 4), (400, 4), (4000, 4), (4000, 16)):
+        json_game_state = random_game_states(tanks, 3, 1)[0]
+        terrain = [{'boundingBox': {'corner': obstacle.corner, 'size': obstacle.size}, 'type': obstacle.type}
+                   for obstacle in random_obstacles(size, count)]
+        json_game_state.update({'timeRemaining': 100.0, 'comm_type': 'GAMESTATE',
+                                'map': {'size': list(size), 'terrain': terrain}})
+        raw_message = json.dumps(json_game_state)
+        decoder = StateDecoder()
+        full = best_time(lambda: json.loads(raw_message), number=20)
+        skip = best_time(lambda: decoder.decode(raw_message, skip_map=True), number=20)
+        print "%-11d %-14d %-12d %-15.1f %-15.1f %-9.1f" % (
+            count, tanks, len(raw_message), full * 1e6, skip * 1e6, full / skip)
+
+
+def bench_friendly_fire():
+    print "Friendly fire checks per tick, Tank.no_friendly_fire loops against the TankTable safe shot matrix"
+    print "%-15s %-16s %-16s %-14s %-9s" % ("tanks/player", "one target us", "all pairs us", "matrix us",
+                                           "speedup")
+    for tanks in (4, 16, 64):
+        json_game_state = random_game_states(tanks, 0, 1)[0]
+        raw_allies, raw_enemies = [raw_player['tanks'] for raw_player in json_game_state['players']]
+        allies, enemies = [player.tanks for player in legacy_parse_players(json_game_state)]
+
+        def one_target():
+            for ally in allies:
+                dist, enemy = ally.get_closest_dist_tank(enemies)
+                ally.no_friendly_fire(allies, dist, enemy)
+
+        def all_pairs():
+            for ally in allies:
+                for enemy in enemies:
+                    ally.no_friendly_fire(allies, ally.get_dist_to_tank(enemy), enemy)
+
+        # The tables are parsed with every GAMESTATE anyway
+        ally_table = TankTable.from_json(raw_allies)
+        enemy_table = TankTable.from_json(raw_enemies)
+
+        def matrix():
+            ally_table.get_safe_shots(enemy_table)
+
+        single = best_time(one_target)
+        pairs = best_time(all_pairs)
+        vector = best_time(matrix)
+        print "%-15d %-16.1f %-16.1f %-14.1f %-9.1f" % (
+            tanks, single * 1e6, pairs * 1e6, vector * 1e6, pairs / vector)
+
+
+def legacy_impact_times(shot_grid, projectiles, tanks, resolution):
+    """
+    Step every projectile a quarter cell at a time and test every tank at every step, the scalar baseline for
+    bench_projectiles.
+    """
+    impact_times = []
+    for projectile in projectiles:
+        step = resolution / 4.0
+        dx = math.cos(projectile.direction) * step
+        dy = math.sin(projectile.direction) * step
+        x, y = projectile.position
+        times = dict((tank.id, float('inf')) for tank in tanks)
+        flown = 0.0
+        while flown <= projectile.range:
+            cell_x, cell_y = int(x // resolution), int(y // resolution)
+            if not (0 <= cell_x < shot_grid.shape[0] and 0 <= cell_y < shot_grid.shape[1]) or \
+                    shot_grid[cell_x][cell_y]:
+                break
+            for tank in tanks:
+                if times[tank.id] == float('inf') and math.hypot(tank.position[0] - x, tank.position[1] - y) <= \
+                        tank.hit_radius:
+                    times[tank.id] = flown / projectile.speed
+            x += dx
+            y += dy
+            flown += step
+        impact_times.append(times)
+    return impact_times
+
+
+def bench_projectiles():
+    print "Projectile impact prediction on 800x450 (40 obstacles, 8 tanks), stepping every projectile against one sweep"
+    print "%-13s %-12s %-12s %-9s" % ("projectiles", "stepped ms", "swept ms", "speedup")
+    rng = random.Random(0)
+    t_map = Map((800, 450), random_obstacles((800, 450), 40))
+    tanks = [Tank('tank-%d' % i, 100.0, 2.0, 2.0, 'TankFast', [rng.uniform(0, 800), rng.uniform(0, 450)], 0.0, 0.0,
+                  10.0, []) for i in xrange(8)]
+    tank_table = TankTable.from_tanks(tanks)
+    for count in (8, 32, 128):
+        # Aimed roughly at a tank from up to 100 m away, as projectiles in flight usually are
+        projectiles = []
+        for i in xrange(count):
+            target = rng.choice(tanks).position
+            angle = rng.uniform(0, 2 * math.pi)
+            distance = rng.uniform(10, 100)
+            position = [target[0] + distance * math.cos(angle), target[1] + distance * math.sin(angle)]
+            projectiles.append(Projectile('projectile-%d' % i, position, angle + math.pi + rng.uniform(-0.05, 0.05),
+                                          30.0, 30.0, 100.0))
+        owner = Tank('owner', 100.0, 2.0, 2.0, 'TankFast', [0, 0], 0.0, 0.0, 10.0, projectiles)
+
+        def swept():
+            table = ProjectileTable.from_tanks([owner])
+            reach = t_map.get_projectile_reach(table.positions, table.direction, table.range)
+            table.get_impact_times(tank_table, reach).min(axis=0)
+
+        stepped = best_time(lambda: legacy_impact_times(t_map.shot_grid, projectiles, tanks, Map.RESOLUTION))
+        sweep = best_time(swept)
+        print "%-13d %-12.3f %-12.3f %-9.1f" % (count, stepped * 1000, sweep * 1000, stepped / sweep)
+
+
+def legacy_intercepts(shooters, targets, velocities, speed):
+    """
+    The intercept equation solved with math per (shooter, target) pair, the scalar baseline for bench_intercepts.
+    """
+    rotations = []
+    for shooter in shooters:
+        row = []
+        for target, (vx, vy) in zip(targets, velocities):
+            dx = target.position[0] - shooter.position[0]
+            dy = target.position[1] - shooter.position[1]
+            a = vx * vx + vy * vy - speed * speed
+            b = 2 * (dx * vx + dy * vy)
+            c = dx * dx + dy * dy
+            discriminant = b * b - 4 * a * c
+            times = [t for t in ((-b - math.sqrt(discriminant)) / (2 * a), (-b + math.sqrt(discriminant)) / (2 * a))
+                     if t >= 0] if discriminant >= 0 and a else []
+            t = min(times) if times else 0
+            bearing = math.atan2(dy + vy * t, dx + vx * t)
+            row.append((bearing - shooter.turret + math.pi) % (2 * math.pi) - math.pi)
+        rotations.append(row)
+    return rotations
+
+
+def bench_intercepts():
+    print "Turret aim at tanks moving at 10 m/s with 30 m/s projectiles, pairs hit within 100 m and solver time"
+    print "%-15s %-14s %-14s %-16s %-14s %-9s" % ("tanks/player", "direct hits", "lead hits", "per pair us",
+                                                 "vectorized us", "speedup")
+    rng = random.Random(0)
+    for tanks in (4, 16, 64):
+        json_game_state = random_game_states(tanks, 0, 1)[0]
+        raw_allies, raw_enemies = [raw_player['tanks'] for raw_player in json_game_state['players']]
+        allies, enemies = [player.tanks for player in legacy_parse_players(json_game_state)]
+        ally_table = TankTable.from_json(raw_allies)
+        enemy_table = TankTable.from_json(raw_enemies)
+        headings = [rng.uniform(0, 2 * math.pi) for _ in enemies]
+        velocities = numpy.array([(10 * math.cos(heading), 10 * math.sin(heading)) for heading in headings])
+
+        def count_hits(rotations):
+            # Closest approach of the projectile to the target, both flying straight, within the projectile range
+            aims = ally_table.turret[:, None] + rotations
+            relative = velocities[None, :, :] - 30.0 * numpy.dstack((numpy.cos(aims), numpy.sin(aims)))
+            offsets = enemy_table.positions[None, :, :] - ally_table.positions[:, None, :]
+            t = numpy.clip(-(offsets * relative).sum(axis=2) / (relative ** 2).sum(axis=2), 0, 100 / 30.0)
+            misses = offsets + relative * t[:, :, None]
+            return int((numpy.hypot(misses[:, :, 0], misses[:, :, 1]) <= 2.0).sum())
+
+        pairs = tanks * tanks
+        direct = count_hits(ally_table.get_turret_rotations(enemy_table))
+        lead = count_hits(ally_table.get_intercepts(enemy_table, velocities, 30.0)[0])
+        scalar = best_time(lambda: legacy_intercepts(allies, enemies, velocities, 30.0))
+        vector = best_time(lambda: ally_table.get_intercepts(enemy_table, velocities, 30.0, 100.0))
+        print "%-15d %-14s %-14s %-16.1f %-14.1f %-9.1f" % (
+            tanks, "%d/%d" % (direct, pairs), "%d/%d" % (lead, pairs), scalar * 1e6, vector * 1e6, scalar / vector)
+
+
+def bench_targeting():
+    print "Target assignment over 100 ticks of drifting tanks, greedy cheapest target against the team assignment"
+    print "%-15s %-13s %-13s %-13s %-13s %-10s %-12s %-12s" % (
+        "tanks/player", "greedy cost", "team cost", "greedy focus", "team focus", "solves", "solve ms", "tick us")
+    rng = numpy.random.RandomState(0)
+    for tanks in (4, 16, 64):
+        allies = rng.uniform(0, 450, (tanks, 2))
+        # Enemies bunched up on one side, so the cheapest enemy is often the same one for every tank
+        enemies = rng.uniform(0, 200, (tanks, 2)) + [600, 250]
+        health = rng.choice([100.0, 200.0], tanks)
+        ids = ['ally-%d' % i for i in xrange(tanks)], ['enemy-%d' % i for i in xrange(tanks)]
+        assigner = TargetAssigner(focus_limit=2, threshold=0.1)
+        greedy_cost = team_cost = greedy_focus = team_focus = 0
+        elapsed = 0.0
+        for tick in xrange(100):
+            allies += rng.uniform(-1, 1, allies.shape)
+            enemies += rng.uniform(-1, 1, enemies.shape)
+            offsets = enemies[None, :, :] - allies[:, None, :]
+            costs = numpy.hypot(offsets[:, :, 0], offsets[:, :, 1]) + 0.5 * health[None, :]
+            greedy = costs.argmin(axis=1)
+            started = time.time()
+            team = assigner.assign(ids[0], ids[1], costs)
+            elapsed += time.time() - started
+            rows = numpy.arange(tanks)
+            greedy_cost += costs[rows, greedy].sum()
+            team_cost += costs[rows, team].sum()
+            greedy_focus = max(greedy_focus, numpy.bincount(greedy).max())
+            team_focus = max(team_focus, numpy.bincount(team).max())
+        costs = numpy.repeat(costs, 2, axis=1)
+        solve = best_time(lambda: solve_assignment(costs))
+        print "%-15d %-13.0f %-13.0f %-13d %-13d %-10d %-12.3f %-12.1f" % (
+            tanks, greedy_cost / 100, team_cost / 100, greedy_focus, team_focus, assigner.solves, solve * 1000,
+            elapsed * 1e6 / 100)
+
+
+def bench_tick_budget():
+    print "Planning ticks on 800x450 (40 obstacles) at 5 m cells, 4 tanks chasing 4 moving enemies for 40 ticks"
+    print "%-11s %-13s %-13s %-11s %-11s" % ("budget ms", "mean ms/t", "worst ms/t", "overruns", "fallbacks")
+    original_resolution = Map.RESOLUTION
+    try:
+        Map.RESOLUTION = 5
+        obstacles = random_obstacles((800, 450), 40)
+        for budget in (None, 20, 10):
+            rng = random.Random(0)
+            algo = Algorithm('testclient', 'client-token', tick_budget=budget / 1000.0 if budget else None)
+            algo.map = Map((800, 450), obstacles)
+            allies = [Tank('ally-%d' % i, 100.0, 2.0, 2.0, 'TankFast', [rng.uniform(0, 200), rng.uniform(0, 450)],
+                           0.0, 0.0, 10.0, []) for i in xrange(4)]
+            enemies = [Tank('enemy-%d' % i, 100.0, 2.0, 2.0, 'TankFast', [rng.uniform(600, 800), rng.uniform(0, 450)],
+                            0.0, 0.0, 10.0, []) for i in xrange(4)]
+            algo.players = [Player('testclient', 0, allies), Player('testclient2', 0, enemies)]
+            times = []
+            for tick in xrange(40):
+                # Enemies wander into a new cell every other tick or so, which needs a new field
+                for enemy in enemies:
+                    enemy.position = [min(max(enemy.position[0] + rng.uniform(-1.5, 1.5), 0), 799),
+                                      min(max(enemy.position[1] + rng.uniform(-1.5, 1.5), 0), 449)]
+                started = time.time()
+                algo.tick_started = started
+                algo.generate_actions()
+                times.append(time.time() - started)
+            print "%-11s %-13.1f %-13.1f %-11d %-11d" % (
+                budget or '-', sum(times) * 1000 / len(times), max(times) * 1000, algo.overruns, algo.fallbacks)
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_command_encoder():
+    print "Encoding one tick of commands, 4 per tank, Command builders against the CommandEncoder templates"
+    print "%-8s %-15s %-15s %-15s %-9s" % ("tanks", "builders us", "encode us", "bulk us", "speedup")
+    rng = random.Random(0)
+    token = '6b52a4c4-1c27-4d1e-9a1c-07c8a1f2d3e4'
+    for tanks in (4, 16, 64):
+        actions = []
+        for i in xrange(tanks):
+            tank_id = '%08x-0000-4000-8000-%012x' % (rng.getrandbits(32), i)
+            actions.extend([(CommType.TURRET_ROTATE, tank_id, 'CCW', rng.uniform(0, math.pi)),
+                            (CommType.TANK_ROTATE, tank_id, 'CW', rng.uniform(0, math.pi)),
+                            (CommType.MOVEMENT, tank_id, 'FWD', rng.uniform(0, 100)),
+                            (CommType.STOP, tank_id, CommType.FIRE, None)])
+        encoder = CommandEncoder(token)
+        encoder.encode_actions(actions)
+        builders = best_time(lambda: [encoder.build(*action) for action in actions])
+        single = best_time(lambda: [encoder.encode(*action) for action in actions])
+        bulk = best_time(lambda: encoder.encode_actions(actions))
+        print "%-8d %-15.1f %-15.1f %-15.1f %-9.1f" % (tanks, builders * 1e6, single * 1e6, bulk * 1e6, builders / bulk)
+
+
+def simulate_commands(tanks, running, actions, dt):
+    """
+    Crude server for bench_command_filter: a new command replaces the running one of its control, every tank turns
+    its turret at 2 rad/s and its tracks at 1.5 rad/s and drives at its speed along them until the commands run out.
+    """
+    by_id = dict((tank.id, tank) for tank in tanks)
+    for action in actions:
+        action = json.loads(action)
+        control = action['control'] if action['comm_type'] == 'STOP' else action['comm_type']
+        running[(action['tank_id'], control)] = action
+    for (tank_id, control), action in running.items():
+        tank = by_id[tank_id]
+        if control in ('ROTATE_TURRET', 'ROTATE'):
+            sign = 1 if action['direction'] == 'CCW' else -1
+            step = min(action['rads'], (2.0 if control == 'ROTATE_TURRET' else 1.5) * dt)
+            action['rads'] -= step
+            if control == 'ROTATE_TURRET':
+                tank.turret = (tank.turret + sign * step) % (2 * math.pi)
+            else:
+                tank.tracks = (tank.tracks + sign * step) % (2 * math.pi)
+        elif control == 'MOVE':
+            sign = 1 if action['direction'] == 'FWD' else -1
+            step = min(action['distance'], tank.speed * dt)
+            action['distance'] -= step
+            tank.position = [min(max(tank.position[0] + sign * step * math.cos(tank.tracks), 0), 799),
+                             min(max(tank.position[1] + sign * step * math.sin(tank.tracks), 0), 449)]
+
+
+def bench_command_filter():
+    print "Commands per tick of 4 tanks chasing 4 slowly moving enemies on 800x450 for 300 ticks of 0.1 s, with the"
+    print "commands carried out, every command sent against the CommandFilter"
+    print "%-18s %-12s %-12s %-14s %-16s" % ("tolerance rad/m", "sent/tick", "saved", "sent bytes", "end distance m")
+    obstacles = random_obstacles((800, 450), 20)
+    for tolerances in (None, (0.02, 0.5), (0.05, 1.0)):
+        rng = random.Random(0)
+        command_filter = CommandFilter(*tolerances) if tolerances is not None else None
+        algo = Algorithm('testclient', 'client-token', command_filter=command_filter)
+        algo.map = Map((800, 450), obstacles)
+        allies = [Tank('ally-%d' % i, 100.0, 2.0, 2.0, 'TankFast', [rng.uniform(0, 200), rng.uniform(0, 450)],
+                       0.0, 0.0, 10.0, []) for i in xrange(4)]
+        enemies = [Tank('enemy-%d' % i, 100.0, 2.0, 2.0, 'TankFast', [rng.uniform(600, 800), rng.uniform(0, 450)],
+                        0.0, 0.0, 10.0, []) for i in xrange(4)]
+        algo.players = [Player('testclient', 0, allies), Player('testclient2', 0, enemies)]
+        running = {}
+        sent = 0
+        sent_bytes = 0
+        for tick in xrange(300):
+            for enemy in enemies:
+                enemy.position = [min(max(enemy.position[0] + rng.uniform(-0.5, 0.5), 0), 799),
+                                  min(max(enemy.position[1] + rng.uniform(-0.5, 0.5), 0), 449)]
+            actions = algo.generate_actions()
+            sent += len(actions)
+            sent_bytes += sum(len(action) for action in actions)
+            simulate_commands(allies, running, actions, 0.1)
+        distance = TankTable.from_tanks(allies).get_nearest(TankTable.from_tanks(enemies))[1].mean()
+        print "%-18s %-12.1f %-12s %-14d %-16.1f" % (
+            '%s / %s' % tolerances if tolerances else '-', sent / 300.0,
+            '%.0f%%' % (100 * command_filter.get_saving()) if command_filter else '-', sent_bytes, distance)
+
+
+def bench_path_pool():
+    print "Path queries of 4 tanks to 4 enemies that move into a new cell every tick, 800x450 (40 obstacles) at 5 m"
+    print "cells for 20 ticks, distance fields in this process against a PathPool (%d cores here)" % (
+        multiprocessing.cpu_count())
+    print "%-10s %-13s %-13s %-22s" % ("workers", "mean ms/t", "worst ms/t", "unfinished at 20 ms")
+    original_resolution = Map.RESOLUTION
+    try:
+        Map.RESOLUTION = 5
+        obstacles = random_obstacles((800, 450), 40)
+        for workers in (None, 1, 2, 4):
+            rng = random.Random(0)
+            starts = [(rng.randint(0, 39), rng.randint(0, 89)) for _ in xrange(4)]
+            goals = [(rng.randint(120, 159), rng.randint(0, 89)) for _ in xrange(4)]
+            pathmap = Map((800, 450), obstacles)
+            pool = PathPool(workers) if workers else None
+            try:
+                times = []
+                unfinished = 0
+                for tick in xrange(20):
+                    goals = [(min(x + 1, 159), y) for x, y in goals]
+                    queries = [(start, goal, 2.0) for start in starts for goal in goals]
+                    started = time.time()
+                    if pool is None:
+                        fields = [pathmap.get_distance_field(Map.get_cell_centre(goal), 2.0) for goal in goals]
+                        [(field.get_distance(start), field.get_waypoint(start)) for start in starts for field in fields]
+                    else:
+                        pool.solve(pathmap, queries)
+                    times.append(time.time() - started)
+                if pool is not None:
+                    # Same ticks against a 20 ms budget
+                    for tick in xrange(20):
+                        goals = [(max(x - 1, 120), y) for x, y in goals]
+                        answers = pool.solve(pathmap, [(start, goal, 2.0) for start in starts for goal in goals],
+                                             time.time() + 0.02)
+                        unfinished += answers.count(None)
+            finally:
+                if pool is not None:
+                    pool.close()
+            late = '%d of %d' % (unfinished, 20 * 16) if pool is not None else '-'
+            print "%-10s %-13.1f %-13.1f %-22s" % (workers or 'in process', sum(times) * 1000 / len(times),
+                                                   max(times) * 1000, late)
+    finally:
+        Map.RESOLUTION = original_resolution
+
+
+def bench_receive_latest():
+    print "Game states published every 20 ms to a planner taking 30 ms per tick for 2 s, in order against latest only"
+    print "%-8s %-10s %-10s %-15s %-15s" % ("mode", "planned", "dropped", "mean age ms", "worst age ms")
+    for latest_only in (False, True):
+        comm = Communication('localhost')
+        comm.cmd_socket.setsockopt(zmq.LINGER, 0)
+        publisher = comm.context.socket(zmq.PUB)
+        publisher.bind('inproc://bench_receive_latest')
+        comm.pub_socket.close(linger=0)
+        comm.pub_socket = comm.context.socket(zmq.SUB)
+        comm.pub_socket.connect('inproc://bench_receive_latest')
+        comm.set_subscription('')
+        time.sleep(0.1)
+
+        def publish():
+            for tick in xrange(100):
+                publisher.send(json.dumps({'comm_type': 'GAMESTATE', 'timestamp': time.time()}))
+                time.sleep(0.02)
+            publisher.send(json.dumps({'comm_type': 'MatchEnd'}))
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        ages = []
+        pending = []
+        while True:
+            if not pending:
+                pending = comm.receive_latest() if latest_only else [comm.receive(Communication.Origin.PublishSocket)]
+            message = json.loads(pending.pop(0))
+            if message['comm_type'] == 'MatchEnd':
+                break
+            ages.append(time.time() - message['timestamp'])
+            time.sleep(0.03)
+        thread.join()
+        publisher.close(linger=0)
+        comm.close()
+        print "%-8s %-10d %-10d %-15.1f %-15.1f" % ("latest" if latest_only else "in order", len(ages), comm.dropped,
+                                                    sum(ages) * 1000 / len(ages), max(ages) * 1000)
+
+
+
+def bench_pipelined_commands():
+    print "50 ticks of 12 commands to a server taking 0.5 ms per command, time the client is blocked sending"
+    print "%-12s %-18s %-18s %-10s" % ("mode", "mean ms / tick", "worst ms / tick", "errors")
+    commands = [json.dumps({'comm_type': comm_type, 'tank_id': 'tank%d' % i}) for i in xrange(4)
+                for comm_type in ('MOVE', 'ROTATE', 'FIRE')]
+    ticks = 50
+    for pipelined in (False, True):
+        comm = Communication('localhost', pipelined=pipelined)
+        server = comm.context.socket(zmq.REP)
+        server.bind('inproc://bench_pipelined_commands')
+        comm.cmd_socket.close(linger=0)
+        comm.cmd_socket = comm.context.socket(zmq.DEALER if pipelined else zmq.REQ)
+        comm.cmd_socket.connect('inproc://bench_pipelined_commands')
+
+        def serve():
+            for _ in xrange(ticks * len(commands)):
+                message = server.recv()
+                time.sleep(0.0005)
+                server.send(json.dumps({'resp': 'error' if 'FIRE' in message else 'ok'}))
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        blocked = []
+        for tick in xrange(ticks):
+            started = time.time()
+            comm.send_batch(commands)
+            blocked.append(time.time() - started)
+            # Planning the next tick
+            time.sleep(0.01)
+        comm.collect_replies(block=True)
+        thread.join()
+        server.close(linger=0)
+        comm.cmd_socket.setsockopt(zmq.LINGER, 0)
+        comm.close()
+        mode = "pipelined" if pipelined else "synchronous"
+        print "%-12s %-18.2f %-18.2f %-10d" % (mode, sum(blocked) * 1000 / ticks, max(blocked) * 1000,
+                                               sum(comm.errors.values()))
+
+
+
+def bench_client_pipeline():
+    print "Game states published every 20 ms for 2 s, 15 ms of planning and 12 synchronous commands to a server"
+    print "taking 0.5 ms each per tick, the single client loop against the receive / plan / send pipeline"
+    print "%-10s %-10s %-15s %-15s" % ("mode", "planned", "mean age ms", "worst age ms")
+    commands = [json.dumps({'comm_type': 'MOVE', 'tank_id': 'tank%d' % i}) for i in xrange(12)]
+
+    class Planner(object):
+        command_filter = None
+
+        def __init__(self):
+            self.ages = []
+
+        def parse_game_state(self, json_state_message, parse_map=False):
+            self.ages.append(time.time() - json_state_message['timestamp'])
+
+        def generate_actions(self):
+            time.sleep(0.015)
+            return commands
+
+    for threaded in (False, True):
+        comm = Communication('localhost', pipelined=False)
+        publisher = comm.context.socket(zmq.PUB)
+        publisher.bind('inproc://bench_client_pipeline')
+        server = comm.context.socket(zmq.REP)
+        server.bind('inproc://bench_client_pipeline_commands')
+        comm.pub_socket.close(linger=0)
+        comm.pub_socket = comm.context.socket(zmq.SUB)
+        comm.pub_socket.connect('inproc://bench_client_pipeline')
+        comm.set_subscription('')
+        comm.cmd_socket.close(linger=0)
+        comm.cmd_socket = comm.context.socket(zmq.REQ)
+        comm.cmd_socket.connect('inproc://bench_client_pipeline_commands')
+        time.sleep(0.1)
+        stop = threading.Event()
+
+        def publish():
+            for tick in xrange(100):
+                publisher.send(json.dumps({'comm_type': 'GAMESTATE', 'timestamp': time.time()}))
+                time.sleep(0.02)
+            publisher.send(json.dumps({'comm_type': 'MatchEnd'}))
+
+        def serve():
+            while not stop.is_set():
+                if server.poll(100):
+                    server.recv()
+                    time.sleep(0.0005)
+                    server.send('{"resp": "ok"}')
+
+        threads = [threading.Thread(target=publish), threading.Thread(target=serve)]
+        for thread in threads:
+            thread.start()
+        planner = Planner()
+        if threaded:
+            ClientPipeline(comm, planner, lambda message: None).run()
+        else:
+            decoder = StateDecoder()
+            while True:
+                message = decoder.decode(comm.receive(Communication.Origin.PublishSocket))
+                if message['comm_type'] == 'MatchEnd':
+                    break
+                planner.parse_game_state(message)
+                comm.send_batch(planner.generate_actions())
+        stop.set()
+        for thread in threads:
+            thread.join()
+        publisher.close(linger=0)
+        server.close(linger=0)
+        comm.cmd_socket.setsockopt(zmq.LINGER, 0)
+        comm.close()
+        print "%-10s %-10d %-15.1f %-15.1f" % ("pipeline" if threaded else "loop", len(planner.ages),
+                                               sum(planner.ages) * 1000 / len(planner.ages), max(planner.ages) * 1000)
+
+
+BENCHMARKS = [
+    ('rasterize', bench_rasterize),
+    ('astar', bench_astar),
+    ('map_cache', bench_map_cache),
+    ('hpa', bench_hpa),
+    ('jps', bench_jps),
+    ('clearance', bench_clearance),
+    ('theta', bench_theta),
+    ('fire_lanes', bench_fire_lanes),
+    ('dstar', bench_dstar),
+    ('game_state', bench_game_state),
+    ('tank_tables', bench_tank_tables),
+    ('friendly_fire', bench_friendly_fire),
+    ('projectiles', bench_projectiles),
+    ('intercepts', bench_intercepts),
+    ('targeting', bench_targeting),
+    ('tick_budget', bench_tick_budget),
+    ('path_pool', bench_path_pool),
+    ('command_filter', bench_command_filter),
+    ('command_encoder', bench_command_encoder),
+    ('value_objects', bench_value_objects),
+    ('state_decoder', bench_state_decoder),
+    ('receive_latest', bench_receive_latest),
+    ('pipelined_commands', bench_pipelined_commands),
+    ('client_pipeline', bench_client_pipeline),
+]
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [benchmark ...]")
+    (opts, args) = parser.parse_args()
+    for name, bench in BENCHMARKS:
+        if not args or name in args:
+            bench()
+            print
@@ -1,10 +1,16 @@
 import optparse
+from collections import deque
 import gameinfo
 import command
 import communication
 import json
 
 from algorithm import Algorithm
+from map_cache import MapCache
+from path_pool import PathPool
+from client_pipeline import ClientPipeline
+from command_filter import CommandFilter
+from state_decoder import StateDecoder
 
 
 class Client(object):
@@ -22,6 +28,25 @@ class Client(object):
         parser.add_option('-p', help='specifies the teams password', dest='team_password')
         parser.add_option('-m', help='specifies the match token', dest='match_token')
         parser.add_option('-n', help='specifies the host name', dest='host_name')
+        parser.add_option('-c', help='specifies a directory to persist rasterized maps in (optional)',
+                          dest='map_cache_dir')
+        parser.add_option('-b', help='specifies the planning time budget per tick in milliseconds (optional)',
+                          dest='tick_budget', type='float')
+        parser.add_option('-l', help='only plan on the latest game state when several are queued up (optional)',
+                          dest='latest_only', action='store_true', default=False)
+        parser.add_option('-s', help='wait for the reply of every command instead of pipelining them (optional)',
+                          dest='synchronous', action='store_true', default=False)
+        parser.add_option('-a', help='receive, plan and send on separate threads, planning on the latest game state '
+                                     '(optional)', dest='threaded', action='store_true', default=False)
+        parser.add_option('-f', help='drop commands that repeat the running ones, turning within this many radians '
+                                     'of where they already turn to (optional)', dest='angle_tolerance', type='float')
+        parser.add_option('-d', help='with -f, movements ending within this many metres are repeats (default 0.5)',
+                          dest='distance_tolerance', type='float', default=0.5)
+        parser.add_option('-w', help='specifies a number of worker processes to search paths in (optional)',
+                          dest='path_workers', type='int')
+        parser.add_option('-i', help='repair the path of every tank to every enemy from the previous tick with D* Lite '
+                                     'instead of one distance field per enemy (optional)',
+                          dest='incremental', action='store_true', default=False)
 
         global opts
         (opts, args) = parser.parse_args()
@@ -48,7 +73,8 @@ class Client(object):
 
         self.game_info = gameinfo.GameInfo(opts.team_name, opts.match_token, opts.team_password)
         self.cmd = command.Command()
-        self.comm = communication.Communication(opts.host_name)
+        self.comm = communication.Communication(opts.host_name, pipelined=not opts.synchronous)
+        self.path_pool = PathPool(opts.path_workers) if opts.path_workers else None
 
     def run(self):
         """
@@ -67,42 +93,48 @@ class Client(object):
         print 'Starting game...'
 
         map_needs_parsing = True
-        algo = Algorithm(self.game_info.team_name, self.game_info.client_token)
+        command_filter = None
+        if opts.angle_tolerance is not None:
+            command_filter = CommandFilter(opts.angle_tolerance, opts.distance_tolerance)
+        algo = Algorithm(self.game_info.team_name, self.game_info.client_token,
+                         map_cache=MapCache(cache_dir=opts.map_cache_dir),
+                         tick_budget=opts.tick_budget / 1000.0 if opts.tick_budget is not None else None,
+                         command_filter=command_filter, path_pool=self.path_pool, incremental=opts.incremental)
+        if opts.threaded:
+            pipeline = ClientPipeline(self.comm, algo, lambda message: self.handle_message(message, algo))
+            errors = pipeline.run()
+            print pipeline.report()
+            if errors:
+                print "Pipeline stopped by: %s" % ', '.join(repr(error) for error in errors)
+            print 'Exiting...'
+            exit()
+
+        decoder = StateDecoder()
+        pending = deque()
         while True:
-            raw_state_message = self.comm.receive(self.comm.Origin.PublishSocket)
+            if not pending:
+                if opts.latest_only:
+                    # Skip the game states we fell behind on, keep every control message
+                    pending.extend(self.comm.receive_latest())
+                else:
+                    pending.append(self.comm.receive(self.comm.Origin.PublishSocket))
+            raw_state_message = pending.popleft()
             algo.client_token = self.game_info.client_token
             try:
-                json_state_message = json.loads(raw_state_message)
+                # The map is only parsed once per game, don't decode its terrain again every tick
+                json_state_message = decoder.decode(raw_state_message, skip_map=not map_needs_parsing)
                 if json_state_message[self.cmd.COMM_TYPE] == command.CommType.GAME_STATE:
                     algo.parse_game_state(json_state_message, parse_map=map_needs_parsing)
                     map_needs_parsing = False
                     actions = algo.generate_actions()
-                    for action in actions:
-                        self.comm.send(action)
-                        """
-                        # Debugging purposes
-                        raw_command_message = ""
-                        try:
-                            raw_command_message = self.comm.receive(self.comm.Origin.CommandSocket)
-                            json_command_message = json.loads(raw_command_message)
-                            if json_command_message['resp'] == 'ok':
-                                continue
-                            else:
-                                print "Command did not execute properly!"
-                                print raw_command_message
-                        except Exception:
-                            print "Command did not return valid JSON message!"
-                            print raw_command_message
-                        """
+                    # Replies are collected in the background, errors counted per command type
+                    self.comm.send_batch(actions)
                     continue
                 elif json_state_message[self.cmd.COMM_TYPE] == command.CommType.GAME_START:
-                    print "Game Name: %s" % json_state_message['game_name']
-                    print "Timestamp: %s" % json_state_message['timestamp']
-                    print "Game Number: %s out of %s" % (
-                        json_state_message['game_num'], json_state_message ['game_count'])
+                    self.print_game_start(json_state_message)
                     continue
                 elif json_state_message[self.cmd.COMM_TYPE] == command.CommType.GAME_END:
-                    print "Game Ended! Moving onto the next game..."
+                    self.print_game_end(algo)
                     map_needs_parsing = True
                     continue
                 elif json_state_message[self.cmd.COMM_TYPE] == command.CommType.MATCH_END:
@@ -120,10 +152,51 @@ class Client(object):
         print 'Exiting...'
         exit()
 
+    def handle_message(self, message, algo):
+        """
+        Handles the messages of the pipeline that are not GAMESTATEs, on the plan stage's thread
+        """
+        if not isinstance(message, dict):
+            # Not valid json, this must the match token string
+            self.game_info.match_token = message
+        elif message[self.cmd.COMM_TYPE] == command.CommType.GAME_START:
+            self.print_game_start(message)
+        elif message[self.cmd.COMM_TYPE] == command.CommType.GAME_END:
+            self.print_game_end(algo)
+        elif message[self.cmd.COMM_TYPE] == command.CommType.MATCH_END:
+            print "Match Ended!"
+        else:
+            print "Something went wrong. No valid comm_type in server response but response is valid json!"
+            print message
+
+    def print_game_start(self, json_state_message):
+        print "Game Name: %s" % json_state_message['game_name']
+        print "Timestamp: %s" % json_state_message['timestamp']
+        print "Game Number: %s out of %s" % (
+            json_state_message['game_num'], json_state_message ['game_count'])
+
+    def print_game_end(self, algo):
+        print "Game Ended! Moving onto the next game..."
+        if opts.tick_budget is not None:
+            print "Tick budget overruns: %d of %d ticks, %d direct approach fallbacks" % (
+                algo.overruns, algo.ticks, algo.fallbacks)
+        if opts.latest_only or opts.threaded:
+            print "Dropped game states: %d of %d messages" % (self.comm.dropped, self.comm.received)
+        if self.path_pool is not None:
+            print "Path queries unfinished at the deadline: %d of %d" % (self.path_pool.unfinished,
+                                                                         self.path_pool.submitted)
+        if algo.command_filter is not None:
+            print "Redundant commands: %s" % algo.command_filter.report()
+        if self.comm.errors:
+            print "Command errors: %s of %d replies" % (
+                ', '.join('%s %d' % item for item in sorted(self.comm.errors.items())), self.comm.replies)
+
     def exit(self):
         """
         cleanup and exit
         """
+        if self.path_pool is not None:
+            self.path_pool.close()
         self.comm.close()
 
 
@@ -0,0 +1,309 @@
+import Queue
+import threading
+import time
+import traceback
+from collections import deque
+
+import command
+from state_decoder import StateDecoder
+
+# Seconds a stage waits on a socket or queue before it looks at the stop event again
+POLL_INTERVAL = 0.1
+
+
+class StageQueue(object):
+    """
+    Bounded FIFO between two stages of a ClientPipeline. An item put as replaceable supersedes the item waiting at
+    the tail if that one was replaceable as well, so the consumer only sees the newest game state or command batch.
+    Anything else waits its turn and a full queue blocks the producer.
+    maxsize (Integer)
+    * Most items waiting.
+    dropped (Integer)
+    * Number of items superseded before they were taken.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.tail_replaceable = False
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self):
+        with self.condition:
+            return len(self.items)
+
+    def put(self, item, replaceable=False, stop=None):
+        """
+        :param item: anything, None is the usual end of stream marker
+        :param replaceable: Boolean, the next replaceable item may supersede it
+        :param stop: threading.Event, give up waiting for room once it is set
+        :return Boolean, False if stop was set before there was room
+        """
+        with self.condition:
+            if replaceable and self.items and self.tail_replaceable:
+                self.items[-1] = item
+                self.dropped += 1
+            else:
+                while len(self.items) >= self.maxsize:
+                    if stop is not None and stop.is_set():
+                        return False
+                    self.condition.wait(POLL_INTERVAL)
+                self.items.append(item)
+            self.tail_replaceable = replaceable
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout=POLL_INTERVAL):
+        """
+        :param timeout: float, seconds to wait for an item
+        :return the oldest item
+        :raise Queue.Empty if there was none within timeout
+        """
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+            if not self.items:
+                raise Queue.Empty
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def clear(self):
+        """
+        :return Integer, number of items thrown away
+        """
+        with self.condition:
+            count = len(self.items)
+            self.items.clear()
+            self.condition.notify_all()
+            return count
+
+
+class Stage(threading.Thread):
+    """
+    One stage of a ClientPipeline, step is called on the stage's own thread until it returns False or the stop
+    event is set. An exception stops the whole pipeline.
+    step (function)
+    * Handles what is waiting, if anything, returns False once the stage is done.
+    processed (Integer)
+    * Number of items the stage handled.
+    busy (float)
+    * Seconds spent handling them, the rest of the time the stage was waiting.
+    error (Exception)
+    * What stopped the stage, None if it finished or was cancelled.
+    """
+
+    def __init__(self, name, step, stop_event):
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True
+        self.step = step
+        self.stop_event = stop_event
+        self.processed = 0
+        self.busy = 0.0
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set() and self.step():
+                pass
+        except Exception as error:
+            self.error = error
+            traceback.print_exc()
+            self.stop_event.set()
+
+    def handled(self, started):
+        self.processed += 1
+        self.busy += time.time() - started
+
+
+class ReceiveStage(Stage):
+    """
+    Receives publish messages, only the newest of the GAMESTATEs queued up, and decodes them. Decoded messages go
+    to the plan stage as (message, parse_map) pairs, the match token string as it is. A GAMESTATE still waiting is
+    superseded by the next one, unless it carries the map of a new game.
+    """
+
+    def __init__(self, comm, decoder, states, stop_event):
+        Stage.__init__(self, 'receive', self.receive, stop_event)
+        self.comm = comm
+        self.decoder = decoder
+        self.states = states
+        self.map_needs_parsing = True
+
+    def receive(self):
+        if not self.comm.poll(POLL_INTERVAL):
+            return True
+        for raw_message in self.comm.receive_latest():
+            started = time.time()
+            try:
+                # The map is only parsed once per game, don't decode its terrain again every tick
+                message = self.decoder.decode(raw_message, skip_map=not self.map_needs_parsing)
+                comm_type = message[command.Command.COMM_TYPE]
+            except ValueError:
+                # Not valid json, this must the match token string
+                message = raw_message
+                comm_type = None
+            parse_map = False
+            if comm_type == command.CommType.GAME_STATE:
+                parse_map = self.map_needs_parsing
+                self.map_needs_parsing = False
+            elif comm_type == command.CommType.GAME_END:
+                self.map_needs_parsing = True
+            replaceable = comm_type == command.CommType.GAME_STATE and not parse_map
+            if not self.states.put((message, parse_map), replaceable, self.stop_event):
+                return False
+            self.handled(started)
+            if comm_type == command.CommType.MATCH_END:
+                return False
+        return True
+
+
+class PlanStage(Stage):
+    """
+    Plans on every game state the receive stage hands over and queues the resulting command batch, a batch not
+    sent yet is superseded by the next one. Batches go with the records of the algorithm's CommandFilter, which
+    only takes them as running once the send stage sent them. Other messages are passed to on_message. On
+    GAME_END the batches of the game that ended are cancelled, on MatchEnd the send stage is told to finish.
+    cancelled (Integer)
+    * Number of command batches thrown away at GAME_END.
+    """
+
+    def __init__(self, algo, states, commands, on_message, stop_event):
+        Stage.__init__(self, 'plan', self.plan, stop_event)
+        self.algo = algo
+        self.states = states
+        self.commands = commands
+        self.on_message = on_message
+        self.cancelled = 0
+
+    def plan(self):
+        try:
+            message, parse_map = self.states.get()
+        except Queue.Empty:
+            return True
+        started = time.time()
+        comm_type = message[command.Command.COMM_TYPE] if isinstance(message, dict) else None
+        if comm_type == command.CommType.GAME_STATE:
+            self.algo.parse_game_state(message, parse_map=parse_map)
+            batch = self.algo.generate_actions()
+            records = self.algo.command_filter.take_pending() if self.algo.command_filter is not None else None
+            if not self.commands.put((batch, records), True, self.stop_event):
+                return False
+        else:
+            if comm_type == command.CommType.GAME_END:
+                self.cancelled += self.commands.clear()
+            self.on_message(message)
+        self.handled(started)
+        if comm_type == command.CommType.MATCH_END:
+            self.commands.put(None, False, self.stop_event)
+            return False
+        return True
+
+
+class SendStage(Stage):
+    """
+    Sends every command batch of the plan stage with Communication.send_batch and collects the replies in between.
+    The records of a sent batch are committed to command_filter.
+    """
+
+    def __init__(self, comm, commands, command_filter, stop_event):
+        Stage.__init__(self, 'send', self.send, stop_event)
+        self.comm = comm
+        self.commands = commands
+        self.command_filter = command_filter
+
+    def send(self):
+        try:
+            batch = self.commands.get()
+        except Queue.Empty:
+            self.comm.collect_replies()
+            return True
+        if batch is None:
+            self.comm.collect_replies()
+            return False
+        started = time.time()
+        batch, records = batch
+        self.comm.send_batch(batch)
+        if records is not None:
+            self.command_filter.commit(records)
+        self.handled(started)
+        return True
+
+
+class ClientPipeline(object):
+    """
+    Runs the client as three stages on their own threads, connected by bounded queues: receive and decode, plan on
+    the latest state, send the commands. Network waits overlap planning since zmq and the numpy kernels release the
+    GIL while they wait or compute. Each socket is used by one stage only, the publish socket by the receive stage
+    and the command socket by the send stage, once the pipeline is started.
+    The pipeline finishes on MatchEnd, cancel stops every stage at its next look at the stop event.
+    stages (Stage Array)
+    * The receive, plan and send stages.
+    """
+
+    def __init__(self, comm, algo, on_message, state_queue_size=2, command_queue_size=2):
+        """
+        :param comm: Communication, connected
+        :param algo: Algorithm
+        :param on_message: function, called on the plan stage's thread with every json message that is not a
+                           GAMESTATE and with the match token string
+        :param state_queue_size: Integer, most messages waiting for the plan stage
+        :param command_queue_size: Integer, most command batches waiting for the send stage
+        """
+        self.stop_event = threading.Event()
+        if algo.command_filter is not None:
+            # A batch superseded in the queue is never sent, its commands must not count as running
+            algo.command_filter.deferred = True
+        self.states = StageQueue(state_queue_size)
+        self.commands = StageQueue(command_queue_size)
+        self.receiver = ReceiveStage(comm, StateDecoder(), self.states, self.stop_event)
+        self.planner = PlanStage(algo, self.states, self.commands, on_message, self.stop_event)
+        self.sender = SendStage(comm, self.commands, algo.command_filter, self.stop_event)
+        self.stages = [self.receiver, self.planner, self.sender]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def is_alive(self):
+        return any(stage.is_alive() for stage in self.stages)
+
+    def join(self, timeout=None):
+        """
+        Waits for every stage to finish, in short slices so KeyboardInterrupt still gets through.
+        :param timeout: float, seconds, None waits for as long as it takes
+        :return Boolean, True if every stage finished
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while self.is_alive():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            for stage in self.stages:
+                stage.join(POLL_INTERVAL)
+        return True
+
+    def run(self):
+        """
+        Starts the stages and waits until the match ends, or cancels them on KeyboardInterrupt.
+        :return Exception Array, errors that stopped a stage
+        """
+        self.start()
+        try:
+            self.join()
+        except KeyboardInterrupt:
+            self.cancel()
+            self.join()
+            raise
+        return [stage.error for stage in self.stages if stage.error is not None]
+
+    def report(self):
+        """
+        :return String, the items handled and seconds busy of every stage and what was superseded or cancelled
+        """
+        stages = ', '.join('%s %d (%.1f s busy)' % (stage.name, stage.processed, stage.busy) for stage in self.stages)
+        return '%s; superseded %d game states, %d command batches; cancelled %d command batches' % (
+            stages, self.states.dropped, self.commands.dropped, self.planner.cancelled)
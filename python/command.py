@@ -124,6 +124,116 @@ class Command(object):
         return json.dumps(cmd_dict)
 
 
+class CommandEncoder(object):
+    """
+    Renders the game move commands of the Command.get_* builders from per tank templates, created once per game.
+    The tank_id and client_token of every tank are serialized once, with every comm_type, direction and STOP
+    control around them, so a command only costs the formatting of its number. The output is the same JSON once
+    parsed, only the key order may differ. Directions the templates don't know go through the Command builders.
+    Actions are (comm_type, tank_id, argument, value) tuples: the direction and the distance or rads of a
+    movement or rotation, the control of a STOP, None for whatever the comm_type has no use for.
+    client_token (String)
+    * Token every command is signed with.
+    """
+
+    def __init__(self, client_token):
+        self.client_token = client_token
+        self.token = json.dumps(client_token)
+        # tank_id -> (comm_type, argument) -> template
+        self.templates = {}
+
+    def get_templates(self, tank_id):
+        """
+        :param tank_id: String, id of the tank
+        :return dict, (comm_type, argument) -> the command up to its number, or all of it if it has none
+        """
+        templates = self.templates.get(tank_id)
+        if templates is None:
+            prefix = '{"%s": %s, "%s": %s, "%s": ' % (Command.TANK_ID, json.dumps(tank_id), Command.CLIENT_TOKEN,
+                                                     self.token, Command.COMM_TYPE)
+            templates = {}
+            for comm_type, key, directions in ((CommType.MOVEMENT, Command.DISTANCE, ('FWD', 'REV')),
+                                               (CommType.TANK_ROTATE, Command.RADS, ('CW', 'CCW')),
+                                               (CommType.TURRET_ROTATE, Command.RADS, ('CW', 'CCW'))):
+                for direction in directions:
+                    templates[(comm_type, direction)] = prefix + '"%s", "%s": "%s", "%s": ' % (
+                        comm_type, Command.DIRECTION, direction, key)
+            templates[(CommType.FIRE, None)] = prefix + '"%s"}' % CommType.FIRE
+            for control in (CommType.MOVEMENT, CommType.TANK_ROTATE, CommType.TURRET_ROTATE, CommType.FIRE):
+                templates[(CommType.STOP, control)] = prefix + '"%s", "%s": "%s"}' % (CommType.STOP, Command.CONTROL,
+                                                                                      control)
+            self.templates[tank_id] = templates
+        return templates
+
+    def encode(self, comm_type, tank_id, argument=None, value=None):
+        """
+        :param comm_type: String, CommType.MOVEMENT, TANK_ROTATE, TURRET_ROTATE, FIRE or STOP
+        :param tank_id: String, id of the tank
+        :param argument: String, direction of a movement or rotation, control of a STOP
+        :param value: Number, distance of a movement, rads of a rotation
+        :return String, json command
+        """
+        template = self.get_templates(tank_id).get((comm_type, argument))
+        if template is None:
+            return self.build(comm_type, tank_id, argument, value)
+        if value is None:
+            return template
+        return template + CommandEncoder.encode_number(value) + '}'
+
+    def encode_actions(self, actions):
+        """
+        :param actions: (comm_type, tank_id, argument, value) Array, e.g. the commands of a whole tick
+        :return String Array, json commands in the same order, the frames to send
+        """
+        known = self.templates
+        frames = []
+        for comm_type, tank_id, argument, value in actions:
+            templates = known.get(tank_id)
+            if templates is None:
+                templates = self.get_templates(tank_id)
+            template = templates.get((comm_type, argument))
+            if template is None:
+                frames.append(self.build(comm_type, tank_id, argument, value))
+            elif value is None:
+                frames.append(template)
+            elif type(value) is float and value - value == 0:
+                # Most values, inline
+                frames.append(template + repr(value) + '}')
+            else:
+                frames.append(template + CommandEncoder.encode_number(value) + '}')
+        return frames
+
+    def build(self, comm_type, tank_id, argument=None, value=None):
+        """
+        Same as encode, through the Command builders.
+        """
+        if comm_type == CommType.MOVEMENT:
+            return Command.get_movement_command(tank_id, argument, value, self.client_token)
+        elif comm_type == CommType.TANK_ROTATE:
+            return Command.get_tank_rotation_command(tank_id, argument, value, self.client_token)
+        elif comm_type == CommType.TURRET_ROTATE:
+            return Command.get_turret_rotation_command(tank_id, argument, value, self.client_token)
+        elif comm_type == CommType.FIRE:
+            return Command.get_fire_command(tank_id, self.client_token)
+        elif comm_type == CommType.STOP:
+            return Command.get_stop_command(tank_id, argument, self.client_token)
+        raise ValueError('not a game move comm_type: %s' % comm_type)
+
+    @staticmethod
+    def encode_number(value):
+        """
+        :param value: Number, numpy floats included
+        :return String, the value as json.dumps writes it
+        """
+        if isinstance(value, (int, long)):
+            return json.dumps(value)
+        value = float(value)
+        if value - value == 0:
+            return repr(value)
+        # NaN and Infinity
+        return json.dumps(value)
+
+
 class CommType(object):
     MATCH_CONNECT = 'MatchConnect'
     MOVEMENT = 'MOVE'
@@ -0,0 +1,143 @@
+import math
+
+from command import CommType
+
+
+class CommandFilter(object):
+    """
+    Remembers the last command of every control type issued to every tank and drops the resends that would not
+    change what the tank is doing. The server replaces a running command with the new one, so a rotation or
+    movement aiming where the running one already aims is redundant. Rotations are compared by the heading they
+    end at and movements by the distance still to go, so a command that is partly carried out still matches its
+    resend. FIRE is always sent, a STOP of the gun that is already stopped is not.
+    angle_tolerance (float)
+    * Radians two rotations may end apart and still count as the same command.
+    distance_tolerance (float)
+    * Metres two movements may end apart and still count as the same command.
+    refresh_ticks (Integer)
+    * Ticks after which a command is sent again even if nothing changed, in case it was lost or cancelled.
+    issued, suppressed (dict)
+    * comm_type -> number of commands let through and dropped.
+    deferred (Boolean)
+    * Hold the commands let through in pending until they are committed, for batches that may never be sent.
+    """
+
+    def __init__(self, angle_tolerance=0.02, distance_tolerance=0.5, refresh_ticks=10):
+        self.angle_tolerance = angle_tolerance
+        self.distance_tolerance = distance_tolerance
+        self.refresh_ticks = refresh_ticks
+        self.tick = 0
+        # (tank id, control) -> (tick, state) of the last command let through
+        self.last = {}
+        # ((tank id, control), (tick, state)) of the commands let through and not committed yet
+        self.pending = []
+        self.deferred = False
+        self.issued = {}
+        self.suppressed = {}
+
+    def reset(self):
+        """
+        Forget the commands of the previous game.
+        """
+        self.last.clear()
+        del self.pending[:]
+
+    def next_tick(self):
+        self.tick += 1
+
+    def keep_rotation(self, tank_id, control, heading, direction, rads):
+        """
+        :param tank_id: String, id of the tank
+        :param control: String, CommType.TANK_ROTATE or CommType.TURRET_ROTATE
+        :param heading: Number, current angle of the tracks or turret in radians
+        :param direction: String, CW or CCW
+        :param rads: Number, non negative radians to turn
+        :return Boolean, True if the command has to be sent
+        """
+        target = heading + (rads if direction == 'CCW' else -rads)
+        last = self._get_last(tank_id, control)
+        redundant = False
+        if last is not None:
+            last_direction, last_target = last
+            offset = (target - last_target + math.pi) % (2 * math.pi) - math.pi
+            redundant = ((direction == last_direction or rads <= self.angle_tolerance) and
+                         abs(offset) <= self.angle_tolerance)
+        return self._record(tank_id, control, control, (direction, target), redundant)
+
+    def keep_movement(self, tank_id, position, direction, distance):
+        """
+        :param tank_id: String, id of the tank
+        :param position: (x, y), current position of the tank
+        :param direction: String, FWD or REV
+        :param distance: Number, metres to move
+        :return Boolean, True if the command has to be sent
+        """
+        last = self._get_last(tank_id, CommType.MOVEMENT)
+        redundant = False
+        if last is not None:
+            last_direction, last_distance, last_position = last
+            remaining = max(last_distance - math.hypot(position[0] - last_position[0],
+                                                       position[1] - last_position[1]), 0)
+            redundant = direction == last_direction and abs(distance - remaining) <= self.distance_tolerance
+        return self._record(tank_id, CommType.MOVEMENT, CommType.MOVEMENT,
+                            (direction, distance, tuple(position)), redundant)
+
+    def keep_fire(self, tank_id, fire):
+        """
+        :param tank_id: String, id of the tank
+        :param fire: Boolean, True for a FIRE command, False for a STOP of the FIRE control
+        :return Boolean, True if the command has to be sent
+        """
+        comm_type = CommType.FIRE if fire else CommType.STOP
+        redundant = not fire and self._get_last(tank_id, CommType.FIRE) == CommType.STOP
+        return self._record(tank_id, CommType.FIRE, comm_type, comm_type, redundant)
+
+    def take_pending(self):
+        """
+        :return list, the commands let through since the last call, for commit once their batch was sent
+        """
+        records, self.pending = self.pending, []
+        return records
+
+    def commit(self, records):
+        """
+        Remember the commands of a batch that was sent as the running ones.
+        :param records: list, from take_pending
+        """
+        self.last.update(records)
+
+    def get_saving(self):
+        """
+        :return float, share of the commands that were dropped
+        """
+        suppressed = sum(self.suppressed.values())
+        total = suppressed + sum(self.issued.values())
+        return float(suppressed) / total if total else 0.0
+
+    def report(self):
+        """
+        :return String, commands dropped of every comm_type and the share of the traffic saved
+        """
+        comm_types = sorted(set(self.issued) | set(self.suppressed))
+        return '%s; %.0f%% of the commands suppressed' % (', '.join(
+            '%s %d of %d' % (comm_type, self.suppressed.get(comm_type, 0),
+                             self.suppressed.get(comm_type, 0) + self.issued.get(comm_type, 0))
+            for comm_type in comm_types), 100 * self.get_saving())
+
+    def _get_last(self, tank_id, control):
+        entry = self.last.get((tank_id, control))
+        if entry is None or self.tick - entry[0] >= self.refresh_ticks:
+            return None
+        return entry[1]
+
+    def _record(self, tank_id, control, comm_type, state, redundant):
+        if redundant:
+            # The running command keeps its state, small differences don't add up over the ticks
+            self.suppressed[comm_type] = self.suppressed.get(comm_type, 0) + 1
+            return False
+        if self.deferred:
+            self.pending.append(((tank_id, control), (self.tick, state)))
+        else:
+            self.last[(tank_id, control)] = (self.tick, state)
+        self.issued[comm_type] = self.issued.get(comm_type, 0) + 1
+        return True
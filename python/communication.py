@@ -1,6 +1,10 @@
 import zmq
 import json
+import re
 import command
+from collections import deque
+
+COMM_TYPE = re.compile(r'"%s"\s*:\s*"([^"]*)"' % command.Command.COMM_TYPE)
 
 
 class Communication(object):
@@ -8,9 +12,13 @@ class Communication(object):
     handles communication to/from the server
     """
 
-    def __init__(self, host_name):
+    MAX_IN_FLIGHT = 256
+
+    def __init__(self, host_name, pipelined=True):
         """
         initializes Communication object
+        with 'pipelined' the command socket is a DEALER that sends a tick's commands without waiting for
+        each reply, otherwise a REQ socket waits for the reply of every command
         """
         pub_socket_addr = "tcp://%s:%s" % (host_name, 5556)
         cmd_socket_addr = "tcp://%s:%s" % (host_name, 5557)
@@ -19,9 +27,20 @@ class Communication(object):
         self.pub_socket = self.context.socket(zmq.SUB)
         self.pub_socket.connect(pub_socket_addr)
 
-        self.cmd_socket = self.context.socket(zmq.REQ)
+        self.pipelined = pipelined
+        self.cmd_socket = self.context.socket(zmq.DEALER if pipelined else zmq.REQ)
         self.cmd_socket.connect(cmd_socket_addr)
 
+        # comm_type of every pipelined command still waiting for its reply, the server answers in order
+        self.in_flight = deque()
+        # Command replies received and the replies that were not 'ok', per comm_type
+        self.replies = 0
+        self.errors = {}
+
+        # Publish messages received and game states skipped by receive_latest
+        self.received = 0
+        self.dropped = 0
+
     def set_subscription(self, value):
         """
         sets the subscription for the publish socket
@@ -36,7 +55,12 @@ class Communication(object):
         extracts and returns 'key' from the servers reply
         if no 'key' specified, returns the entire reply
         """
-        self.cmd_socket.send(message)
+        if self.pipelined:
+            # The next reply has to be ours
+            self.collect_replies(block=True)
+            self.cmd_socket.send_multipart(['', message])
+        else:
+            self.cmd_socket.send(message)
         reply = self.receive(Communication.Origin.CommandSocket)
 
         if key is None:
@@ -44,6 +68,59 @@ class Communication(object):
         else:
             return json.loads(reply)[key]
 
+    def send_batch(self, messages):
+        """
+        sends every message in 'messages' to the servers command socket
+        pipelined, the replies of earlier commands that arrived meanwhile are collected first and the batch is
+        pushed without waiting, its replies are collected on later calls
+        synchronous, every command waits for its reply
+        """
+        if not self.pipelined:
+            for message in messages:
+                self.count_reply(Communication.get_comm_type(message), self.send(message))
+            return
+        self.collect_replies()
+        for message in messages:
+            if len(self.in_flight) >= Communication.MAX_IN_FLIGHT:
+                # The server fell behind, wait for its oldest reply rather than queue up without bound
+                self.collect_reply()
+            # Empty delimiter frame, the envelope a REQ socket would add
+            self.cmd_socket.send_multipart(['', message])
+            self.in_flight.append(Communication.get_comm_type(message))
+
+    def collect_replies(self, block=False):
+        """
+        counts the replies of pipelined commands that have arrived
+        with 'block' waits until every command has its reply
+        """
+        while self.in_flight:
+            if not self.collect_reply(0 if block else zmq.NOBLOCK):
+                break
+
+    def collect_reply(self, flags=0):
+        """
+        receives and counts the reply of the oldest pipelined command
+        returns False if 'flags' is zmq.NOBLOCK and no reply has arrived yet
+        """
+        try:
+            reply = self.cmd_socket.recv_multipart(flags)[-1]
+        except zmq.Again:
+            return False
+        self.count_reply(self.in_flight.popleft(), reply)
+        return True
+
+    def count_reply(self, comm_type, reply):
+        """
+        counts a command reply, an error for 'comm_type' unless it is valid json with 'resp' 'ok'
+        """
+        self.replies += 1
+        try:
+            ok = json.loads(reply).get('resp') == 'ok'
+        except (ValueError, AttributeError):
+            ok = False
+        if not ok:
+            self.errors[comm_type] = self.errors.get(comm_type, 0) + 1
+
     def receive(self, origin):
         """
         returns a message from the socket specified by 'origin'
@@ -52,13 +129,56 @@ class Communication(object):
         if origin == Communication.Origin.PublishSocket:
             reply = self.pub_socket.recv()
         elif origin == Communication.Origin.CommandSocket:
-            reply = self.cmd_socket.recv()
+            # A DEALER reply starts with the empty delimiter frame
+            reply = self.cmd_socket.recv_multipart()[-1]
         else:
             print '[Communication receive] wrong origin specified'
             exit(1)
 
         return reply
 
+    def poll(self, timeout):
+        """
+        returns True once a publish message is waiting, False if none arrived within 'timeout' seconds
+        """
+        return bool(self.pub_socket.poll(int(timeout * 1000)))
+
+    def receive_latest(self):
+        """
+        returns every publish message queued up since the last call, waiting for one if there is none,
+        with all but the newest GAMESTATE dropped. Control messages (GAME_START, GAME_END, MatchEnd, the match
+        token) are all kept in order. zmq.CONFLATE is not used since it would drop those as well.
+        """
+        messages = [self.pub_socket.recv()]
+        while True:
+            try:
+                messages.append(self.pub_socket.recv(zmq.NOBLOCK))
+            except zmq.ZMQError:
+                break
+        kept = Communication.conflate(messages)
+        self.received += len(messages)
+        self.dropped += len(messages) - len(kept)
+        return kept
+
+    @staticmethod
+    def conflate(messages):
+        """
+        returns the messages without the GAMESTATEs superseded by a later GAMESTATE
+        the comm_type is found without decoding, a GAMESTATE repeats the whole map
+        """
+        states = [i for i, message in enumerate(messages) if Communication.get_comm_type(message) ==
+                  command.CommType.GAME_STATE]
+        superseded = set(states[:-1])
+        return [message for i, message in enumerate(messages) if i not in superseded]
+
+    @staticmethod
+    def get_comm_type(message):
+        """
+        returns the comm_type of a raw message, None if it has none
+        """
+        match = COMM_TYPE.search(message)
+        return match.group(1) if match is not None else None
+
     def match_ended(self):
         while True:
             try:
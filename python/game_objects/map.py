@@ -1,17 +1,53 @@
+import hashlib
+import math
+from collections import OrderedDict
+
 import numpy
-from heapq import heappop, heappush
+
+from pathfinding.astar import GridAStar
+from pathfinding.distance_field import DistanceFieldCache
+from pathfinding.dstar_lite import DStarLite
+from pathfinding.hpa import HierarchicalPathfinder
+from pathfinding.jps import JumpPointSearch
+from pathfinding.theta import LazyThetaStar, compress_path, smooth_path
 
 
-class Map:
+class Map(object):
     """
     Map origin (0, 0) is bottom left
     size (Integer Tuple)
     * The width and height, in metres, of the game map (In that order).
     obstacles (Obstacle Array)
     * Array of obstacles on the map
+    fingerprint (String)
+    * Canonical digest of the size and terrain, see get_fingerprint. Used for equality, hashing and caching.
     col_grid (numpy.array)
     * Representation of the map wrt map coordinates numbering for a-star search.
     * (0 - No obstacle, 1 - Obstacle)
+    shot_grid (numpy.array)
+    * Same layout as col_grid, but only with the terrain that stops projectiles. IMPASSABLE terrain stops tanks
+      and lets projectiles through, SOLID terrain stops both.
+    * (0 - Projectiles pass, 1 - Solid)
+    path_method (String)
+    * Default search used by get_shortest_path, see PathMethod.
+    clearance (numpy.array)
+    * Distance, in metres, from every cell centre to the nearest obstacle or map edge. Computed on first use.
+    inflated_grids (dict)
+    * Collision radius -> configuration space grid, col_grid with every cell closer than the radius to an obstacle
+      marked as an obstacle. The raw col_grid is stored under radius 0.
+    path_engines (dict)
+    * Collision radius -> GridAStar over the inflated grid, search arrays are reused between calls.
+    hierarchical_engines (dict)
+    * Collision radius -> HierarchicalPathfinder, precomputed on the first PathMethod.HPA search.
+    jump_point_engines (dict)
+    * Collision radius -> JumpPointSearch, created on the first PathMethod.JPS search.
+    any_angle_engines (dict)
+    * Collision radius -> LazyThetaStar, created on the first PathMethod.THETA search.
+    distance_fields (dict)
+    * Collision radius -> DistanceFieldCache, least recently used reverse distance fields keyed by goal cell.
+    incremental_planners (OrderedDict)
+    * (pair, collision radius) -> DStarLite, least recently used search state kept across ticks for every
+      (our tank, target) pair, see get_incremental_path.
     grid (2D Matrix)
     * Representation of the map wrt map coordinates numbering.
     * (0 - No obstacle, 1 - Impassable, 2 - Solid)
@@ -20,48 +56,246 @@ class Map:
     """
     # Setting this to 1 is pixel perfect pathing, but that's fucking slow
     RESOLUTION = 10
-    size = []
-    obstacles = []
-    col_grid = numpy.array([])
+    # Number of per-goal distance fields kept per map, a few per enemy tank
+    DISTANCE_FIELD_CACHE_SIZE = 16
+    # Width and height, in cells, of the clusters used by PathMethod.HPA
+    HPA_CLUSTER_SIZE = 10
+    # Clearance is only resolved up to this many metres, anything further reports this value
+    CLEARANCE_LIMIT = 50
+    # Number of (our tank, target) pairs whose incremental search state is kept per map
+    INCREMENTAL_PLANNER_CACHE_SIZE = 32
+    __slots__ = ('size', 'obstacles', 'col_grid', 'shot_grid', 'fingerprint', 'path_method', 'clearance',
+                 'inflated_grids', 'path_engines', 'hierarchical_engines', 'jump_point_engines', 'any_angle_engines',
+                 'distance_fields', 'incremental_planners')
 
-    def __init__(self, size, obstacles):
+    def __init__(self, size, obstacles, col_grid=None, path_method=None, shot_grid=None, clearance=None):
+        """
+        :param col_grid: numpy.array, already rasterized collision grid of this map, e.g. memory mapped by MapCache
+        :param shot_grid: numpy.array, already rasterized shot_grid of this map
+        :param clearance: numpy.array, already computed clearance of this map, see get_clearance
+        """
         self.size = size
         self.obstacles = obstacles
+        self.path_method = path_method if path_method is not None else PathMethod.ASTAR
+        self.fingerprint = Map.get_fingerprint(
+                size, [(obstacle.type, obstacle.corner, obstacle.size) for obstacle in obstacles])
+        self.clearance = clearance
+        self.inflated_grids = {}
+        self.path_engines = {}
+        self.hierarchical_engines = {}
+        self.jump_point_engines = {}
+        self.any_angle_engines = {}
+        self.distance_fields = {}
+        self.incremental_planners = OrderedDict()
 
-        # Create the grid for pathfinding purposes.
-        # NOTE: If any obstacles overlap, later obstacles will overwrite newer obstacles.
-        self.col_grid = numpy.array(
-                [[0 for y in range(size[1] / Map.RESOLUTION)] for x in range(size[0] / Map.RESOLUTION)])
+        # Create the grid for pathfinding purposes, unless an already rasterized grid for this map was given.
+        # NOTE: Obstacles are clipped to the map, so obstacles extending past the map edges are trimmed.
+        if col_grid is None:
+            col_grid = Map.rasterize_boxes(
+                    (size[0] / Map.RESOLUTION, size[1] / Map.RESOLUTION), Map.get_obstacle_boxes(obstacles),
+                    Map.RESOLUTION)
+        self.col_grid = col_grid
+        self.inflated_grids[0.0] = col_grid
+        if shot_grid is None:
+            shot_grid = Map.rasterize_boxes(
+                    col_grid.shape, Map.get_obstacle_boxes(obstacles, terrain_types=("SOLID",)), Map.RESOLUTION)
+        self.shot_grid = shot_grid
+        # print self.get_col_grid_display()
+
+    @staticmethod
+    def get_fingerprint(size, terrain):
+        """
+        Canonical identity of a map, independent of the order the terrain was listed in.
+        The resolution is included since it changes every derived grid.
+        :param size: 2-tuple, Integers (width, height) of the map in metres
+        :param terrain: iterable of (type, corner, size) for every obstacle
+        :return String, hex digest
+        """
+        # Json gives unicode terrain types, which would not repr like the same types built from str literals
+        canonical = sorted((str(raw_type), tuple(corner), tuple(extent)) for raw_type, corner, extent in terrain)
+        return hashlib.sha1(repr((Map.RESOLUTION, tuple(size), canonical))).hexdigest()
+
+    @staticmethod
+    def get_obstacle_boxes(obstacles, terrain_types=None):
+        """
+        Convert the obstacles that block tanks into bounding boxes for rasterization.
+        :param obstacles: Obstacle array
+        :param terrain_types: iterable of terrain types to keep, None for everything that blocks tanks
+        :return numpy.array, (N, 4) integer array of [corner x, corner y, size x, size y] in metres
+        """
+        boxes = []
         for obstacle in obstacles:
             raw_terrain_type = obstacle.type
             if raw_terrain_type == "NORMAL":
                 # Passable by Projectiles and Tanks, equivalent to 0
                 continue
-            elif raw_terrain_type == "IMPASSABLE":
-                terrain_type = 1
-            elif raw_terrain_type == "SOLID":
-                terrain_type = 2
-            else:
+            elif terrain_types is not None:
+                if raw_terrain_type not in terrain_types:
+                    continue
+            elif raw_terrain_type not in ("IMPASSABLE", "SOLID"):
                 print "Unknown terrain type: %s" % raw_terrain_type
-                terrain_type = 9
             origin_x, origin_y = map(int, obstacle.corner)
             size_x, size_y = map(int, obstacle.size)
-            for writer_x in xrange(0, size_x):
-                for writer_y in xrange(0, size_y):
-                    try:
-                        self.col_grid[(origin_x + writer_x) / Map.RESOLUTION][
-                            (origin_y + writer_y) / Map.RESOLUTION] = 1
-                    except IndexError:
-                        # Obstacles seem to be able to extend past the map
-                        pass
-        pass
-        # print self.get_mod_10_grid_display()
-        # print self.col_grid
-        # print "#" * 80
-        # print self.get_col_grid_display()
+            boxes.append((origin_x, origin_y, size_x, size_y))
+        return numpy.array(boxes, dtype=int).reshape(-1, 4)
+
+    @staticmethod
+    def rasterize_box(grid, box, resolution):
+        """
+        Mark every cell covered by a single bounding box, clipped to the grid, with a whole slice assignment.
+        :param grid: numpy.array, collision grid indexed [x][y], modified in place
+        :param box: 4-tuple, Integers (corner x, corner y, size x, size y) in metres
+        :param resolution: Integer, metres per grid cell
+        """
+        origin_x, origin_y, size_x, size_y = box
+        if size_x <= 0 or size_y <= 0:
+            return
+        lo_x = max(origin_x, 0) / resolution
+        lo_y = max(origin_y, 0) / resolution
+        hi_x = min((origin_x + size_x - 1) / resolution + 1, grid.shape[0])
+        hi_y = min((origin_y + size_y - 1) / resolution + 1, grid.shape[1])
+        if lo_x < hi_x and lo_y < hi_y:
+            grid[lo_x:hi_x, lo_y:hi_y] = 1
+
+    @staticmethod
+    def rasterize_boxes(shape, boxes, resolution):
+        """
+        Build a collision grid from all bounding boxes at once.
+        Every box is clipped to the grid and written as +1/-1 corners of a summed area table,
+        so the cost is independent of the obstacle area.
+        :param shape: 2-tuple, Integers (cells x, cells y) of the grid
+        :param boxes: numpy.array, (N, 4) integer array of [corner x, corner y, size x, size y] in metres
+        :param resolution: Integer, metres per grid cell
+        :return numpy.array, grid indexed [x][y] (0 - No obstacle, 1 - Obstacle)
+        """
+        boxes = numpy.asarray(boxes, dtype=int).reshape(-1, 4)
+        boxes = boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+        lo_x = numpy.maximum(boxes[:, 0], 0) // resolution
+        lo_y = numpy.maximum(boxes[:, 1], 0) // resolution
+        hi_x = numpy.minimum((boxes[:, 0] + boxes[:, 2] - 1) // resolution + 1, shape[0])
+        hi_y = numpy.minimum((boxes[:, 1] + boxes[:, 3] - 1) // resolution + 1, shape[1])
+        inside = (lo_x < hi_x) & (lo_y < hi_y)
+        lo_x, lo_y, hi_x, hi_y = lo_x[inside], lo_y[inside], hi_x[inside], hi_y[inside]
+
+        corners = numpy.zeros((shape[0] + 1, shape[1] + 1), dtype=int)
+        numpy.add.at(corners, (lo_x, lo_y), 1)
+        numpy.add.at(corners, (hi_x, lo_y), -1)
+        numpy.add.at(corners, (lo_x, hi_y), -1)
+        numpy.add.at(corners, (hi_x, hi_y), 1)
+        coverage = corners.cumsum(axis=0).cumsum(axis=1)[:shape[0], :shape[1]]
+        return (coverage > 0).astype(int)
+
+    @staticmethod
+    def _traverse_segments(grid, segments, resolution):
+        """
+        Every cell the segments pass through, the cells of all segments flattened into one array.
+        Past its start cell a segment enters a new cell wherever it crosses a vertical or horizontal cell border, so
+        the crossings of all segments with both sets of borders are computed at once. Points on or past the far map
+        edges are clamped into the last row or column of cells.
+        :return (numpy.array, numpy.array, numpy.array, numpy.array, numpy.array), segment row, fraction along the
+                segment where the cell is entered, blocked flag and whether the cell is the start or the end cell
+                of its segment, for every cell
+        """
+        shape = numpy.array(grid.shape)
+        origins = segments[:, :2]
+        deltas = segments[:, 2:] - origins
+        firsts = numpy.clip((origins // resolution).astype(int), 0, shape - 1)
+        lasts = numpy.clip((segments[:, 2:] // resolution).astype(int), 0, shape - 1)
+        steps = numpy.sign(lasts - firsts)
+        crossings = numpy.abs(lasts - firsts)
+        owners = [numpy.arange(len(segments))]
+        fractions = [numpy.zeros(len(segments))]
+        cells = [firsts]
+        for axis, other in ((0, 1), (1, 0)):
+            counts = crossings[:, axis]
+            owner = numpy.repeat(numpy.arange(len(segments)), counts)
+            entered = firsts[owner, axis] + steps[owner, axis] * (
+                    numpy.arange(counts.sum()) - (numpy.cumsum(counts) - counts)[owner] + 1)
+            # The border between the cell left and the cell entered
+            borders = (entered + (steps[owner, axis] < 0)) * resolution
+            fraction = numpy.clip((borders - origins[owner, axis]) / deltas[owner, axis], 0, 1)
+            cell = numpy.empty((len(owner), 2), dtype=int)
+            cell[:, axis] = entered
+            cell[:, other] = numpy.clip(((origins[owner, other] + fraction * deltas[owner, other]) // resolution)
+                                        .astype(int), 0, shape[other] - 1)
+            owners.append(owner)
+            fractions.append(fraction)
+            cells.append(cell)
+        owners = numpy.concatenate(owners)
+        cells = numpy.concatenate(cells)
+        hits = numpy.asarray(grid)[cells[:, 0], cells[:, 1]] != 0
+        return (owners, numpy.concatenate(fractions), hits, (cells == firsts[owners]).all(axis=1),
+                (cells == lasts[owners]).all(axis=1))
+
+    @staticmethod
+    def get_lines_of_sight(grid, segments, resolution):
+        """
+        Line of sight for a whole batch of segments in one vectorized traversal.
+        Every cell a segment passes through is looked up at once, a segment is clear when none of them is blocked.
+        The start and end cells are not checked, like theta.has_line_of_sight does for the first cell, so a tank in
+        a cell an obstacle partly covers can still fire out of it and be fired at.
+        :param grid: numpy.array, grid indexed [x][y] (0 - Clear, anything else - Blocked)
+        :param segments: numpy.array, (N, 4) array of [from x, from y, to x, to y] in metres
+        :param resolution: Integer, metres per grid cell
+        :return numpy.array, N booleans, True where the segment is clear
+        """
+        segments = numpy.asarray(segments, dtype=float).reshape(-1, 4)
+        if not len(segments):
+            return numpy.zeros(0, dtype=bool)
+        owners, _, hits, in_first, in_last = Map._traverse_segments(grid, segments, resolution)
+        return numpy.bincount(owners, weights=hits & ~in_first & ~in_last, minlength=len(segments)) == 0
+
+    @staticmethod
+    def get_clear_fractions(grid, segments, resolution):
+        """
+        How far along every segment it enters the first blocked cell, same traversal as get_lines_of_sight.
+        The start cell is not checked.
+        :param grid: numpy.array, grid indexed [x][y] (0 - Clear, anything else - Blocked)
+        :param segments: numpy.array, (N, 4) array of [from x, from y, to x, to y] in metres
+        :param resolution: Integer, metres per grid cell
+        :return numpy.array, N fractions of the segment lengths in [0, 1], 1 where the segment is clear
+        """
+        segments = numpy.asarray(segments, dtype=float).reshape(-1, 4)
+        clear = numpy.ones(len(segments))
+        if not len(segments):
+            return clear
+        owners, fractions, hits, in_first, _ = Map._traverse_segments(grid, segments, resolution)
+        blocked = numpy.flatnonzero(hits & ~in_first)
+        numpy.minimum.at(clear, owners[blocked], fractions[blocked])
+        return clear
+
+    def get_projectile_reach(self, positions, directions, ranges):
+        """
+        Distance every projectile flies before its range runs out or it hits SOLID terrain.
+        :param positions: iterable of (x, y) positions in metres
+        :param directions: iterable of angles in radians relative to the (1,0) unit vector
+        :param ranges: iterable of remaining ranges in metres
+        :return numpy.array, distances in metres
+        """
+        positions = numpy.asarray(positions, dtype=float).reshape(-1, 2)
+        directions = numpy.asarray(directions, dtype=float)
+        ranges = numpy.asarray(ranges, dtype=float)
+        ends = positions + numpy.column_stack((numpy.cos(directions), numpy.sin(directions))) * ranges[:, None]
+        segments = numpy.hstack((positions, ends))
+        return Map.get_clear_fractions(self.shot_grid, segments, Map.RESOLUTION) * ranges
+
+    def get_fire_lanes(self, origins, targets):
+        """
+        Whether a projectile fired from every origin reaches every target without hitting SOLID terrain.
+        :param origins: iterable of (x, y) positions in metres, e.g. our tanks
+        :param targets: iterable of (x, y) positions in metres, e.g. the enemy tanks
+        :return numpy.array, (len(origins), len(targets)) booleans, True where the lane is clear
+        """
+        origins = numpy.asarray(origins, dtype=float).reshape(-1, 2)
+        targets = numpy.asarray(targets, dtype=float).reshape(-1, 2)
+        segments = numpy.hstack((numpy.repeat(origins, len(targets), axis=0), numpy.tile(targets, (len(origins), 1))))
+        return Map.get_lines_of_sight(self.shot_grid, segments, Map.RESOLUTION).reshape(len(origins), len(targets))
 
     def __eq__(self, other):
-        return self.size == other.size and str(sorted(self.obstacles)) == str(sorted(other.obstacles))
+        return isinstance(other, Map) and self.fingerprint == other.fingerprint
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return "<Map>: %s; %s" % (str(self.size), str(self.obstacles))
@@ -70,17 +304,10 @@ class Map:
         return "<Map>: %s; %s" % (str(self.size), str(self.obstacles))
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.fingerprint)
 
     def __cmp__(self, other):
-        a = str(self)
-        b = str(other)
-        if a < b:
-            return -1
-        elif a == b:
-            return 0
-        else:
-            return 1
+        return cmp(self.fingerprint, other.fingerprint)
 
     def get_col_grid_display(self):
         v_grid = ""
@@ -89,65 +316,238 @@ class Map:
         return v_grid
 
     @staticmethod
-    def _heuristic(a, b):
+    def get_clearance_field(col_grid, resolution, limit):
+        """
+        Vectorized Euclidean distance transform of a collision grid.
+        The squared distance from a cell centre to the nearest point of an obstacle cell is separable, so it is
+        found as the nearest obstacle along every column followed by a minimum over row offsets up to the limit.
+        Everything outside of the grid counts as an obstacle.
+        :param col_grid: numpy.array, grid indexed [x][y] (0 - No obstacle, anything else - Obstacle)
+        :param resolution: Integer, metres per grid cell
+        :param limit: Number, largest clearance in metres to resolve
+        :return numpy.array, float clearance in metres for every cell, 0 on obstacles
+        """
+        blocked = numpy.ones((col_grid.shape[0] + 2, col_grid.shape[1] + 2), dtype=bool)
+        blocked[1:-1, 1:-1] = numpy.asarray(col_grid) != 0
+        far = blocked.shape[1] * 2
+        offsets = numpy.arange(blocked.shape[1])
+        previous = numpy.maximum.accumulate(numpy.where(blocked, offsets, -far), axis=1)
+        following = numpy.minimum.accumulate(numpy.where(blocked, offsets, far)[:, ::-1], axis=1)[:, ::-1]
+        column_cells = numpy.minimum(offsets - previous, following - offsets)
+        column_squared = numpy.maximum(column_cells - 0.5, 0) ** 2
+
+        window = int(math.ceil(float(limit) / resolution)) + 1
+        squared = numpy.copy(column_squared)
+        for shift in xrange(1, min(window, blocked.shape[0]) + 1):
+            row_squared = (shift - 0.5) ** 2
+            numpy.minimum(squared[shift:], column_squared[:-shift] + row_squared, out=squared[shift:])
+            numpy.minimum(squared[:-shift], column_squared[shift:] + row_squared, out=squared[:-shift])
+        return numpy.minimum(numpy.sqrt(squared[1:-1, 1:-1]) * resolution, limit)
+
+    def get_clearance(self):
+        """
+        Clearance of every cell, see get_clearance_field. Computed once per map.
+        """
+        if self.clearance is None:
+            self.clearance = Map.get_clearance_field(self.col_grid, Map.RESOLUTION, Map.CLEARANCE_LIMIT)
+        return self.clearance
+
+    @staticmethod
+    def _get_radius_key(radius):
+        if radius is None or radius <= 0:
+            return 0.0
+        return float(radius)
+
+    def get_inflated_grid(self, radius=None):
+        """
+        Configuration space for a tank of the given collision radius, where the tank fits into every free cell.
+        Grids are cached per radius.
+        :param radius: Number, collision radius in metres, None for the raw col_grid
+        :return numpy.array, grid indexed [x][y] (0 - No obstacle, 1 - Obstacle)
+        """
+        key = Map._get_radius_key(radius)
+        if key not in self.inflated_grids:
+            self.inflated_grids[key] = (self.get_clearance() < key).astype(int)
+        return self.inflated_grids[key]
+
+    def get_path_engine(self, radius=None):
+        """
+        The A-star engine over the inflated grid for radius, created on first use and reused for every search.
+        Inflation only measures the clearance of cell centres, which at the default resolution is enough for any
+        tank, so for a radius above 0 the engine also keeps diagonal steps out of corners and lines of sight the
+        radius away from the obstacles, see GridAStar.
+        """
+        key = Map._get_radius_key(radius)
+        if key not in self.path_engines:
+            self.path_engines[key] = GridAStar(self.get_inflated_grid(key), key / float(Map.RESOLUTION),
+                                               self.col_grid if key else None)
+        return self.path_engines[key]
+
+    def get_hierarchical_engine(self, radius=None):
+        """
+        The HPA* engine over the inflated grid for radius, its clusters and abstract graph are built on first use.
+        """
+        key = Map._get_radius_key(radius)
+        if key not in self.hierarchical_engines:
+            self.hierarchical_engines[key] = HierarchicalPathfinder(
+                    self.get_path_engine(key), Map.HPA_CLUSTER_SIZE)
+        return self.hierarchical_engines[key]
+
+    def get_jump_point_engine(self, radius=None):
         """
-        Heuristic for a-star algorithm
+        The Jump Point Search engine over the inflated grid for radius, created on first use.
         """
-        return (b[0] - a[0]) ** 2 + (b[1] - a[1]) ** 2
+        key = Map._get_radius_key(radius)
+        if key not in self.jump_point_engines:
+            self.jump_point_engines[key] = JumpPointSearch(self.get_path_engine(key))
+        return self.jump_point_engines[key]
 
-    def get_shortest_path(self, r_start, r_goal):
+    def get_any_angle_engine(self, radius=None):
+        """
+        The Lazy Theta* engine over the inflated grid for radius, created on first use.
+        """
+        key = Map._get_radius_key(radius)
+        if key not in self.any_angle_engines:
+            self.any_angle_engines[key] = LazyThetaStar(self.get_path_engine(key))
+        return self.any_angle_engines[key]
+
+    @staticmethod
+    def get_cell(position):
+        """
+        :param position (2-list), Numbers (x,y) map position in metres
+        :return 2-tuple, Integers (x,y) grid cell containing the position
+        """
+        return int(position[0] / Map.RESOLUTION), int(position[1] / Map.RESOLUTION)
+
+    @staticmethod
+    def get_cell_centre(cell):
+        """
+        :param cell (2-tuple), Integers (x,y) grid cell
+        :return 2-tuple, Integers (x,y) map position in metres of the centre of the cell
+        """
+        return (int((cell[0] * Map.RESOLUTION) + (Map.RESOLUTION / 2)),
+                int((cell[1] * Map.RESOLUTION) + (Map.RESOLUTION / 2)))
+
+    def get_grid_cell(self, position):
+        """
+        :param position (2-list), Numbers (x,y) map position in metres
+        :return 2-tuple, Integers (x,y) grid cell containing the position, clamped into the grid
         """
-        Modified version of astar for our implementation of the map.
-        Taken from: Christian Careaga (christian.careaga7@gmail.com) at
-        http://code.activestate.com/recipes/578919-python-a-pathfinding-with-binary-heap/
+        x, y = Map.get_cell(position)
+        return min(max(x, 0), self.col_grid.shape[0] - 1), min(max(y, 0), self.col_grid.shape[1] - 1)
+
+    def is_passable(self, position, radius=None):
+        """
+        :param position (2-list), Numbers (x,y) map position in metres
+        :param radius: Number, collision radius in metres, None for the raw col_grid
+        :return boolean, True if a tank of that radius fits at the position
+        """
+        if not (0 <= position[0] < self.size[0] and 0 <= position[1] < self.size[1]):
+            return False
+        return not self.get_inflated_grid(radius)[self.get_grid_cell(position)]
+
+    def get_distance_field(self, r_goal, radius=None, deadline=None):
+        """
+        Distances and next steps from every cell towards the cell containing r_goal.
+        Fields are cached per radius, so this is only computed again once the goal moves into another cell.
+        :param r_goal (2-list), Numbers (x,y) goal position in metres
+        :param radius: Number, collision radius in metres of the tanks reading the field, None for the raw col_grid
+        :param deadline: Number, time.time() to stop building the field at, the build resumes on the next call
+        :return DistanceField
+        """
+        key = Map._get_radius_key(radius)
+        if key not in self.distance_fields:
+            self.distance_fields[key] = DistanceFieldCache(
+                    self.get_path_engine(key), Map.DISTANCE_FIELD_CACHE_SIZE)
+        return self.distance_fields[key].get(self.get_grid_cell(r_goal), deadline)
+
+    def get_incremental_path(self, pair, r_start, r_goal, radius=None):
+        """
+        Search for a path between two map positions, repairing the search made for the same pair on a previous tick
+        instead of starting over. Same format as get_shortest_path.
+        :param pair (hashable), identifies whose search state to reuse, e.g. (our tank id, target tank id)
+        :param r_start (2-list), Numbers (x,y) starting position of path
+        :param r_goal  (2-list), Numbers (x,y) ending position of path
+        :param radius (Number), collision radius in metres of the tank, searches its configuration space
+        :return array, empty array if no path. Otherwise every node as (x,y) in path from start to goal
+        """
+        cells = self.get_incremental_planner(pair, radius).search(self.get_grid_cell(r_start),
+                                                                  self.get_grid_cell(r_goal))
+        return [Map.get_cell_centre(cell) for cell in cells]
+
+    def get_incremental_planner(self, pair, radius=None):
+        """
+        The DStarLite of a pair, kept for the INCREMENTAL_PLANNER_CACHE_SIZE pairs used most recently.
+        :param pair (hashable), identifies whose search state to reuse, e.g. (our tank id, target tank id)
+        :param radius (Number), collision radius in metres of the tank, searches its configuration space
+        :return DStarLite
+        """
+        key = (pair, Map._get_radius_key(radius))
+        planner = self.incremental_planners.pop(key, None)
+        if planner is None:
+            planner = DStarLite(self.get_path_engine(radius))
+            if len(self.incremental_planners) >= Map.INCREMENTAL_PLANNER_CACHE_SIZE:
+                self.incremental_planners.popitem(last=False)
+        self.incremental_planners[key] = planner
+        return planner
+
+    def get_shortest_path(self, r_start, r_goal, method=None, radius=None):
+        """
+        Search for a path between two map positions.
+        Positions on the far map edges are clamped into the last row or column of cells.
         :param r_start (2-list), Integers (x,y) starting position of path
         :param r_goal  (2-list), Integers (x,y) ending position of path
-        :return array, empty array if no path. Otherwise every node as (x,y) in path from start to goal.
-        """
-        neighbors = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-        start = (int(r_start[0] / Map.RESOLUTION), int(r_start[1] / Map.RESOLUTION))
-        goal = (int(r_goal[0] / Map.RESOLUTION), int(r_goal[1] / Map.RESOLUTION))
-        close_set = set()
-        came_from = {}
-        gscore = {start: 0}
-        fscore = {start: Map._heuristic(start, goal)}
-        oheap = []
-
-        heappush(oheap, (fscore[start], start))
-
-        while oheap:
-            current = heappop(oheap)[1]
-
-            if current == goal:
-                data = []
-                while current in came_from:
-                    data.append((int((current[0] * Map.RESOLUTION) + (Map.RESOLUTION / 2)),
-                                 int((current[1] * Map.RESOLUTION) + (Map.RESOLUTION / 2))))
-                    current = came_from[current]
-                data.reverse()
-                return data
-
-            close_set.add(current)
-            for i, j in neighbors:
-                neighbor = current[0] + i, current[1] + j
-                tentative_g_score = gscore[current] + Map._heuristic(current, neighbor)
-                if 0 <= neighbor[0] < self.col_grid.shape[0]:
-                    if 0 <= neighbor[1] < self.col_grid.shape[1]:
-                        if self.col_grid[neighbor[0]][neighbor[1]] == 1:
-                            continue
-                    else:
-                        # array bound y walls
-                        continue
-                else:
-                    # array bound x walls
-                    continue
+        :param method (String), PathMethod to search with, defaults to the map's path_method
+        :param radius (Number), collision radius in metres of the tank, searches its configuration space
+        :return array, empty array if no path. Otherwise every node as (x,y) in path from start to goal,
+                PathMethod.THETA only returns the turning points.
+        """
+        method = method if method is not None else self.path_method
+        start = self.get_grid_cell(r_start)
+        goal = self.get_grid_cell(r_goal)
+        if method == PathMethod.HPA:
+            cells = self.get_hierarchical_engine(radius).search(start, goal)
+        elif method == PathMethod.JPS:
+            cells = self.get_jump_point_engine(radius).search(start, goal)
+        elif method == PathMethod.THETA:
+            cells = self.get_any_angle_engine(radius).search(start, goal)
+        elif method == PathMethod.ASTAR:
+            cells = self.get_path_engine(radius).search(start, goal)
+        else:
+            raise ValueError("Unknown path method: %s" % method)
+        return [Map.get_cell_centre(cell) for cell in cells]
 
-                if neighbor in close_set and tentative_g_score >= gscore.get(neighbor, 0):
-                    continue
-                if tentative_g_score < gscore.get(neighbor, 0) or neighbor not in [i[1] for i in oheap]:
-                    came_from[neighbor] = current
-                    gscore[neighbor] = tentative_g_score
-                    fscore[neighbor] = tentative_g_score + Map._heuristic(neighbor, goal)
-                    heappush(oheap, (fscore[neighbor], neighbor))
+    def compress_path(self, r_start, path, smooth=False, radius=None):
+        """
+        Reduce a path returned by get_shortest_path to its turning points.
+        :param r_start (2-list), Numbers (x,y) starting position of path
+        :param path (array), (x,y) cell centres as returned by get_shortest_path
+        :param smooth (boolean), also skip turning points that are in line of sight of the previous waypoint
+        :param radius (Number), collision radius in metres used for the line of sight checks
+        :return array, (x,y) positions of the turning points followed by the end of the path
+        """
+        start = self.get_grid_cell(r_start)
+        cells = [Map.get_cell(point) for point in path]
+        if smooth:
+            cells = smooth_path(self.get_path_engine(radius), start, cells)
+        else:
+            cells = compress_path(start, cells)
+        return [Map.get_cell_centre(cell) for cell in cells]
 
-        return []
+
+class PathMethod(object):
+    """
+    Searches available to Map.get_shortest_path
+    ASTAR
+    * Optimal flat A-star over col_grid.
+    HPA
+    * Hierarchical A-star over clusters of col_grid, near optimal and much cheaper on fine resolutions.
+    JPS
+    * Jump Point Search, same path costs as ASTAR while expanding far fewer cells.
+    THETA
+    * Lazy Theta* any-angle search, returns only the turning points of paths made of straight legs.
+    """
+    ASTAR = 'ASTAR'
+    HPA = 'HPA'
+    JPS = 'JPS'
+    THETA = 'THETA'
@@ -1,4 +1,4 @@
-class Obstacle:
+class Obstacle(object):
     """
     Bounding box obstacle.
     obs_type (String)
@@ -8,17 +8,21 @@ class Obstacle:
     size (Integer Array)
     * The width and height, in metres, of the terrain object (in that order).
     """
-    corner = []
-    size = []
-    type = ""
+    __slots__ = ('type', 'corner', 'size')
 
     def __init__(self, obs_type, corner, size):
         self.type = obs_type
         self.corner = corner
         self.size = size
 
+    def _get_key(self):
+        return self.type, tuple(self.corner), tuple(self.size)
+
     def __eq__(self, other):
-        return self.type == other.type and self.corner == other.corner and self.size == other.size
+        return isinstance(other, Obstacle) and self._get_key() == other._get_key()
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return "<Obstacle> %s; corner: %s; size: %s" % (self.type, self.corner, self.size)
@@ -27,14 +31,7 @@ class Obstacle:
         return "<Obstacle> %s; corner: %s; size: %s" % (self.type, self.corner, self.size)
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self._get_key())
 
     def __cmp__(self, other):
-        a = str(self)
-        b = str(other)
-        if a < b:
-            return -1
-        elif a == b:
-            return 0
-        else:
-            return 1
+        return cmp(self._get_key(), other._get_key())
@@ -1,4 +1,4 @@
-class Player:
+class Player(object):
     """
     players structure
     score (Integer)
@@ -7,19 +7,23 @@ class Player:
     * The name of the team.
     tanks (Tank Array)
     * Describes attributes about the tanks belonging to a team.
+    Players are hashed by name, which never changes during a match.
     """
-    score = None
-    name = ""
-    tanks = []
+    __slots__ = ('name', 'score', 'tanks')
 
     def __init__(self, name, score, tanks):
         self.name = name
         self.score = score
         self.tanks = tanks
 
+    def _get_key(self):
+        return self.name, self.score, sorted(self.tanks)
+
     def __eq__(self, other):
-        basic_equality = self.score == other.score and self.name == other.name
-        return basic_equality and str(sorted(self.tanks)) == str(sorted(other.tanks))
+        return isinstance(other, Player) and self._get_key() == other._get_key()
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return "<Player> %s; score %s; %s" % (self.name, self.score, str(self.tanks))
@@ -28,14 +32,8 @@ class Player:
         return "<Player> %s; score %s; %s" % (self.name, self.score, str(self.tanks))
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.name)
 
     def __cmp__(self, other):
-        a = str(self)
-        b = str(other)
-        if a < b:
-            return -1
-        elif a == b:
-            return 0
-        else:
-            return 1
+        # Names are unique, the whole key only breaks ties between copies
+        return cmp(self.name, other.name) or cmp(self._get_key(), other._get_key())
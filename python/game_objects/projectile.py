@@ -1,4 +1,4 @@
-class Projectile:
+class Projectile(object):
     """
     Projectile Object
     id (String)
@@ -17,12 +17,7 @@ class Projectile:
     # Maximum range might be 50 meters (however event loop only sees a max of 47)
     # Speed is 30.0 meters per second
     # Damage is 100.0 damage
-    id = ""
-    position = []
-    direction = None
-    speed = None
-    damage = None
-    range = None
+    __slots__ = ('id', 'position', 'direction', 'speed', 'damage', 'range')
 
     def __init__(self, id, position, direction, speed, damage, range):
         self.id = id
@@ -32,9 +27,14 @@ class Projectile:
         self.damage = damage
         self.range = range
 
+    def _get_key(self):
+        return self.id, list(self.position), self.direction, self.speed, self.damage, self.range
+
     def __eq__(self, other):
-        return self.id == other.id and self.position == other.position and self.direction == other.direction and \
-               self.speed == other.speed and self.damage == other.damage and self.range == other.range
+        return isinstance(other, Projectile) and self._get_key() == other._get_key()
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return "<Projectile>: %s; position %s; direction %s; speed %s; damage %s; range %s" % (
@@ -47,14 +47,8 @@ class Projectile:
         )
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.id)
 
     def __cmp__(self, other):
-        a = str(self)
-        b = str(other)
-        if a < b:
-            return -1
-        elif a == b:
-            return 0
-        else:
-            return 1
+        # Ids are unique, the whole key only breaks ties between copies
+        return cmp(self.id, other.id) or cmp(self._get_key(), other._get_key())
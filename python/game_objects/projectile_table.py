@@ -0,0 +1,96 @@
+import numpy
+
+
+class ProjectileTable(object):
+    """
+    Struct of arrays view of every projectile in flight, one row per projectile.
+    ids (String Array)
+    * Projectile id of every row.
+    owners (String Array)
+    * Id of the tank that fired every row.
+    positions (numpy.array)
+    * (N, 2) coordinates, in metres.
+    direction, speed, damage, range (numpy.array)
+    * Same meaning as the Projectile fields.
+    """
+
+    def __init__(self, ids, owners, positions, direction, speed, damage, range, dtype=numpy.float64):
+        self.ids = list(ids)
+        self.owners = list(owners)
+        self.positions = numpy.asarray(positions, dtype=dtype).reshape(-1, 2)
+        self.direction = numpy.asarray(direction, dtype=dtype)
+        self.speed = numpy.asarray(speed, dtype=dtype)
+        self.damage = numpy.asarray(damage, dtype=dtype)
+        self.range = numpy.asarray(range, dtype=dtype)
+
+    @staticmethod
+    def from_json(raw_players, dtype=numpy.float64):
+        """
+        :param raw_players: Json array of the players of a GAMESTATE, projectiles are listed under their tanks
+        :param dtype: numpy float type of the arrays, numpy.float32 halves their size
+        :return ProjectileTable
+        """
+        rows = [(raw_tank['id'], raw_projectile) for raw_player in raw_players for raw_tank in raw_player['tanks']
+                for raw_projectile in raw_tank['projectiles']]
+        return ProjectileTable([raw_projectile['id'] for _, raw_projectile in rows], [owner for owner, _ in rows],
+                               [raw_projectile['position'] for _, raw_projectile in rows],
+                               [raw_projectile['direction'] for _, raw_projectile in rows],
+                               [raw_projectile['speed'] for _, raw_projectile in rows],
+                               [raw_projectile['damage'] for _, raw_projectile in rows],
+                               [raw_projectile['range'] for _, raw_projectile in rows], dtype)
+
+    @staticmethod
+    def from_tanks(tanks, dtype=numpy.float64):
+        """
+        :param tanks: Tank array, their projectiles are listed
+        :param dtype: numpy float type of the arrays
+        :return ProjectileTable
+        """
+        rows = [(tank.id, projectile) for tank in tanks for projectile in tank.projectiles]
+        return ProjectileTable([projectile.id for _, projectile in rows], [owner for owner, _ in rows],
+                               [projectile.position for _, projectile in rows],
+                               [projectile.direction for _, projectile in rows],
+                               [projectile.speed for _, projectile in rows],
+                               [projectile.damage for _, projectile in rows],
+                               [projectile.range for _, projectile in rows], dtype)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_velocities(self):
+        """
+        :return numpy.array, (N, 2) velocity of every projectile in m/s
+        """
+        return numpy.column_stack((numpy.cos(self.direction), numpy.sin(self.direction))) * self.speed[:, None]
+
+    def get_distances(self, tanks):
+        """
+        :param tanks: TankTable
+        :return numpy.array, (len(self), len(tanks)) distances in metres from every projectile to every tank
+        """
+        offsets = tanks.positions[None, :, :] - self.positions[:, None, :]
+        return numpy.hypot(offsets[:, :, 0], offsets[:, :, 1])
+
+    def get_impact_times(self, tanks, reach=None):
+        """
+        Sweep every projectile along its direction and find when it enters the hit circle of every tank, assuming
+        the tanks stay where they are. A projectile never hits the tank that fired it.
+        :param tanks: TankTable
+        :param reach: numpy.array, distance every projectile can still fly, e.g. Map.get_projectile_reach,
+                      defaults to the remaining range
+        :return numpy.array, (len(self), len(tanks)) seconds until impact, numpy.inf where it misses
+        """
+        if reach is None:
+            reach = self.range
+        units = numpy.column_stack((numpy.cos(self.direction), numpy.sin(self.direction)))
+        offsets = tanks.positions[None, :, :] - self.positions[:, None, :]
+        along = offsets[:, :, 0] * units[:, 0, None] + offsets[:, :, 1] * units[:, 1, None]
+        across = offsets[:, :, 0] * units[:, 1, None] - offsets[:, :, 1] * units[:, 0, None]
+        # Distance flown when the projectile crosses into the circle, 0 when it starts inside it
+        chord = numpy.sqrt(numpy.maximum(tanks.hit_radius ** 2 - across ** 2, 0))
+        entry = numpy.maximum(along - chord, 0)
+        hits = (numpy.abs(across) <= tanks.hit_radius) & (along + chord >= 0) & (entry <= reach[:, None])
+        hits &= numpy.array(self.owners, dtype=object)[:, None] != numpy.array(tanks.ids, dtype=object)[None, :]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            times = entry / self.speed[:, None]
+        return numpy.where(hits, times, numpy.inf)
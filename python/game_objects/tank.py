@@ -3,7 +3,7 @@ import math
 EPSILON = 1e-6
 
 
-class Tank:
+class Tank(object):
     """
     Tank Object
     id (String)
@@ -26,18 +26,10 @@ class Tank:
     * The maximum speed, in m/s, of the tank.
     projectiles (Projectile Array)
     * Describes attributes about all projectiles.
+    Tanks are hashed by id, which never changes for a tank, so they can be updated in place while in a set or dict.
     """
-
-    id = ""
-    health = None
-    hit_radius = None
-    collision_radius = None
-    type = ""
-    position = []
-    tracks = None
-    turret = None
-    speed = None
-    projectiles = []
+    __slots__ = ('id', 'health', 'hit_radius', 'collision_radius', 'type', 'position', 'tracks', 'turret', 'speed',
+                 'projectiles')
 
     def __init__(self, id, health, hit_radius, collision_radius, type, position, tracks, turret, speed, projectiles):
         self.id = id
@@ -51,12 +43,15 @@ class Tank:
         self.speed = speed
         self.projectiles = projectiles
 
+    def _get_key(self):
+        return (self.id, self.health, self.hit_radius, self.collision_radius, self.type, list(self.position),
+                self.tracks, self.turret, self.speed, sorted(self.projectiles))
+
     def __eq__(self, other):
-        basic_equality = self.id == other.id and self.health == other.health and self.hit_radius == other.hit_radius and \
-                         self.collision_radius == other.collision_radius and self.type == other.type and \
-                         self.position == other.position and self.tracks == other.tracks and self.turret == other.turret and \
-                         self.speed == other.speed
-        return basic_equality and str(sorted(self.projectiles)) == str(sorted(other.projectiles))
+        return isinstance(other, Tank) and self._get_key() == other._get_key()
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return "<Tank> %s; health %s; hit_radius %s; collision_radius %s; type %s; position %s; tracks %s; " \
@@ -73,17 +68,11 @@ class Tank:
                )
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.id)
 
     def __cmp__(self, other):
-        a = str(self)
-        b = str(other)
-        if a < b:
-            return -1
-        elif a == b:
-            return 0
-        else:
-            return 1
+        # Ids are unique, the whole key only breaks ties between copies
+        return cmp(self.id, other.id) or cmp(self._get_key(), other._get_key())
 
     def get_dist_to_point(self, point):
         """
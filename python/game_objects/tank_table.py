@@ -0,0 +1,196 @@
+import math
+
+import numpy
+
+EPSILON = 1e-6
+
+
+class TankTable(object):
+    """
+    Struct of arrays view of a team's tanks, one row per tank in the order the GAMESTATE listed them.
+    Geometry between two tables is computed for every pair at once with numpy broadcasting instead of one
+    math.hypot or atan2 call per pair.
+    ids (String Array)
+    * Tank id of every row.
+    index (dict)
+    * Tank id -> row.
+    positions (numpy.array)
+    * (N, 2) coordinates, in metres.
+    tracks, turret (numpy.array)
+    * Angles, in radians, of the tracks and turret relative to the (1,0) unit vector.
+    health, hit_radius, collision_radius, speed (numpy.array)
+    * Same meaning as the Tank fields.
+    """
+
+    def __init__(self, ids, positions, tracks, turret, health, hit_radius, collision_radius, speed,
+                 dtype=numpy.float64):
+        self.ids = list(ids)
+        self.index = dict((tank_id, row) for row, tank_id in enumerate(self.ids))
+        self.positions = numpy.asarray(positions, dtype=dtype).reshape(-1, 2)
+        self.tracks = numpy.asarray(tracks, dtype=dtype)
+        self.turret = numpy.asarray(turret, dtype=dtype)
+        self.health = numpy.asarray(health, dtype=dtype)
+        self.hit_radius = numpy.asarray(hit_radius, dtype=dtype)
+        self.collision_radius = numpy.asarray(collision_radius, dtype=dtype)
+        self.speed = numpy.asarray(speed, dtype=dtype)
+
+    @staticmethod
+    def from_json(raw_tanks, dtype=numpy.float64):
+        """
+        :param raw_tanks: Json array of the tanks of a player, as in a GAMESTATE
+        :param dtype: numpy float type of the arrays, numpy.float32 halves their size
+        :return TankTable
+        """
+        return TankTable([raw_tank['id'] for raw_tank in raw_tanks],
+                         [raw_tank['position'] for raw_tank in raw_tanks],
+                         [raw_tank['tracks'] for raw_tank in raw_tanks],
+                         [raw_tank['turret'] for raw_tank in raw_tanks],
+                         [raw_tank['health'] for raw_tank in raw_tanks],
+                         [raw_tank['hitRadius'] for raw_tank in raw_tanks],
+                         [raw_tank['collisionRadius'] for raw_tank in raw_tanks],
+                         [raw_tank['speed'] for raw_tank in raw_tanks], dtype)
+
+    @staticmethod
+    def from_tanks(tanks, dtype=numpy.float64):
+        """
+        :param tanks: Tank array
+        :param dtype: numpy float type of the arrays
+        :return TankTable
+        """
+        return TankTable([tank.id for tank in tanks], [tank.position for tank in tanks],
+                         [tank.tracks for tank in tanks], [tank.turret for tank in tanks],
+                         [tank.health for tank in tanks], [tank.hit_radius for tank in tanks],
+                         [tank.collision_radius for tank in tanks], [tank.speed for tank in tanks], dtype)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _get_offsets(self, other):
+        return other.positions[None, :, :] - self.positions[:, None, :]
+
+    def get_distances(self, other):
+        """
+        :param other: TankTable, e.g. the enemy team
+        :return numpy.array, (len(self), len(other)) distances in metres
+        """
+        offsets = self._get_offsets(other)
+        return numpy.hypot(offsets[:, :, 0], offsets[:, :, 1])
+
+    def get_bearings(self, other):
+        """
+        Same angles as Tank.get_rads_to_tank, normalised to [0, 2 pi).
+        :param other: TankTable
+        :return numpy.array, (len(self), len(other)) angles in radians from every row to every row of other
+        """
+        offsets = self._get_offsets(other)
+        return numpy.arctan2(offsets[:, :, 1], offsets[:, :, 0]) % (2 * math.pi)
+
+    @staticmethod
+    def _get_rotations(headings, bearings):
+        # Shortest signed turn, wrapped into [-pi, pi)
+        return (bearings - headings[:, None] + math.pi) % (2 * math.pi) - math.pi
+
+    @staticmethod
+    def get_direction_rotation(rotation):
+        """
+        Turn one signed rotation into the (direction, rads) pair of a rotation command.
+        :param rotation: Number, radians, positive is counter clockwise
+        :return (String, float), CW or CCW and the non negative rads
+        """
+        if rotation > 0:
+            return 'CCW', float(rotation)
+        return 'CW', float(-rotation)
+
+    def get_turret_rotations(self, other):
+        """
+        Shortest turn of every turret to face every row of other, the vectorized
+        Tank.get_direction_rotation_turret_to_tank.
+        :param other: TankTable
+        :return numpy.array, (len(self), len(other)) radians, positive is counter clockwise (CCW)
+        """
+        return TankTable._get_rotations(self.turret, self.get_bearings(other))
+
+    def get_track_rotations(self, other):
+        """
+        Shortest turn of every set of tracks to face every row of other.
+        :param other: TankTable
+        :return numpy.array, (len(self), len(other)) radians, positive is counter clockwise (CCW)
+        """
+        return TankTable._get_rotations(self.tracks, self.get_bearings(other))
+
+    def get_intercepts(self, targets, velocities, projectile_speeds, projectile_ranges=numpy.inf):
+        """
+        Lead every shot at a moving target, the vectorized solution of |offset + velocity * t| = speed * t for the
+        earliest time t a projectile fired now meets the target, which is assumed to keep its velocity.
+        Targets that outrun the projectiles are aimed at where they are.
+        :param targets: TankTable, e.g. the enemy team
+        :param velocities: numpy.array, (len(targets), 2) velocity of every target in m/s
+        :param projectile_speeds: Number or numpy.array of len(self), speed of the projectiles of every row in m/s
+        :param projectile_ranges: Number or numpy.array of len(self), range of the projectiles of every row in metres
+        :return (numpy.array, numpy.array, numpy.array), (len(self), len(targets)) turret rotations as in
+                get_turret_rotations, seconds until impact (numpy.inf if there is no intercept) and booleans, True
+                where the intercept is within range
+        """
+        offsets = self._get_offsets(targets)
+        velocities = numpy.asarray(velocities, dtype=float).reshape(-1, 2)[None, :, :]
+        speeds = numpy.broadcast_to(numpy.asarray(projectile_speeds, dtype=float), (len(self),))[:, None]
+        ranges = numpy.broadcast_to(numpy.asarray(projectile_ranges, dtype=float), (len(self),))[:, None]
+        # a t^2 + b t + c = 0
+        a = (velocities ** 2).sum(axis=2) - speeds ** 2
+        b = 2 * (offsets * velocities).sum(axis=2)
+        c = (offsets ** 2).sum(axis=2)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            root = numpy.sqrt(b ** 2 - 4 * a * c)
+            candidates = numpy.stack(((-b - root) / (2 * a), (-b + root) / (2 * a)))
+            # Targets as fast as the projectiles leave one linear solution
+            linear = numpy.abs(a) < EPSILON
+            candidates[:, linear] = -c[linear] / b[linear]
+        candidates[~(candidates >= 0)] = numpy.inf
+        times = candidates.min(axis=0)
+        solved = numpy.isfinite(times)
+        aims = offsets + velocities * numpy.where(solved, times, 0)[:, :, None]
+        bearings = numpy.arctan2(aims[:, :, 1], aims[:, :, 0]) % (2 * math.pi)
+        return TankTable._get_rotations(self.turret, bearings), times, solved & (speeds * times <= ranges)
+
+    def get_safe_shots(self, targets):
+        """
+        Friendly fire check of every shot at once, the vectorized Tank.no_friendly_fire. A shot from row i at row j
+        of targets is unsafe when another row of self, an ally, is ahead of the shooter and nearer than the target,
+        and the line of fire passes within its hit radius.
+        :param targets: TankTable, e.g. the enemy team
+        :return numpy.array, (len(self), len(targets)) booleans, True where firing cannot hit an ally
+        """
+        shots = self._get_offsets(targets)
+        lengths = numpy.hypot(shots[:, :, 0], shots[:, :, 1])
+        directions = shots / numpy.maximum(lengths, EPSILON)[:, :, None]
+        allies = self._get_offsets(self)
+        # (shooter, target, ally) distance along the line of fire and squared distance away from it
+        along = numpy.matmul(directions, allies.transpose(0, 2, 1))
+        squared = (allies[:, :, 0] ** 2 + allies[:, :, 1] ** 2)[:, None, :]
+        across = numpy.maximum(squared - along ** 2, 0)
+        in_line = across <= (self.hit_radius + EPSILON) ** 2
+        ahead = (along > 0) & (along < lengths[:, :, None] - EPSILON)
+        # An ally overlapping the muzzle is hit whatever the direction
+        touching = squared <= (self.hit_radius + EPSILON) ** 2
+        blocked = (in_line & ahead) | touching
+        shooters = numpy.arange(len(self))
+        blocked[shooters, :, shooters] = False
+        return ~blocked.any(axis=2)
+
+    def get_nearest(self, other, k=1):
+        """
+        The k rows of other closest to every row, the vectorized Tank.get_all_dist_tank.
+        :param other: TankTable
+        :param k: Integer, number of neighbours, at most len(other) are returned
+        :return (numpy.array, numpy.array), (len(self), k) rows of other and distances, nearest first
+        """
+        distances = self.get_distances(other)
+        k = min(k, distances.shape[1])
+        if 0 < k < distances.shape[1]:
+            candidates = numpy.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = numpy.tile(numpy.arange(distances.shape[1]), (distances.shape[0], 1))[:, :k]
+        rows = numpy.arange(len(distances))[:, None]
+        candidate_distances = distances[rows, candidates]
+        order = numpy.argsort(candidate_distances, axis=1)
+        return candidates[rows, order], candidate_distances[rows, order]
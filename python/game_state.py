@@ -0,0 +1,220 @@
+from collections import deque
+
+import numpy
+
+from game_objects.player import Player
+from game_objects.projectile import Projectile
+from game_objects.tank import Tank
+
+
+class StateDelta(object):
+    """
+    What changed between two consecutive GAMESTATE messages.
+    spawned (Tank Array)
+    * Tanks seen for the first time that did not replace a dead tank, e.g. every tank of the first GAMESTATE.
+    respawned (Array of (Tank, Tank))
+    * (dead tank, new tank) pairs. A tank gets a new id when it respawns, so a new tank of a player that lost a
+      tank of the same type is matched with it. A tank back alive under its own id is paired with its dead self.
+    died (Tank Array)
+    * Tanks reported as no longer alive, or no longer reported at all.
+    fired (Projectile Array)
+    * Projectiles seen for the first time.
+    expired (Projectile Array)
+    * Projectiles no longer reported.
+    """
+
+    def __init__(self):
+        self.spawned = []
+        self.respawned = []
+        self.died = []
+        self.fired = []
+        self.expired = []
+
+    def is_empty(self):
+        return not (self.spawned or self.respawned or self.died or self.fired or self.expired)
+
+    def __str__(self):
+        return "<StateDelta> spawned %s; respawned %s; died %s; fired %s; expired %s" % (
+            [tank.id for tank in self.spawned], [(dead.id, new.id) for dead, new in self.respawned],
+            [tank.id for tank in self.died], [projectile.id for projectile in self.fired],
+            [projectile.id for projectile in self.expired])
+
+    def __repr__(self):
+        return str(self)
+
+
+class GameState(object):
+    """
+    Long lived Player, Tank and Projectile objects of the current game, updated in place from every GAMESTATE.
+    Ids, radii, types and speeds never change during a game, so known objects only have their volatile fields
+    (score; health, position, tracks, turret; position, range) overwritten instead of being built again.
+    players (Player Array)
+    * Players in the order of the last GAMESTATE, their tanks are every tank it reported, alive or not.
+    tanks (dict)
+    * Tank id -> Tank, every tank reported by the last GAMESTATE.
+    projectiles (dict)
+    * Projectile id -> Projectile, every projectile in flight.
+    owners (dict)
+    * Tank id -> name of the player owning it, for every tank seen this game.
+    dead (dict)
+    * Player name -> list of dead tanks that did not respawn yet, oldest first.
+    dead_ids (set)
+    * Ids of every tank that died this game and did not come back under the same id.
+    history (dict)
+    * Tank id -> (seconds, x, y) samples of the last HISTORY_LENGTH GAMESTATEs with a timestamp, for
+      get_velocities. Dropped when the tank dies.
+    projectile_specs (dict)
+    * Tank type -> (speed, range) of the projectiles it fires, the largest range seen in flight.
+    """
+    # Positions kept per tank to estimate its velocity, enough to smooth out a turn or two
+    HISTORY_LENGTH = 5
+
+    def __init__(self):
+        self.players = []
+        self.player_by_name = {}
+        self.tanks = {}
+        self.projectiles = {}
+        self.owners = {}
+        self.dead = {}
+        self.dead_ids = set()
+        self.history = {}
+        self.projectile_specs = {}
+
+    def reset(self):
+        """
+        Forget everything, ids are not reused between games.
+        """
+        self.__init__()
+
+    def update(self, json_game_state):
+        """
+        Apply a GAMESTATE message.
+        :param json_game_state: Json object of the current game state
+        :return StateDelta
+        """
+        delta = StateDelta()
+        # Server time of the message in seconds
+        time = json_game_state.get('timestamp')
+        if time is not None:
+            time /= 1000.0
+        tanks = {}
+        projectiles = {}
+        new_tanks = []
+        players = []
+        for raw_player in json_game_state['players']:
+            name = raw_player['name']
+            player = self.player_by_name.get(name)
+            if player is None:
+                player = Player(name, raw_player['score'], [])
+                self.player_by_name[name] = player
+            player.score = raw_player['score']
+            player.tanks = []
+            for raw_tank in raw_player['tanks']:
+                tank = self.tanks.get(raw_tank['id'])
+                if tank is None:
+                    tank = Tank(raw_tank['id'], raw_tank['health'], raw_tank['hitRadius'],
+                                raw_tank['collisionRadius'], raw_tank['type'], raw_tank['position'],
+                                raw_tank['tracks'], raw_tank['turret'], raw_tank['speed'], [])
+                    if tank.id not in self.dead_ids:
+                        self.owners[tank.id] = name
+                        new_tanks.append(tank)
+                    elif raw_tank.get('alive', True):
+                        # Dropped out of the GAMESTATE and is back alive under the same id
+                        self._revive(tank, delta)
+                else:
+                    tank.health = raw_tank['health']
+                    tank.position = raw_tank['position']
+                    tank.tracks = raw_tank['tracks']
+                    tank.turret = raw_tank['turret']
+                    tank.projectiles = []
+                    if raw_tank.get('alive', True) and tank.id in self.dead_ids:
+                        # Back alive under the same id
+                        self._revive(tank, delta)
+                if not raw_tank.get('alive', True):
+                    self._mark_dead(tank, delta)
+                elif time is not None:
+                    self.history.setdefault(tank.id, deque(maxlen=self.HISTORY_LENGTH)).append(
+                        (time, tank.position[0], tank.position[1]))
+                for raw_projectile in raw_tank['projectiles']:
+                    projectile = self._update_projectile(raw_projectile, tank, delta)
+                    tank.projectiles.append(projectile)
+                    projectiles[projectile.id] = projectile
+                player.tanks.append(tank)
+                tanks[tank.id] = tank
+            players.append(player)
+
+        for tank_id, tank in self.tanks.iteritems():
+            if tank_id not in tanks:
+                self._mark_dead(tank, delta)
+        # Deaths are known now, a new tank of a player that lost one of the same type is its respawn
+        for tank in new_tanks:
+            if tank.id in self.dead_ids:
+                # Reported dead the very first time it was seen
+                delta.spawned.append(tank)
+                continue
+            candidates = self.dead.get(self.owners[tank.id], [])
+            for i, dead_tank in enumerate(candidates):
+                if dead_tank.type == tank.type:
+                    del candidates[i]
+                    delta.respawned.append((dead_tank, tank))
+                    break
+            else:
+                delta.spawned.append(tank)
+        for projectile_id, projectile in self.projectiles.iteritems():
+            if projectile_id not in projectiles:
+                delta.expired.append(projectile)
+
+        self.players = players
+        self.tanks = tanks
+        self.projectiles = projectiles
+        return delta
+
+    def _revive(self, tank, delta):
+        self.dead_ids.discard(tank.id)
+        candidates = self.dead.get(self.owners[tank.id], [])
+        dead_tank = tank
+        for i, candidate in enumerate(candidates):
+            if candidate.id == tank.id:
+                dead_tank = candidates.pop(i)
+                break
+        delta.respawned.append((dead_tank, tank))
+
+    def _mark_dead(self, tank, delta):
+        if tank.id in self.dead_ids:
+            return
+        self.dead_ids.add(tank.id)
+        self.history.pop(tank.id, None)
+        self.dead.setdefault(self.owners[tank.id], []).append(tank)
+        delta.died.append(tank)
+
+    def _update_projectile(self, raw_projectile, tank, delta):
+        projectile = self.projectiles.get(raw_projectile['id'])
+        if projectile is None:
+            projectile = Projectile(raw_projectile['id'], raw_projectile['position'], raw_projectile['direction'],
+                                    raw_projectile['speed'], raw_projectile['damage'], raw_projectile['range'])
+            delta.fired.append(projectile)
+            # Projectiles are first seen up to a tick after firing, the longest range seen is the closest to full
+            _, known_range = self.projectile_specs.get(tank.type, (None, 0))
+            self.projectile_specs[tank.type] = projectile.speed, max(known_range, projectile.range)
+        else:
+            projectile.position = raw_projectile['position']
+            projectile.range = raw_projectile['range']
+        return projectile
+
+    def get_velocities(self, tank_ids):
+        """
+        Velocity of every tank, the least squares slope of its recent positions over time.
+        :param tank_ids: String Array, e.g. the ids of a TankTable
+        :return numpy.array, (len(tank_ids), 2) velocities in m/s, 0 for tanks seen less than twice
+        """
+        velocities = numpy.zeros((len(tank_ids), 2))
+        for row, tank_id in enumerate(tank_ids):
+            samples = self.history.get(tank_id)
+            if samples is None or len(samples) < 2:
+                continue
+            samples = numpy.array(samples)
+            times = samples[:, 0] - samples[:, 0].mean()
+            spread = numpy.dot(times, times)
+            if spread > 0:
+                velocities[row] = numpy.dot(times, samples[:, 1:] - samples[:, 1:].mean(axis=0)) / spread
+        return velocities
@@ -0,0 +1,93 @@
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy
+
+from game_objects.map import Map
+from game_objects.obstacle import Obstacle
+
+
+class MapCache(object):
+    """
+    Maps seen during a match, keyed by the fingerprint of their size and terrain.
+    Contest matches replay the same handful of maps, so a repeated map is handed back together with everything it
+    already computed (collision grid, path engine, distance fields) instead of being rebuilt every game.
+    capacity (Integer)
+    * Number of maps kept in memory, least recently used maps are evicted first.
+    cache_dir (String)
+    * Optional directory where rasterized grids are persisted as .npy files and memory mapped back in.
+    """
+    # Map attributes persisted to cache_dir. Inflated grids are a single comparison against the clearance and the
+    # path engines hold Python lists, both are rebuilt from these.
+    PERSISTED_GRIDS = ('col_grid', 'shot_grid', 'clearance')
+
+    def __init__(self, capacity=4, cache_dir=None):
+        self.capacity = capacity
+        self.cache_dir = cache_dir
+        self.maps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get_map(self, json_map):
+        """
+        Return the Map for the 'map' object of a game state, building it only if it was never seen before.
+        :param json_map: Json object of the map, with 'size' and 'terrain'
+        :return Map
+        """
+        size = json_map['size'][0], json_map['size'][1]
+        terrain = [(raw_terrain['type'], raw_terrain['boundingBox']['corner'], raw_terrain['boundingBox']['size'])
+                   for raw_terrain in json_map['terrain']]
+        fingerprint = Map.get_fingerprint(size, terrain)
+
+        game_map = self.maps.pop(fingerprint, None)
+        if game_map is None:
+            self.misses += 1
+            obstacles = [Obstacle(raw_type, corner, extent) for raw_type, corner, extent in terrain]
+            game_map = Map(size, obstacles, col_grid=self._load_grid(fingerprint, 'col_grid'),
+                           shot_grid=self._load_grid(fingerprint, 'shot_grid'),
+                           clearance=self._load_grid(fingerprint, 'clearance'))
+            if self.cache_dir is not None:
+                # Clearance is worth computing up front once it is kept across processes
+                game_map.get_clearance()
+            for name in MapCache.PERSISTED_GRIDS:
+                self._save_grid(fingerprint, name, getattr(game_map, name))
+            if len(self.maps) >= self.capacity:
+                self.maps.popitem(last=False)
+        else:
+            self.hits += 1
+        self.maps[fingerprint] = game_map
+        return game_map
+
+    def _get_grid_path(self, fingerprint, name):
+        if name == 'col_grid':
+            return os.path.join(self.cache_dir, "%s.npy" % fingerprint)
+        if name == 'clearance':
+            # Clearance is only resolved up to the limit, which is not part of the fingerprint
+            name = "clearance%d" % Map.CLEARANCE_LIMIT
+        return os.path.join(self.cache_dir, "%s.%s.npy" % (fingerprint, name))
+
+    def _load_grid(self, fingerprint, name):
+        """
+        Memory map a persisted grid, None if there is none.
+        """
+        if self.cache_dir is None or not os.path.exists(self._get_grid_path(fingerprint, name)):
+            return None
+        try:
+            return numpy.load(self._get_grid_path(fingerprint, name), mmap_mode='r')
+        except (IOError, ValueError):
+            print "Ignoring unreadable cached grid %s" % self._get_grid_path(fingerprint, name)
+            return None
+
+    def _save_grid(self, fingerprint, name, grid):
+        """
+        Persist a grid, written to a temporary file first so readers never see a partial file.
+        """
+        if self.cache_dir is None or grid is None or isinstance(grid, numpy.memmap):
+            return
+        handle, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as temp_file:
+            numpy.save(temp_file, grid)
+        os.rename(temp_path, self._get_grid_path(fingerprint, name))
@@ -0,0 +1,175 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict, deque
+
+import numpy
+
+from game_objects.map import Map
+
+# Grids a worker keeps open, the current game's and the previous one's
+WORKER_MAP_CACHE_SIZE = 2
+
+# Worker side, grid path -> Map over the memory mapped grid
+_worker_maps = OrderedDict()
+
+
+def _get_worker_map(grid_path, size, resolution):
+    Map.RESOLUTION = resolution
+    pathmap = _worker_maps.pop(grid_path, None)
+    if pathmap is None:
+        # Only the collision grid is needed, the obstacles went into it already
+        pathmap = Map(size, [], col_grid=numpy.load(grid_path, mmap_mode='r'))
+        if len(_worker_maps) >= WORKER_MAP_CACHE_SIZE:
+            _worker_maps.popitem(last=False)
+    _worker_maps[grid_path] = pathmap
+    return pathmap
+
+
+def solve_queries(grid_path, size, resolution, goal, radius, starts):
+    """
+    Worker side of PathPool.solve, every query towards one goal cell reads the same distance field, which the
+    worker keeps for the following ticks.
+    :param grid_path: String, .npy file of the collision grid, memory mapped by the worker
+    :param size: 2-tuple, Integers (width, height) of the map in metres
+    :param resolution: Integer, metres per grid cell
+    :param goal: 2-tuple, Integers (x, y) goal cell
+    :param radius: Number, collision radius in metres of the tanks
+    :param starts: list of (x, y) start cells
+    :return list of (float, 2-tuple), path cost in cells and waypoint cell (see DistanceField.get_waypoint) for
+            every start, (inf, None) if the goal is unreachable
+    """
+    pathmap = _get_worker_map(grid_path, size, resolution)
+    field = pathmap.get_distance_field(Map.get_cell_centre(goal), radius)
+    return [(field.get_distance(start), field.get_waypoint(start)) for start in starts]
+
+
+class PathPool(object):
+    """
+    Pool of worker processes answering path queries, so the pure Python searches of a team use more than the one
+    core the GIL allows. The collision grid of every game is written once to a .npy file that the workers memory
+    map, only the queries and answers go through the pool's pipes.
+    A batch is one task per goal cell and collision radius, gathered until a deadline. Queries whose task did not
+    finish in time are answered None and counted instead of blocking the tick. A task still running is picked up
+    again by the next batch asking the same, a goal is not submitted again until its task finished.
+    The pool cannot cancel a task, so no more tasks are submitted than there are workers free, the others wait in the
+    batch for a worker until the deadline.
+    directory (String)
+    * Where the grids are written, a temporary directory removed by close unless one was given.
+    processes (Integer)
+    * Number of worker processes.
+    orphaned (Set of AsyncResult)
+    * Tasks of goals no longer asked for, still taking a worker until they finish.
+    submitted, unfinished (Integer)
+    * Number of queries submitted and answered None.
+    """
+
+    def __init__(self, processes=None, directory=None):
+        self.owns_directory = directory is None
+        self.directory = directory if directory is not None else tempfile.mkdtemp(prefix='path_pool')
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes)
+        # (grid path, goal, radius) -> starts and AsyncResult of the task still running for it
+        self.running = {}
+        self.orphaned = set()
+        self.submitted = 0
+        self.unfinished = 0
+
+    def get_grid_path(self, pathmap):
+        """
+        The .npy file of the map's collision grid, written on first use.
+        """
+        path = os.path.join(self.directory, "%s.npy" % pathmap.fingerprint)
+        if not os.path.exists(path):
+            # Written to a temporary file first so workers never see a partial file
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as temp_file:
+                numpy.save(temp_file, numpy.asarray(pathmap.col_grid))
+            os.rename(temp_path, path)
+        return path
+
+    def solve(self, pathmap, queries, deadline=None):
+        """
+        :param pathmap: Map
+        :param queries: list of (start cell, goal cell, collision radius)
+        :param deadline: Number, time.time() to stop waiting at, None to wait for every answer
+        :return list of (float, 2-tuple), path cost in cells and waypoint cell for every query as in solve_queries,
+                None for the queries that did not finish in time
+        """
+        grid_path = self.get_grid_path(pathmap)
+        groups = OrderedDict()
+        for i, (start, goal, radius) in enumerate(queries):
+            groups.setdefault((grid_path, goal, radius), []).append((i, start))
+        # Tasks of goals no longer asked for are forgotten, but keep their worker until they finish
+        for key in [key for key in self.running if key not in groups]:
+            _, task = self.running.pop(key)
+            if not task.ready():
+                self.orphaned.add(task)
+        tasks = deque()
+        pending = deque()
+        for key, members in groups.iteritems():
+            running = self.running.get(key)
+            if running is not None and running[0] != [start for _, start in members]:
+                if not running[1].ready():
+                    # Still busy with the starts of an earlier batch
+                    continue
+                del self.running[key]
+                running = None
+            if running is None:
+                pending.append((key, members))
+            else:
+                tasks.append((key, members, running[1]))
+        self.submitted += len(queries)
+
+        answers = [None] * len(queries)
+        while True:
+            busy = self._get_busy()
+            while pending and len(busy) < self.processes:
+                key, members = pending.popleft()
+                _, goal, radius = key
+                starts = [start for _, start in members]
+                task = self.pool.apply_async(solve_queries, (grid_path, pathmap.size, Map.RESOLUTION, goal, radius,
+                                                             starts))
+                self.running[key] = starts, task
+                tasks.append((key, members, task))
+                busy.append(task)
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            if not tasks:
+                if not pending:
+                    break
+                # Every worker is taken by a task of an earlier batch
+                busy[0].wait(timeout)
+                if not busy[0].ready():
+                    break
+                continue
+            key, members, task = tasks.popleft()
+            task.wait(timeout)
+            if not task.ready():
+                continue
+            del self.running[key]
+            for (i, _), answer in zip(members, task.get()):
+                answers[i] = answer
+        self.unfinished += answers.count(None)
+        return answers
+
+    def _get_busy(self):
+        """
+        The tasks taking a worker, orphaned tasks that finished are forgotten.
+        """
+        self.orphaned = set(task for task in self.orphaned if not task.ready())
+        return list(self.orphaned) + [task for _, task in self.running.itervalues() if not task.ready()]
+
+    def close(self):
+        """
+        Stop the workers and remove the grids, unless the directory was given.
+        """
+        self.pool.terminate()
+        self.pool.join()
+        self.running.clear()
+        self.orphaned.clear()
+        if self.owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
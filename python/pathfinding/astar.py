@@ -0,0 +1,182 @@
+import math
+from heapq import heappop, heappush
+
+import numpy
+
+SQRT2 = math.sqrt(2)
+
+
+def octile_distance(a, b):
+    """
+    Exact path cost between two cells on an open 8-connected grid with unit straight and sqrt(2) diagonal steps.
+    :param a: 2-tuple, Integers (x, y) cell
+    :param b: 2-tuple, Integers (x, y) cell
+    :return float
+    """
+    dx = abs(b[0] - a[0])
+    dy = abs(b[1] - a[1])
+    return dx + dy + (SQRT2 - 2) * min(dx, dy)
+
+
+def path_cost(start, path):
+    """
+    Sum of the step costs along a path of cells.
+    :param start: 2-tuple, Integers (x, y) cell the path leaves from
+    :param path: list of (x, y) cells, not including start
+    :return float
+    """
+    cost = 0.0
+    for cell in path:
+        cost += octile_distance(start, cell)
+        start = cell
+    return cost
+
+
+class GridAStar(object):
+    """
+    A-star search over a flattened collision grid.
+    The grid is padded with a ring of blocked cells and flattened so every cell is a single integer index and
+    neighbours are constant offsets, with no bounds checks in the inner loop.
+    g-score, parent and search stamps live in arrays preallocated once per grid and reused by every search;
+    a cell's entries are only valid when its stamp matches the current search id.
+    Heap entries are never removed, stale entries are skipped when popped (lazy deletion).
+    col_grid (numpy.array)
+    * Collision grid indexed [x][y] (0 - No obstacle, anything else - Obstacle).
+    radius (float)
+    * Collision radius in cells of the tanks searched for. Above 0 a diagonal step needs both cells beside it
+      free, a tank of any size cannot squeeze through the corner two obstacle cells touch at, and
+      theta.has_line_of_sight keeps the radius from every cell of obstacles.
+    moves (list)
+    * (offset, cost, side, other side) of every step, the steps for which blocked[current + side] or
+      blocked[current + other side] must also be free. Straight steps, and every step at radius 0, repeat their
+      own offset.
+    last_expansions (Integer)
+    * Number of cells expanded by the most recent search.
+    """
+
+    def __init__(self, col_grid, radius=0.0, obstacle_grid=None):
+        """
+        :param col_grid: numpy.array, grid indexed [x][y] to search, e.g. inflated for radius
+        :param radius: float, collision radius in cells
+        :param obstacle_grid: numpy.array, grid indexed [x][y] of the obstacles themselves, col_grid if None
+        """
+        self.width, self.height = col_grid.shape
+        self.stride = self.height + 2
+        self.radius = radius
+        self.blocked = GridAStar._pad(col_grid)
+        self.obstacles = GridAStar._pad(obstacle_grid) if obstacle_grid is not None else self.blocked
+
+        cells = len(self.blocked)
+        self.g_score = [0.0] * cells
+        self.parent = [-1] * cells
+        self.seen = [0] * cells
+        self.closed = [0] * cells
+        self.search_id = 0
+        self.last_expansions = 0
+
+        stride = self.stride
+        self.neighbors = [(stride, 1.0), (-stride, 1.0), (1, 1.0), (-1, 1.0),
+                          (stride + 1, SQRT2), (stride - 1, SQRT2), (-stride + 1, SQRT2), (-stride - 1, SQRT2)]
+        self.moves = []
+        for offset, cost in self.neighbors:
+            step_x = int(round(float(offset) / stride))
+            step_y = offset - step_x * stride
+            if radius > 0 and step_x and step_y:
+                self.moves.append((offset, cost, step_x * stride, step_y))
+            else:
+                self.moves.append((offset, cost, offset, offset))
+
+    @staticmethod
+    def _pad(grid):
+        padded = numpy.ones((grid.shape[0] + 2, grid.shape[1] + 2), dtype=numpy.int8)
+        padded[1:-1, 1:-1] = numpy.asarray(grid) != 0
+        return padded.ravel().tolist()
+
+    def clamp(self, cell):
+        """
+        Clamp a cell into the grid, positions on the far map edges fall one cell outside of it.
+        :param cell: 2-tuple, Integers (x, y)
+        :return 2-tuple, Integers (x, y)
+        """
+        return min(max(cell[0], 0), self.width - 1), min(max(cell[1], 0), self.height - 1)
+
+    def to_index(self, cell):
+        return (cell[0] + 1) * self.stride + cell[1] + 1
+
+    def to_cell(self, index):
+        x, y = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def is_blocked(self, cell):
+        return self.blocked[self.to_index(cell)] != 0
+
+    def search(self, start, goal):
+        """
+        Find the cheapest 8-connected path between two cells.
+        :param start: 2-tuple, Integers (x, y) starting cell
+        :param goal: 2-tuple, Integers (x, y) goal cell
+        :return list of (x, y) cells from the cell after start up to goal, empty list if no path or start is goal
+        """
+        self.search_id += 1
+        search_id = self.search_id
+        stride = self.stride
+        blocked = self.blocked
+        g_score = self.g_score
+        parent = self.parent
+        seen = self.seen
+        closed = self.closed
+        moves = self.moves
+        diagonal_saving = SQRT2 - 2
+
+        source = self.to_index(start)
+        target = self.to_index(goal)
+        goal_x, goal_y = divmod(target, stride)
+        g_score[source] = 0.0
+        parent[source] = -1
+        seen[source] = search_id
+        oheap = [(octile_distance(start, goal), 0.0, source)]
+
+        expansions = 0
+        found = False
+        if not blocked[target]:
+            while oheap:
+                current = heappop(oheap)[2]
+                if closed[current] == search_id:
+                    continue
+                closed[current] = search_id
+                expansions += 1
+                if current == target:
+                    found = True
+                    break
+
+                current_g = g_score[current]
+                for offset, cost, side, other_side in moves:
+                    neighbor = current + offset
+                    if (blocked[neighbor] or closed[neighbor] == search_id or blocked[current + side] or
+                            blocked[current + other_side]):
+                        continue
+                    tentative_g_score = current_g + cost
+                    if seen[neighbor] != search_id or tentative_g_score < g_score[neighbor]:
+                        seen[neighbor] = search_id
+                        g_score[neighbor] = tentative_g_score
+                        parent[neighbor] = current
+                        x, y = divmod(neighbor, stride)
+                        dx = abs(x - goal_x)
+                        dy = abs(y - goal_y)
+                        if dx < dy:
+                            heuristic = dx + dy + diagonal_saving * dx
+                        else:
+                            heuristic = dx + dy + diagonal_saving * dy
+                        # Ties on f are broken towards the deeper node
+                        heappush(oheap, (tentative_g_score + heuristic, -tentative_g_score, neighbor))
+        self.last_expansions = expansions
+
+        if not found or source == target:
+            return []
+        data = []
+        current = target
+        while current != source:
+            data.append(self.to_cell(current))
+            current = parent[current]
+        data.reverse()
+        return data
@@ -0,0 +1,190 @@
+import time
+from array import array
+from collections import OrderedDict
+from heapq import heappop, heappush
+
+from pathfinding.theta import has_line_of_sight
+
+INFINITY = float('inf')
+# Expansions between two looks at the clock while a deadline is set
+DEADLINE_CHECK_INTERVAL = 256
+
+
+class DistanceField(object):
+    """
+    Cost of the cheapest path from every cell of a grid to one goal cell.
+    Built with a single reverse Dijkstra from the goal over the flattened grid of a GridAStar, so any number of
+    tanks can read their path cost and next step towards the goal in O(1).
+    goal (2-tuple)
+    * Integers (x, y) goal cell.
+    distance (array of Float)
+    * Path cost to the goal for every flattened cell index, infinity where the goal is unreachable.
+    next_step (array of Integers)
+    * Flattened index of the next cell on the path to the goal, -1 at the goal and where it is unreachable.
+    oheap (list)
+    * Open list of the reverse search, empty once the field is complete. A field built against a deadline can be
+      left incomplete and expanded further later, cells the search did not settle yet read as unreachable.
+    """
+
+    def __init__(self, engine, goal, deadline=None):
+        self.engine = engine
+        self.goal = goal
+
+        cells = len(engine.blocked)
+        self.distance = array('d', [INFINITY]) * cells
+        self.next_step = array('i', [-1]) * cells
+
+        # The goal is seeded even when blocked, an enemy overlapping an obstacle cell is still a target
+        target = engine.to_index(goal)
+        self.distance[target] = 0.0
+        self.oheap = [(0.0, target)]
+        self.expand(deadline)
+
+    def is_complete(self):
+        """
+        :return boolean, True once every reachable cell has its final distance
+        """
+        return not self.oheap
+
+    def expand(self, deadline=None):
+        """
+        Continue the reverse search, until every reachable cell is settled or the deadline passes.
+        Cells settled so far already have their final distance and next step, see _resolve.
+        :param deadline: Number, time.time() to stop at, None to finish the search
+        :return boolean, True if the field is complete
+        """
+        blocked = self.engine.blocked
+        moves = self.engine.moves
+        distance = self.distance
+        next_step = self.next_step
+        oheap = self.oheap
+        pops = 0
+        while oheap:
+            # Reading the clock is as expensive as a few expansions, only look at it before the first pop and then
+            # every DEADLINE_CHECK_INTERVAL pops
+            if deadline is not None and not pops % DEADLINE_CHECK_INTERVAL and time.time() >= deadline:
+                return False
+            pops += 1
+            current_distance, current = heappop(oheap)
+            if current_distance > distance[current]:
+                continue
+            for offset, cost, side, other_side in moves:
+                neighbor = current + offset
+                if blocked[neighbor] or blocked[current + side] or blocked[current + other_side]:
+                    continue
+                tentative_distance = current_distance + cost
+                if tentative_distance < distance[neighbor]:
+                    distance[neighbor] = tentative_distance
+                    next_step[neighbor] = current
+                    heappush(oheap, (tentative_distance, neighbor))
+        return True
+
+    def _resolve(self, cell):
+        """
+        Flattened index, distance and next index for a cell.
+        A blocked cell, e.g. a tank overlapping an obstacle cell, is never reached by the reverse search,
+        so it continues through its cheapest free neighbour instead.
+        """
+        index = self.engine.to_index(cell)
+        if not self.engine.blocked[index] or index == self.engine.to_index(self.goal):
+            best_distance, best_next = self.distance[index], self.next_step[index]
+        else:
+            best_distance = INFINITY
+            best_next = -1
+            for offset, cost in self.engine.neighbors:
+                neighbor = index + offset
+                if self.distance[neighbor] + cost < best_distance:
+                    best_distance = self.distance[neighbor] + cost
+                    best_next = neighbor
+        # Distances beyond the frontier of an incomplete search may still drop
+        if self.oheap and best_distance > self.oheap[0][0]:
+            return index, INFINITY, -1
+        return index, best_distance, best_next
+
+    def get_distance(self, cell):
+        """
+        :param cell: 2-tuple, Integers (x, y) cell inside the grid
+        :return float, path cost to the goal, infinity if the goal is unreachable
+        """
+        return self._resolve(cell)[1]
+
+    def get_next_step(self, cell):
+        """
+        :param cell: 2-tuple, Integers (x, y) cell inside the grid
+        :return 2-tuple, Integers (x, y) next cell towards the goal. None at the goal or if it is unreachable.
+        """
+        next_index = self._resolve(cell)[2]
+        if next_index < 0:
+            return None
+        return self.engine.to_cell(next_index)
+
+    def get_waypoint(self, cell, max_turns=8):
+        """
+        Furthest turning point of the path to the goal that is still in line of sight of cell, so a tank can drive
+        one straight leg instead of steering cell by cell. At most max_turns turning points are looked at.
+        :param cell: 2-tuple, Integers (x, y) cell inside the grid
+        :return 2-tuple, Integers (x, y) waypoint cell. None at the goal or if it is unreachable.
+        """
+        previous, _, current = self._resolve(cell)
+        if current < 0:
+            return None
+        waypoint = current
+        turns = 0
+        while current >= 0:
+            following = self.next_step[current]
+            # Flattened offsets identify directions, so a changed offset is a turn
+            if following < 0 or following - current != current - previous:
+                if not has_line_of_sight(self.engine, cell, self.engine.to_cell(current)):
+                    break
+                waypoint = current
+                turns += 1
+                if turns >= max_turns:
+                    break
+            previous, current = current, following
+        return self.engine.to_cell(waypoint)
+
+    def get_path(self, cell):
+        """
+        :param cell: 2-tuple, Integers (x, y) cell inside the grid
+        :return list of (x, y) cells from the cell after the given one up to the goal, same format as GridAStar.search
+        """
+        data = []
+        current = self._resolve(cell)[2]
+        while current >= 0:
+            data.append(self.engine.to_cell(current))
+            current = self.next_step[current]
+        return data
+
+
+class DistanceFieldCache(object):
+    """
+    Least recently used cache of DistanceFields keyed by goal cell.
+    A field is reused for as long as its goal, usually an enemy tank, stays inside the same cell.
+    """
+
+    def __init__(self, engine, capacity):
+        self.engine = engine
+        self.capacity = capacity
+        self.fields = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, goal, deadline=None):
+        """
+        :param goal: 2-tuple, Integers (x, y) goal cell inside the grid
+        :param deadline: Number, time.time() to stop building the field at, None to complete it. A field left
+                         incomplete is expanded further by the next call for the same goal.
+        :return DistanceField, check is_complete when a deadline is given
+        """
+        field = self.fields.pop(goal, None)
+        if field is None:
+            self.misses += 1
+            field = DistanceField(self.engine, goal, deadline)
+            if len(self.fields) >= self.capacity:
+                self.fields.popitem(last=False)
+        else:
+            self.hits += 1
+            if not field.is_complete():
+                field.expand(deadline)
+        self.fields[goal] = field
+        return field
@@ -0,0 +1,174 @@
+from heapq import heappop, heappush
+
+from pathfinding.astar import SQRT2
+
+INFINITY = float('inf')
+# Decimal places the primary queue key is rounded to
+KEY_DIGITS = 9
+
+
+class DStarLite(object):
+    """
+    D* Lite, incremental search over the flattened grid of a GridAStar for one (start, goal) pair across ticks.
+    The search runs backwards from the goal, so g is the path cost from every settled cell to the goal and
+    stays valid while the goal stays in its cell. When only the start moves the old queue is kept by raising
+    every key by km, the heuristic drift, and usually nothing or a handful of cells have to be expanded.
+    When the goal moves into another cell every g changes, repairing that expands every settled cell once or
+    twice, about twice the cells of a fresh search, so the search is reseeded from the new goal instead.
+    last_expansions (Integer)
+    * Number of cells expanded by the most recent search, 0 when nothing had to be repaired.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.start = None
+        self.goal = None
+        self.km = 0.0
+        self.g = {}
+        self.rhs = {}
+        self.queued = {}
+        self.oheap = []
+        self.last_expansions = 0
+
+    def _reset(self, start, goal):
+        target = self.engine.to_index(goal)
+        self.start = start
+        self.goal = goal
+        self.km = 0.0
+        self.g = {}
+        self.rhs = {target: 0.0}
+        self.queued = {}
+        self.oheap = []
+        self._push(target)
+
+    def _key(self, index):
+        best = min(self.g.get(index, INFINITY), self.rhs.get(index, INFINITY))
+        x, y = divmod(index, self.engine.stride)
+        dx = abs(x - self.start[0] - 1)
+        dy = abs(y - self.start[1] - 1)
+        # Rounded so that sums of diagonal costs which are equal on paper also tie in floating point,
+        # otherwise the stop test can miss a stale cell whose key only differs from the start by rounding
+        return round(best + dx + dy + (SQRT2 - 2) * min(dx, dy) + self.km, KEY_DIGITS), best
+
+    def _push(self, index):
+        key = self._key(index)
+        self.queued[index] = key
+        heappush(self.oheap, (key, index))
+
+    def _update_vertex(self, index):
+        """
+        Recompute the rhs of a cell from its neighbours and queue it if it no longer matches its g.
+        """
+        g = self.g
+        blocked = self.engine.blocked
+        best = INFINITY
+        for offset, cost, side, other_side in self.engine.moves:
+            neighbor = index + offset
+            if not (blocked[neighbor] or blocked[index + side] or blocked[index + other_side]):
+                neighbor_g = g.get(neighbor, INFINITY)
+                if cost + neighbor_g < best:
+                    best = cost + neighbor_g
+        self.rhs[index] = best
+        if g.get(index, INFINITY) != best:
+            self._push(index)
+        else:
+            self.queued.pop(index, None)
+
+    def _compute_shortest_path(self):
+        blocked = self.engine.blocked
+        neighbors = self.engine.neighbors
+        moves = self.engine.moves
+        source = self.engine.to_index(self.start)
+        target = self.engine.to_index(self.goal)
+        g = self.g
+        rhs = self.rhs
+        queued = self.queued
+        oheap = self.oheap
+        expansions = 0
+        while oheap:
+            key, current = oheap[0]
+            if queued.get(current) != key:
+                # Stale entry, the cell was queued again with another key or became consistent
+                heappop(oheap)
+                continue
+            if g.get(source, INFINITY) == rhs.get(source, INFINITY) and key >= self._key(source):
+                break
+            new_key = self._key(current)
+            if key < new_key:
+                self._push(current)
+                continue
+            heappop(oheap)
+            del queued[current]
+            expansions += 1
+            current_rhs = rhs[current]
+            if g.get(current, INFINITY) > current_rhs:
+                g[current] = current_rhs
+                for offset, cost, side, other_side in moves:
+                    neighbor = current + offset
+                    if blocked[neighbor] or blocked[current + side] or blocked[current + other_side]:
+                        continue
+                    if current_rhs + cost < rhs.get(neighbor, INFINITY):
+                        rhs[neighbor] = current_rhs + cost
+                        if g.get(neighbor, INFINITY) != rhs[neighbor]:
+                            self._push(neighbor)
+                        else:
+                            queued.pop(neighbor, None)
+            else:
+                # Underconsistent, the cell got more expensive, re-derive everything that leaned on it
+                g[current] = INFINITY
+                for neighbor in [current] + [current + offset for offset, _ in neighbors]:
+                    if not blocked[neighbor] and neighbor != target:
+                        self._update_vertex(neighbor)
+        return expansions
+
+    def search(self, start, goal):
+        """
+        Find the cheapest 8-connected path between two cells, same format as GridAStar.search.
+        Falls back to plain A-star when the start overlaps an obstacle cell, it has no edges in the grid graph.
+        :param start: 2-tuple, Integers (x, y) starting cell
+        :param goal: 2-tuple, Integers (x, y) goal cell
+        :return list of (x, y) cells from the cell after start up to goal, empty list if no path or start is goal
+        """
+        engine = self.engine
+        source = engine.to_index(start)
+        target = engine.to_index(goal)
+        if source == target or engine.blocked[target]:
+            self.last_expansions = 0
+            return []
+        if engine.blocked[source]:
+            data = engine.search(start, goal)
+            self.last_expansions = engine.last_expansions
+            return data
+
+        if goal != self.goal:
+            self._reset(start, goal)
+        elif start != self.start:
+            dx = abs(start[0] - self.start[0])
+            dy = abs(start[1] - self.start[1])
+            self.km += dx + dy + (SQRT2 - 2) * min(dx, dy)
+            self.start = start
+        self.last_expansions = self._compute_shortest_path()
+
+        g = self.g
+        if g.get(source, INFINITY) == INFINITY:
+            return []
+        data = []
+        current = source
+        # Follow the cheapest neighbour down to the goal, never longer than the number of cells
+        while current != target:
+            if len(data) >= len(engine.blocked):
+                return []
+            best = INFINITY
+            following = -1
+            for offset, cost, side, other_side in engine.moves:
+                neighbor = current + offset
+                if engine.blocked[neighbor] or engine.blocked[current + side] or engine.blocked[current + other_side]:
+                    continue
+                if cost + g.get(neighbor, INFINITY) < best:
+                    best = cost + g.get(neighbor, INFINITY)
+                    following = neighbor
+            if following < 0:
+                return []
+            current = following
+            data.append(engine.to_cell(current))
+        return data
@@ -0,0 +1,284 @@
+from heapq import heappop, heappush
+
+import numpy
+
+from pathfinding.astar import SQRT2, octile_distance
+
+INFINITY = float('inf')
+
+
+class HierarchicalPathfinder(object):
+    """
+    Hierarchical path-finding A-star (HPA*) over the flattened grid of a GridAStar.
+    The grid is split into square clusters. Every free run of cells along a cluster border gets one transition
+    (two for long runs) whose cells on either side become abstract nodes, and the cheapest in-cluster path cost
+    between every pair of nodes of a cluster is precomputed once per map.
+    Queries search the small abstract graph and only refine the clusters the abstract path goes through.
+    Clusters without obstacles need no search at all, their in-cluster costs are the exact octile distances.
+    cluster_size (Integer)
+    * Width and height of a cluster in cells.
+    graph (dict)
+    * Flattened node index -> list of (node index, cost) abstract edges.
+    """
+    # Border runs at least this long get a transition at each end instead of one in the middle
+    LONG_ENTRANCE = 6
+
+    def __init__(self, engine, cluster_size):
+        self.engine = engine
+        self.cluster_size = cluster_size
+        self.clusters_x = -(-engine.width // cluster_size)
+        self.clusters_y = -(-engine.height // cluster_size)
+        self.graph = {}
+        self.cluster_nodes = {}
+        self.refined = {}
+
+        # Cluster id of every flattened cell, -1 on the blocked padding ring
+        cells_x = numpy.arange(engine.width + 2) - 1
+        cells_y = numpy.arange(engine.stride) - 1
+        cluster_of = (cells_x // cluster_size)[:, None] * self.clusters_y + (cells_y // cluster_size)[None, :]
+        cluster_of[0, :] = cluster_of[-1, :] = cluster_of[:, 0] = cluster_of[:, -1] = -1
+        self.cluster_of = cluster_of.ravel().tolist()
+
+        blocked = numpy.array(engine.blocked, dtype=numpy.int8).reshape(engine.width + 2, engine.stride)
+        grid = blocked[1:-1, 1:-1]
+        padded = numpy.zeros((self.clusters_x * cluster_size, self.clusters_y * cluster_size), dtype=int)
+        padded[:engine.width, :engine.height] = grid
+        obstacle_counts = padded.reshape(
+                self.clusters_x, cluster_size, self.clusters_y, cluster_size).sum(axis=(1, 3))
+        self.open_clusters = set((obstacle_counts.ravel() == 0).nonzero()[0].tolist())
+
+        self._build_entrances(grid)
+        for cluster, nodes in self.cluster_nodes.iteritems():
+            for node in nodes:
+                costs = self._cluster_costs(node, cluster, nodes)
+                for other in nodes:
+                    if other != node and other in costs:
+                        self.graph[node].append((other, costs[other]))
+
+    def _add_node(self, cell):
+        index = self.engine.to_index(cell)
+        if index not in self.graph:
+            self.graph[index] = []
+            self.cluster_nodes.setdefault(self.cluster_of[index], []).append(index)
+        return index
+
+    def _add_transition(self, cell, other, cost=1.0):
+        a = self._add_node(cell)
+        b = self._add_node(other)
+        self.graph[a].append((b, cost))
+        self.graph[b].append((a, cost))
+
+    def _build_entrances(self, grid):
+        """
+        Create the transitions along every border shared by two clusters.
+        A diagonal step squeezing between two obstacle cells across a border is the only way through there,
+        so it gets a diagonal transition of its own, unless the engine's radius forbids such steps.
+        """
+        size = self.cluster_size
+        width, height = grid.shape
+        for border in xrange(size, width, size):
+            free = (grid[border - 1, :] == 0) & (grid[border, :] == 0)
+            for low, high in self._get_runs(free, height):
+                for y in self._get_transition_offsets(low, high):
+                    self._add_transition((border - 1, y), (border, y))
+            if self.engine.radius > 0:
+                continue
+            for y, other_y in self._get_squeezes(grid[border - 1, :], grid[border, :]):
+                self._add_transition((border - 1, y), (border, other_y), SQRT2)
+        for border in xrange(size, height, size):
+            free = (grid[:, border - 1] == 0) & (grid[:, border] == 0)
+            for low, high in self._get_runs(free, width):
+                for x in self._get_transition_offsets(low, high):
+                    self._add_transition((x, border - 1), (x, border))
+            if self.engine.radius > 0:
+                continue
+            for x, other_x in self._get_squeezes(grid[:, border - 1], grid[:, border]):
+                # Squeezes over a cluster corner were already added along the vertical border
+                if max(x, other_x) % size != 0:
+                    self._add_transition((x, border - 1), (other_x, border), SQRT2)
+
+    @staticmethod
+    def _get_squeezes(near, far):
+        """
+        Diagonal steps between the two rows of cells on either side of a border whose straight neighbours
+        are both blocked.
+        :return list of (near offset, far offset)
+        """
+        near_free = near[:-1] == 0
+        near_next_free = near[1:] == 0
+        far_free = far[:-1] == 0
+        far_next_free = far[1:] == 0
+        rising = (near_free & far_next_free & ~near_next_free & ~far_free).nonzero()[0]
+        falling = (near_next_free & far_free & ~near_free & ~far_next_free).nonzero()[0]
+        return [(offset, offset + 1) for offset in rising.tolist()] + \
+               [(offset + 1, offset) for offset in falling.tolist()]
+
+    def _get_runs(self, free, length):
+        """
+        Contiguous runs of free cells along a border, split at cluster corners.
+        :return list of (first, last) inclusive offsets
+        """
+        runs = []
+        for start in xrange(0, length, self.cluster_size):
+            low = None
+            for offset in xrange(start, min(start + self.cluster_size, length)):
+                if free[offset] and low is None:
+                    low = offset
+                elif not free[offset] and low is not None:
+                    runs.append((low, offset - 1))
+                    low = None
+            if low is not None:
+                runs.append((low, min(start + self.cluster_size, length) - 1))
+        return runs
+
+    @staticmethod
+    def _get_transition_offsets(low, high):
+        if high - low + 1 >= HierarchicalPathfinder.LONG_ENTRANCE:
+            return low, high
+        return (low + high) / 2,
+
+    def _cluster_costs(self, source, cluster, targets):
+        """
+        In-cluster path costs from source to the target indices that can be reached.
+        :return dict, target index -> cost
+        """
+        if cluster in self.open_clusters:
+            source_cell = self.engine.to_cell(source)
+            return dict((target, octile_distance(source_cell, self.engine.to_cell(target))) for target in targets)
+        distance = self._cluster_search(source, cluster)[0]
+        return dict((target, distance[target]) for target in targets if target in distance)
+
+    def _cluster_search(self, source, cluster, target=None):
+        """
+        Dijkstra confined to one cluster, stopping early once target is settled.
+        :return (dict index -> cost, dict index -> parent index)
+        """
+        blocked = self.engine.blocked
+        cluster_of = self.cluster_of
+        distance = {source: 0.0}
+        parent = {}
+        closed = set()
+        oheap = [(0.0, source)]
+        while oheap:
+            current_distance, current = heappop(oheap)
+            if current in closed:
+                continue
+            closed.add(current)
+            if current == target:
+                break
+            for offset, cost, side, other_side in self.engine.moves:
+                neighbor = current + offset
+                if (blocked[neighbor] or cluster_of[neighbor] != cluster or neighbor in closed or
+                        blocked[current + side] or blocked[current + other_side]):
+                    continue
+                tentative_distance = current_distance + cost
+                if tentative_distance < distance.get(neighbor, INFINITY):
+                    distance[neighbor] = tentative_distance
+                    parent[neighbor] = current
+                    heappush(oheap, (tentative_distance, neighbor))
+        return distance, parent
+
+    def _refine(self, source, target):
+        """
+        Concrete cells of the cheapest in-cluster path between two cells of the same cluster, excluding source.
+        Paths between abstract nodes are remembered since the same segments are refined over and over.
+        :return list of (x, y) cells, None if target cannot be reached inside the cluster
+        """
+        key = (source, target)
+        if key in self.refined:
+            return self.refined[key]
+        cluster = self.cluster_of[source]
+        if cluster in self.open_clusters:
+            # Diagonal steps first, then straight ones, stays in the bounding box of the two cells
+            x, y = self.engine.to_cell(source)
+            goal_x, goal_y = self.engine.to_cell(target)
+            data = []
+            while (x, y) != (goal_x, goal_y):
+                x += cmp(goal_x, x)
+                y += cmp(goal_y, y)
+                data.append((x, y))
+        else:
+            parent = self._cluster_search(source, cluster, target)[1]
+            if target != source and target not in parent:
+                data = None
+            else:
+                data = []
+                current = target
+                while current != source:
+                    data.append(self.engine.to_cell(current))
+                    current = parent[current]
+                data.reverse()
+        if source in self.graph and target in self.graph:
+            self.refined[key] = data
+        return data
+
+    def search(self, start, goal):
+        """
+        Find a near optimal 8-connected path between two cells, same format as GridAStar.search.
+        :param start: 2-tuple, Integers (x, y) starting cell
+        :param goal: 2-tuple, Integers (x, y) goal cell
+        :return list of (x, y) cells from the cell after start up to goal, empty list if no path or start is goal
+        """
+        engine = self.engine
+        source = engine.to_index(start)
+        target = engine.to_index(goal)
+        if source == target or engine.blocked[target]:
+            return []
+        if engine.blocked[source]:
+            # A start overlapping an obstacle cell is not linked to any entrance, leave it to the flat search
+            return engine.search(start, goal)
+        source_cluster = self.cluster_of[source]
+        target_cluster = self.cluster_of[target]
+        if source_cluster == target_cluster:
+            data = self._refine(source, target)
+            if data is not None:
+                return data
+
+        # Temporarily link start and goal to the abstract nodes of their clusters
+        source_links = self._cluster_costs(source, source_cluster, self.cluster_nodes.get(source_cluster, []))
+        target_links = self._cluster_costs(target, target_cluster, self.cluster_nodes.get(target_cluster, []))
+
+        goal_x, goal_y = divmod(target, engine.stride)
+        g_score = {source: 0.0}
+        came_from = {}
+        closed = set()
+        oheap = [(octile_distance(start, goal), source)]
+        found = False
+        while oheap:
+            current = heappop(oheap)[1]
+            if current in closed:
+                continue
+            closed.add(current)
+            if current == target:
+                found = True
+                break
+            if current == source:
+                edges = source_links.items() + self.graph.get(source, [])
+            else:
+                edges = self.graph[current]
+            if current in target_links:
+                edges = edges + [(target, target_links[current])]
+            for neighbor, cost in edges:
+                if neighbor in closed:
+                    continue
+                tentative_g_score = g_score[current] + cost
+                if tentative_g_score < g_score.get(neighbor, INFINITY):
+                    g_score[neighbor] = tentative_g_score
+                    came_from[neighbor] = current
+                    x, y = divmod(neighbor, engine.stride)
+                    heappush(oheap, (tentative_g_score + octile_distance((x, y), (goal_x, goal_y)), neighbor))
+        if not found:
+            return []
+
+        abstract_path = [target]
+        while abstract_path[-1] != source:
+            abstract_path.append(came_from[abstract_path[-1]])
+        abstract_path.reverse()
+
+        data = []
+        for segment_start, segment_end in zip(abstract_path, abstract_path[1:]):
+            if self.cluster_of[segment_start] != self.cluster_of[segment_end]:
+                data.append(engine.to_cell(segment_end))
+            else:
+                data.extend(self._refine(segment_start, segment_end))
+        return data
@@ -0,0 +1,223 @@
+from heapq import heappop, heappush
+
+from pathfinding.astar import octile_distance
+
+INFINITY = float('inf')
+
+
+class JumpPointSearch(object):
+    """
+    Jump Point Search over the flattened grid of a GridAStar.
+    On a uniform cost 8-connected grid most paths have many symmetric equivalents. JPS only expands jump points,
+    cells where an obstacle forces a turn, and skips straight over everything in between, so it returns the same
+    optimal path cost as A-star while expanding far fewer cells.
+    Diagonal steps follow the corner rule of the engine, as in GridAStar: at radius 0 they may pass between two
+    obstacle cells, above it they need both cells beside them free and the pruning rules of the variant that never
+    cuts a corner are used.
+    last_expansions (Integer)
+    * Number of jump points expanded by the most recent search.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.last_expansions = 0
+
+    def _jump(self, index, dx, dy, target):
+        """
+        Scan from index in direction (dx, dy) until a jump point, the target or an obstacle is met.
+        :return flattened index of the jump point, -1 if the scan ran into an obstacle
+        """
+        blocked = self.engine.blocked
+        stride = self.engine.stride
+        step = dx * stride + dy
+        while True:
+            index += step
+            if blocked[index]:
+                return -1
+            if index == target:
+                return index
+            if dx and dy:
+                if (blocked[index - dx * stride] and not blocked[index - dx * stride + dy]) or \
+                        (blocked[index - dy] and not blocked[index + dx * stride - dy]):
+                    return index
+                if self._jump(index, dx, 0, target) >= 0 or self._jump(index, 0, dy, target) >= 0:
+                    return index
+            elif dx:
+                if (blocked[index + 1] and not blocked[index + step + 1]) or \
+                        (blocked[index - 1] and not blocked[index + step - 1]):
+                    return index
+            else:
+                if (blocked[index + stride] and not blocked[index + stride + dy]) or \
+                        (blocked[index - stride] and not blocked[index - stride + dy]):
+                    return index
+
+    def _jump_no_corners(self, index, dx, dy, target):
+        """
+        Same as _jump for an engine whose diagonal steps need both cells beside them free. Straight scans stop
+        where an obstacle beside them ends, diagonal scans at cells a straight scan finds a jump point from.
+        """
+        blocked = self.engine.blocked
+        stride = self.engine.stride
+        step = dx * stride + dy
+        while True:
+            index += step
+            if blocked[index]:
+                return -1
+            if index == target:
+                return index
+            if dx and dy:
+                if self._jump_no_corners(index, dx, 0, target) >= 0 or \
+                        self._jump_no_corners(index, 0, dy, target) >= 0:
+                    return index
+                if blocked[index + dx * stride] or blocked[index + dy]:
+                    return -1
+            elif dx:
+                if (not blocked[index + 1] and blocked[index - dx * stride + 1]) or \
+                        (not blocked[index - 1] and blocked[index - dx * stride - 1]):
+                    return index
+            else:
+                if (not blocked[index + stride] and blocked[index + stride - dy]) or \
+                        (not blocked[index - stride] and blocked[index - stride - dy]):
+                    return index
+
+    def _get_directions_no_corners(self, index, dx, dy):
+        """
+        Same as _get_directions for an engine whose diagonal steps need both cells beside them free.
+        """
+        blocked = self.engine.blocked
+        stride = self.engine.stride
+        if not dx and not dy:
+            directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+            for step_x, step_y in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                if not blocked[index + step_x * stride] and not blocked[index + step_y]:
+                    directions.append((step_x, step_y))
+            return directions
+        if dx and dy:
+            free_x = not blocked[index + dx * stride]
+            free_y = not blocked[index + dy]
+            directions = []
+            if free_x:
+                directions.append((dx, 0))
+            if free_y:
+                directions.append((0, dy))
+            if free_x and free_y:
+                directions.append((dx, dy))
+            return directions
+        if dx:
+            ahead = not blocked[index + dx * stride]
+            sides = [side for side in (1, -1) if not blocked[index + side]]
+            directions = [(0, side) for side in sides]
+            if ahead:
+                directions += [(dx, 0)] + [(dx, side) for side in sides]
+        else:
+            ahead = not blocked[index + dy]
+            sides = [side for side in (1, -1) if not blocked[index + side * stride]]
+            directions = [(side, 0) for side in sides]
+            if ahead:
+                directions += [(0, dy)] + [(side, dy) for side in sides]
+        return directions
+
+    def _get_directions(self, index, dx, dy):
+        """
+        Natural and forced directions to scan from a jump point reached while travelling in (dx, dy).
+        """
+        if not dx and not dy:
+            return [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+        blocked = self.engine.blocked
+        stride = self.engine.stride
+        if dx and dy:
+            directions = [(dx, 0), (0, dy), (dx, dy)]
+            if blocked[index - dx * stride]:
+                directions.append((-dx, dy))
+            if blocked[index - dy]:
+                directions.append((dx, -dy))
+        elif dx:
+            directions = [(dx, 0)]
+            if blocked[index + 1]:
+                directions.append((dx, 1))
+            if blocked[index - 1]:
+                directions.append((dx, -1))
+        else:
+            directions = [(0, dy)]
+            if blocked[index + stride]:
+                directions.append((1, dy))
+            if blocked[index - stride]:
+                directions.append((-1, dy))
+        return directions
+
+    def search(self, start, goal):
+        """
+        Find the cheapest 8-connected path between two cells, same format as GridAStar.search.
+        Falls back to plain A-star when the start overlaps an obstacle cell, the pruning rules assume every cell
+        on the path is free.
+        :param start: 2-tuple, Integers (x, y) starting cell
+        :param goal: 2-tuple, Integers (x, y) goal cell
+        :return list of (x, y) cells from the cell after start up to goal, empty list if no path or start is goal
+        """
+        engine = self.engine
+        source = engine.to_index(start)
+        target = engine.to_index(goal)
+        if source == target or engine.blocked[target]:
+            self.last_expansions = 0
+            return []
+        if engine.blocked[source]:
+            data = engine.search(start, goal)
+            self.last_expansions = engine.last_expansions
+            return data
+
+        if engine.radius > 0:
+            jump, get_directions = self._jump_no_corners, self._get_directions_no_corners
+        else:
+            jump, get_directions = self._jump, self._get_directions
+        g_score = {source: 0.0}
+        came_from = {}
+        closed = set()
+        oheap = [(octile_distance(start, goal), 0.0, source)]
+        expansions = 0
+        found = False
+        while oheap:
+            current = heappop(oheap)[2]
+            if current in closed:
+                continue
+            closed.add(current)
+            expansions += 1
+            if current == target:
+                found = True
+                break
+            current_cell = engine.to_cell(current)
+            dx = dy = 0
+            if current in came_from:
+                parent_cell = engine.to_cell(came_from[current])
+                dx = cmp(current_cell[0], parent_cell[0])
+                dy = cmp(current_cell[1], parent_cell[1])
+            for direction_x, direction_y in get_directions(current, dx, dy):
+                jump_point = jump(current, direction_x, direction_y, target)
+                if jump_point < 0 or jump_point in closed:
+                    continue
+                jump_cell = engine.to_cell(jump_point)
+                tentative_g_score = g_score[current] + octile_distance(current_cell, jump_cell)
+                if tentative_g_score < g_score.get(jump_point, INFINITY):
+                    g_score[jump_point] = tentative_g_score
+                    came_from[jump_point] = current
+                    heappush(oheap, (tentative_g_score + octile_distance(jump_cell, goal),
+                                     -tentative_g_score, jump_point))
+        self.last_expansions = expansions
+        if not found:
+            return []
+
+        # Jump points are joined by straight or diagonal runs, fill the cells in between
+        jump_points = [target]
+        while jump_points[-1] != source:
+            jump_points.append(came_from[jump_points[-1]])
+        jump_points.reverse()
+        data = []
+        for segment_start, segment_end in zip(jump_points, jump_points[1:]):
+            x, y = engine.to_cell(segment_start)
+            end_x, end_y = engine.to_cell(segment_end)
+            step_x = cmp(end_x, x)
+            step_y = cmp(end_y, y)
+            while (x, y) != (end_x, end_y):
+                x += step_x
+                y += step_y
+                data.append((x, y))
+        return data
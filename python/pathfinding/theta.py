@@ -0,0 +1,236 @@
+import math
+from heapq import heappop, heappush
+
+INFINITY = float('inf')
+
+
+def has_line_of_sight(engine, a, b):
+    """
+    Whether the straight segment between two cell centres only crosses free cells of a GridAStar grid.
+    Cells are walked in the order the segment enters them. A segment passing exactly through a cell corner
+    needs both cells beside the corner free, so tanks never squeeze between two obstacles diagonally.
+    The first cell is not checked, a tank overlapping an obstacle cell can still drive out of it.
+    Above radius 0 the segment must also keep the engine's radius away from its obstacles, see keeps_clear.
+    :param engine: GridAStar whose flattened grid is tested
+    :param a: 2-tuple, Integers (x, y) cell the segment starts in
+    :param b: 2-tuple, Integers (x, y) cell the segment ends in
+    :return boolean
+    """
+    blocked = engine.blocked
+    delta_x = abs(b[0] - a[0])
+    delta_y = abs(b[1] - a[1])
+    step_x = cmp(b[0], a[0]) * engine.stride
+    step_y = cmp(b[1], a[1])
+    index = engine.to_index(a)
+    first_blocked = blocked[index]
+    crossed_x = crossed_y = 0
+    while crossed_x < delta_x or crossed_y < delta_y:
+        # Compare where the segment crosses the next vertical and horizontal cell borders
+        decision = (1 + 2 * crossed_x) * delta_y - (1 + 2 * crossed_y) * delta_x
+        if decision == 0:
+            if blocked[index + step_x] or blocked[index + step_y]:
+                return False
+            index += step_x + step_y
+            crossed_x += 1
+            crossed_y += 1
+        elif decision < 0:
+            index += step_x
+            crossed_x += 1
+        else:
+            index += step_y
+            crossed_y += 1
+        if blocked[index]:
+            return False
+    return engine.radius <= 0 or first_blocked or keeps_clear(engine, a, b)
+
+
+def keeps_clear(engine, a, b):
+    """
+    Whether a tank of the engine's radius driving from the centre of cell a to the centre of cell b stays that far
+    from every obstacle cell. Only the cells of the corridor around the segment are looked at, each obstacle
+    cell by its exact distance to the segment. Inflated grids only guarantee the clearance of cell centres, a
+    segment between two of them can still cut close past the corner of an obstacle.
+    :param engine: GridAStar, radius and obstacles are used
+    :param a: 2-tuple, Integers (x, y) cell the segment starts in
+    :param b: 2-tuple, Integers (x, y) cell the segment ends in
+    :return boolean
+    """
+    radius = engine.radius
+    obstacles = engine.obstacles
+    stride = engine.stride
+    reach = int(math.ceil(radius))
+    delta_x = b[0] - a[0]
+    delta_y = b[1] - a[1]
+    # Cells beyond the padding ring are further away than the ring itself
+    for x in xrange(max(min(a[0], b[0]) - reach, -1), min(max(a[0], b[0]) + reach, engine.width) + 1):
+        if delta_x:
+            # Part of the segment within the radius of the column
+            enter = (x - 0.5 - radius - a[0]) / float(delta_x)
+            leave = (x + 0.5 + radius - a[0]) / float(delta_x)
+            low = max(min(enter, leave), 0.0)
+            high = min(max(enter, leave), 1.0)
+            if low > high:
+                continue
+            low_y, high_y = sorted((a[1] + low * delta_y, a[1] + high * delta_y))
+        else:
+            low_y, high_y = min(a[1], b[1]), max(a[1], b[1])
+        for y in xrange(max(int(math.ceil(low_y - radius - 0.5)), -1),
+                        min(int(math.floor(high_y + radius + 0.5)), engine.height) + 1):
+            if obstacles[(x + 1) * stride + y + 1] and _segment_box_distance(a, b, x, y) < radius:
+                return False
+    return True
+
+
+def _segment_box_distance(a, b, x, y):
+    """
+    Distance between the segment from a to b and the square of cell (x, y), in cells. Segments that only cross
+    obstacle cells through their corners, the only crossings has_line_of_sight lets through, are measured there.
+    """
+    distance = INFINITY
+    for point_x, point_y in (a, b):
+        distance = min(distance, math.hypot(max(abs(point_x - x) - 0.5, 0), max(abs(point_y - y) - 0.5, 0)))
+    delta_x = b[0] - a[0]
+    delta_y = b[1] - a[1]
+    length = delta_x * delta_x + delta_y * delta_y
+    if length:
+        for corner_x in (x - 0.5, x + 0.5):
+            for corner_y in (y - 0.5, y + 0.5):
+                t = min(max(((corner_x - a[0]) * delta_x + (corner_y - a[1]) * delta_y) / float(length), 0.0), 1.0)
+                distance = min(distance, math.hypot(a[0] + t * delta_x - corner_x, a[1] + t * delta_y - corner_y))
+    return distance
+
+
+def compress_path(start, path):
+    """
+    Drop every cell of a path that continues in the same direction as the step before it.
+    :param start: 2-tuple, Integers (x, y) cell the path leaves from
+    :param path: list of (x, y) cells, not including start
+    :return list of (x, y) turning points followed by the last cell of the path
+    """
+    turning_points = []
+    previous = start
+    direction = None
+    for cell in path:
+        step = (cell[0] - previous[0], cell[1] - previous[1])
+        if direction is not None and step != direction:
+            turning_points.append(previous)
+        direction = step
+        previous = cell
+    if path:
+        turning_points.append(path[-1])
+    return turning_points
+
+
+def smooth_path(engine, start, path):
+    """
+    String pull a path: from each kept point skip ahead to the furthest turning point still in line of sight.
+    :param engine: GridAStar the path was found on
+    :param start: 2-tuple, Integers (x, y) cell the path leaves from
+    :param path: list of (x, y) cells, not including start
+    :return list of (x, y) waypoints, a subset of the turning points of path ending with its last cell
+    """
+    turning_points = compress_path(start, path)
+    waypoints = []
+    anchor = start
+    i = 0
+    while i < len(turning_points):
+        furthest = i
+        while furthest + 1 < len(turning_points) and has_line_of_sight(engine, anchor, turning_points[furthest + 1]):
+            furthest += 1
+        anchor = turning_points[furthest]
+        waypoints.append(anchor)
+        i = furthest + 1
+    return waypoints
+
+
+def _euclidean(a, b):
+    return math.hypot(b[0] - a[0], b[1] - a[1])
+
+
+class LazyThetaStar(object):
+    """
+    Lazy Theta*, any-angle search over the flattened grid of a GridAStar.
+    Every generated cell optimistically takes the parent of the cell that generated it, as if the two were in
+    line of sight, and the line of sight is only checked once the cell is expanded. Paths are made of straight
+    legs between turning points instead of single cell steps.
+    last_expansions (Integer)
+    * Number of cells expanded by the most recent search.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.last_expansions = 0
+
+    def search(self, start, goal):
+        """
+        Find an any-angle path between two cells.
+        :param start: 2-tuple, Integers (x, y) starting cell
+        :param goal: 2-tuple, Integers (x, y) goal cell
+        :return list of (x, y) turning points after start ending with goal, empty list if no path or start is goal
+        """
+        engine = self.engine
+        blocked = engine.blocked
+        source = engine.to_index(start)
+        target = engine.to_index(goal)
+        self.last_expansions = 0
+        if source == target or blocked[target]:
+            return []
+
+        cell_of = {source: start}
+        g_score = {source: 0.0}
+        parent = {source: source}
+        closed = set()
+        oheap = [(_euclidean(start, goal), source)]
+        expansions = 0
+        found = False
+        while oheap:
+            current = heappop(oheap)[1]
+            if current in closed:
+                continue
+            closed.add(current)
+            expansions += 1
+            current_cell = cell_of[current]
+
+            if not has_line_of_sight(engine, cell_of[parent[current]], current_cell):
+                # The optimistic parent was wrong, take the best already expanded neighbour instead. A diagonal
+                # step needs line of sight too, it must not squeeze between two obstacles.
+                g_score[current] = INFINITY
+                for offset, cost in engine.neighbors:
+                    neighbor = current + offset
+                    if (neighbor in closed and g_score[neighbor] + cost < g_score[current] and
+                            has_line_of_sight(engine, cell_of[neighbor], current_cell)):
+                        g_score[current] = g_score[neighbor] + cost
+                        parent[current] = neighbor
+                if g_score[current] == INFINITY:
+                    # Only reachable through a corner so far, open again for a later neighbour to generate
+                    closed.discard(current)
+                    continue
+            if current == target:
+                found = True
+                break
+
+            ancestor = parent[current]
+            ancestor_cell = cell_of[ancestor]
+            for offset, cost in engine.neighbors:
+                neighbor = current + offset
+                if blocked[neighbor] or neighbor in closed:
+                    continue
+                if neighbor not in cell_of:
+                    cell_of[neighbor] = engine.to_cell(neighbor)
+                neighbor_cell = cell_of[neighbor]
+                tentative_g_score = g_score[ancestor] + _euclidean(ancestor_cell, neighbor_cell)
+                if tentative_g_score < g_score.get(neighbor, INFINITY):
+                    g_score[neighbor] = tentative_g_score
+                    parent[neighbor] = ancestor
+                    heappush(oheap, (tentative_g_score + _euclidean(neighbor_cell, goal), neighbor))
+        self.last_expansions = expansions
+        if not found:
+            return []
+
+        data = []
+        current = target
+        while current != source:
+            data.append(cell_of[current])
+            current = parent[current]
+        data.reverse()
+        return data
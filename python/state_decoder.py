@@ -0,0 +1,63 @@
+import json
+import re
+
+TERRAIN_START = re.compile(r'"terrain"\s*:\s*\[')
+TERRAIN_END = re.compile(r'}\s*]')
+EMPTY_TERRAIN = re.compile(r'\s*]')
+
+
+class StateDecoder(object):
+    """
+    Decodes the raw messages of the publish socket. The map is only parsed once per game, but every GAMESTATE
+    repeats the whole map.terrain list, usually the bulk of the message. Once the map is known its terrain span is
+    cut out of the raw string with a couple of C level searches and only the rest (timeRemaining, players,
+    comm_type, ...) goes through json.loads, the 'map' key is dropped from the result.
+    Terrain entries are {"boundingBox": {...}, "type": "..."} objects, so the list ends at the first '}]' after
+    its start. Anything that does not look like that is decoded in full.
+    fallbacks (Integer)
+    * Number of messages that had to be decoded in full although the map was to be skipped.
+    """
+
+    def __init__(self):
+        self.fallbacks = 0
+
+    def decode(self, raw_message, skip_map=False):
+        """
+        :param raw_message: String, raw message of the publish socket
+        :param skip_map: Boolean, leave map.terrain undecoded and drop the 'map' key
+        :return Json object of the message
+        :raise ValueError if the message is not valid json, e.g. the match token string
+        """
+        if not skip_map:
+            return json.loads(raw_message)
+        stripped = StateDecoder.strip_terrain(raw_message)
+        if stripped is not None:
+            try:
+                json_message = json.loads(stripped)
+            except ValueError:
+                json_message = None
+            if isinstance(json_message, dict) and isinstance(json_message.get('map'), dict):
+                del json_message['map']
+                return json_message
+        json_message = json.loads(raw_message)
+        if isinstance(json_message, dict) and 'map' in json_message:
+            self.fallbacks += 1
+            del json_message['map']
+        return json_message
+
+    @staticmethod
+    def strip_terrain(raw_message):
+        """
+        :param raw_message: String, raw message of the publish socket
+        :return String, the message with an empty terrain list, None if it has no terrain list
+        """
+        start = TERRAIN_START.search(raw_message)
+        if start is None:
+            return None
+        empty = EMPTY_TERRAIN.match(raw_message, start.end())
+        if empty is not None:
+            return raw_message
+        end = TERRAIN_END.search(raw_message, start.end())
+        if end is None:
+            return None
+        return raw_message[:start.end()] + raw_message[end.end() - 1:]
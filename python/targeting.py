@@ -0,0 +1,102 @@
+import numpy
+
+
+def solve_assignment(costs):
+    """
+    Hungarian algorithm, the cheapest assignment of rows to columns with every column used at most once.
+    The shortest augmenting path of every row is grown with potentials, one numpy pass over the columns per step,
+    so the whole solve is O(rows^2) array operations.
+    :param costs: numpy.array, (rows, columns) finite costs
+    :return numpy.array, column assigned to every row, -1 for the rows left over when there are more rows than
+            columns
+    """
+    costs = numpy.asarray(costs, dtype=float)
+    rows, columns = costs.shape
+    if rows > columns:
+        # Every column gets a row instead
+        assignment = numpy.full(rows, -1, dtype=int)
+        assigned = solve_assignment(costs.T)
+        assignment[assigned] = numpy.arange(columns)
+        return assignment
+    # 1-based rows and columns, index 0 is the virtual start of every augmenting path
+    u = numpy.zeros(rows + 1)
+    v = numpy.zeros(columns + 1)
+    owner = numpy.zeros(columns + 1, dtype=int)
+    way = numpy.zeros(columns + 1, dtype=int)
+    for row in xrange(1, rows + 1):
+        owner[0] = row
+        column = 0
+        min_reduced = numpy.full(columns + 1, numpy.inf)
+        used = numpy.zeros(columns + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current = owner[column]
+            free = ~used
+            free[0] = False
+            reduced = costs[current - 1] - u[current] - v[1:]
+            better = free[1:] & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = numpy.where(free, min_reduced, numpy.inf)
+            following = int(candidates.argmin())
+            delta = candidates[following]
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_reduced[free] -= delta
+            column = following
+            if owner[column] == 0:
+                break
+        # Flip the augmenting path
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+    assignment = numpy.full(rows, -1, dtype=int)
+    taken = numpy.flatnonzero(owner[1:])
+    assignment[owner[1:][taken] - 1] = taken
+    return assignment
+
+
+class TargetAssigner(object):
+    """
+    Assigns every one of our tanks a target for the whole team at once, the cheapest total cost with at most
+    focus_limit tanks on any enemy, instead of every tank greedily picking its own.
+    The last assignment is reused while the ids are the same and no cost moved by more than threshold relative to
+    the costs it was solved for.
+    focus_limit (Integer)
+    * Most of our tanks assigned the same enemy. Tanks left over once every enemy is full are unassigned.
+    threshold (float)
+    * Relative cost change, against the costs of the last solve, that makes assign solve again.
+    solves, reuses (Integer)
+    * Number of assign calls that solved and that reused the last assignment.
+    """
+
+    def __init__(self, focus_limit=2, threshold=0.1):
+        self.focus_limit = focus_limit
+        self.threshold = threshold
+        self.ids = None
+        self.costs = None
+        self.assignment = None
+        self.solves = 0
+        self.reuses = 0
+
+    def assign(self, ally_ids, enemy_ids, costs):
+        """
+        :param ally_ids: String Array, ids of the rows of costs
+        :param enemy_ids: String Array, ids of the columns of costs
+        :param costs: numpy.array, (len(ally_ids), len(enemy_ids)) finite cost of every tank taking every enemy
+        :return numpy.array, enemy column assigned to every row, -1 if unassigned
+        """
+        costs = numpy.asarray(costs, dtype=float)
+        ids = (list(ally_ids), list(enemy_ids))
+        if ids == self.ids and numpy.all(numpy.abs(costs - self.costs) <=
+                                         self.threshold * numpy.maximum(numpy.abs(self.costs), 1)):
+            self.reuses += 1
+            return self.assignment
+        # Every enemy is offered focus_limit times
+        slots = solve_assignment(numpy.repeat(costs, self.focus_limit, axis=1))
+        self.assignment = numpy.where(slots >= 0, slots // self.focus_limit, -1)
+        self.ids = ids
+        self.costs = costs
+        self.solves += 1
+        return self.assignment
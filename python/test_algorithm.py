@@ -1,13 +1,37 @@
 #! /usr/bin/env python
 
+import Queue
 import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
+
+import numpy
+import zmq
 from algorithm import Algorithm
-from game_objects.map import Map
+from client_pipeline import ClientPipeline, StageQueue
+from command import Command, CommandEncoder
+from command_filter import CommandFilter
+from communication import Communication
+from game_objects.map import Map, PathMethod
 from game_objects.obstacle import Obstacle
 from game_objects.player import Player
 from game_objects.projectile import Projectile
+from game_objects.projectile_table import ProjectileTable
 from game_objects.tank import Tank
+from game_objects.tank_table import TankTable
+from game_state import GameState
+from map_cache import MapCache
+from path_pool import PathPool
+from pathfinding.astar import GridAStar, path_cost
+from pathfinding.dstar_lite import DStarLite
+from pathfinding.theta import LazyThetaStar, compress_path, has_line_of_sight
+from state_decoder import StateDecoder
+from targeting import TargetAssigner, solve_assignment
 
 
 class TestAlgorithm(unittest.TestCase):
@@ -68,7 +92,7 @@ class TestAlgorithm(unittest.TestCase):
                  2.877371653791148, 10.0, []),
             Tank('8a54890e-4cfb-45a7-8c51-2b8f2fa503f4', 100.0, 2.0, 2.0, 'TankFast', [563, 123], 0.2789576280213871,
                  1.4528153647376105, 10.0, []),
-            Tank('f147cffe-7f70-424a-972e-5ba6587a5f8e', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 2.61544510482,
+            Tank('f147cffe-7f70-424a-972e-5ba6587a5f8e', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 2.6154451048166374,
                  2.744946885711423, 10.0, []),
             Tank('7c3ed564-7dd4-408f-8800-d6b38a36be6d', 200.0, 2.0, 2.0, 'TankSlow', [27, 90], 5.875311234827194,
                  4.182292475910125, 5.0, [])
@@ -244,5 +268,954 @@ class TestAlgorithm(unittest.TestCase):
         self.assertEquals([], pathmap.get_shortest_path((0, 0), (9, 4)))
 
 
+    def test_map_rasterization_matches_per_metre_writer(self):
+        obstacles = [
+            Obstacle('SOLID', [120, 200], [60, 360]),
+            Obstacle('IMPASSABLE', [365, 283], [57, 401]),
+            Obstacle('SOLID', [361, 0], [59, 119]),
+            Obstacle('NORMAL', [0, 0], [800, 450]),
+            Obstacle('SOLID', [795, 441], [20, 20]),
+            Obstacle('IMPASSABLE', [7, 3], [1, 1]),
+            Obstacle('SOLID', [0, 40], [0, 10])
+        ]
+        original_resolution = Map.RESOLUTION
+        try:
+            for resolution in (1, 2, 5, 10):
+                Map.RESOLUTION = resolution
+                ref_grid = numpy.array(
+                        [[0 for y in range(453 / resolution)] for x in range(803 / resolution)])
+                for obstacle in obstacles:
+                    if obstacle.type == 'NORMAL':
+                        continue
+                    for writer_x in xrange(obstacle.corner[0], obstacle.corner[0] + obstacle.size[0]):
+                        for writer_y in xrange(obstacle.corner[1], obstacle.corner[1] + obstacle.size[1]):
+                            try:
+                                ref_grid[writer_x / resolution][writer_y / resolution] = 1
+                            except IndexError:
+                                pass
+                t_map = Map((803, 453), obstacles)
+                self.assertEqual(t_map.col_grid.dtype, ref_grid.dtype)
+                self.assertEqual(t_map.col_grid.tostring(), ref_grid.tostring())
+
+                single_grid = numpy.zeros(ref_grid.shape, dtype=int)
+                for box in Map.get_obstacle_boxes(obstacles):
+                    Map.rasterize_box(single_grid, box, resolution)
+                self.assertEqual(single_grid.tostring(), ref_grid.tostring())
+        finally:
+            Map.RESOLUTION = original_resolution
+
+
+    def test_grid_astar_search(self):
+        maze = numpy.array([
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 1],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [1, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]])
+        engine = GridAStar(maze)
+        path = engine.search((0, 0), (4, 13))
+        self.assertEqual(path[-1], (4, 13))
+        previous = (0, 0)
+        for cell in path:
+            self.assertTrue(max(abs(cell[0] - previous[0]), abs(cell[1] - previous[1])) == 1)
+            self.assertEqual(maze[cell[0]][cell[1]], 0)
+            previous = cell
+        # Along row 0, through the gap at (1, 12), back along row 2 and through the gap at (3, 1)
+        self.assertAlmostEqual(path_cost((0, 0), path), 31 + 4 * math.sqrt(2))
+        # Search arrays are reused, repeated searches must not see stale scores
+        self.assertEqual(engine.search((0, 0), (4, 13)), path)
+        self.assertEqual(engine.search((0, 0), (1, 0)), [])
+        self.assertEqual(engine.search((2, 2), (2, 2)), [])
+
+        pathmap = Map((800, 450), [Obstacle('SOLID', [0, 200], [790, 10])])
+        path = pathmap.get_shortest_path((5, 5), (5, 445))
+        self.assertEqual(path[-1], (5, 445))
+        self.assertIn((795, 205), path)
+
+
+    def test_distance_field(self):
+        pathmap = Map((200, 100), [Obstacle('SOLID', [50, 0], [10, 80]), Obstacle('IMPASSABLE', [120, 20], [10, 80])])
+        engine = pathmap.get_path_engine()
+        field = pathmap.get_distance_field((195, 5))
+        self.assertEqual(field.goal, (19, 0))
+        for x in xrange(20):
+            for y in xrange(10):
+                if pathmap.col_grid[x][y]:
+                    continue
+                path = engine.search((x, y), (19, 0))
+                self.assertAlmostEqual(field.get_distance((x, y)), path_cost((x, y), path))
+                field_path = field.get_path((x, y))
+                self.assertAlmostEqual(path_cost((x, y), field_path), path_cost((x, y), path))
+                self.assertEqual(field.get_next_step((x, y)), field_path[0] if field_path else None)
+        # Reused while the goal stays in the same cell, evicted least recently used first
+        self.assertIs(pathmap.get_distance_field((191, 9)), field)
+        original_cache_size = Map.DISTANCE_FIELD_CACHE_SIZE
+        try:
+            Map.DISTANCE_FIELD_CACHE_SIZE = 2
+            pathmap = Map((200, 100), [])
+            first = pathmap.get_distance_field((0, 0))
+            second = pathmap.get_distance_field((100, 0))
+            self.assertIs(pathmap.get_distance_field((0, 0)), first)
+            pathmap.get_distance_field((100, 50))
+            self.assertIs(pathmap.get_distance_field((0, 0)), first)
+            self.assertIsNot(pathmap.get_distance_field((100, 0)), second)
+        finally:
+            Map.DISTANCE_FIELD_CACHE_SIZE = original_cache_size
+
+    def test_tick_budget(self):
+        pathmap = Map((800, 450), [Obstacle('SOLID', [120, 200], [60, 360]), Obstacle('SOLID', [360, 0], [60, 120])])
+        complete = Map((800, 450), pathmap.obstacles).get_distance_field((434, 297))
+        # Already past the deadline, the search stops before its first pop
+        field = pathmap.get_distance_field((434, 297), deadline=0)
+        self.assertFalse(field.is_complete())
+        self.assertEqual(field.get_distance((43, 29)), 0.0)
+        self.assertEqual(field.get_distance((44, 29)), float('inf'))
+        self.assertEqual(field.get_distance((7, 20)), float('inf'))
+        self.assertIsNone(field.get_waypoint((7, 20)))
+        # Resumed by the next request for the same goal cell
+        self.assertIs(pathmap.get_distance_field((431, 291)), field)
+        self.assertTrue(field.is_complete())
+        self.assertEqual(list(field.distance), list(complete.distance))
+
+        algo = Algorithm('testclient', 'client-token', tick_budget=0)
+        algo.map = Map((800, 450), pathmap.obstacles)
+        algo.players = [
+            Player('testclient', 0, [Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 0.0, 0.0, 10.0, []),
+                                     Tank('ally_2', 200.0, 2.0, 2.0, 'TankSlow', [27, 90], 0.0, 0.0, 5.0, [])]),
+            Player('testclient2', 0, [Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [434, 297], 0.0, 0.0, 10.0, [])])]
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([action['comm_type'] for action in actions][:3], ['ROTATE_TURRET', 'ROTATE', 'MOVE'])
+        self.assertEqual(len(actions), 8)
+        # Both tanks drive straight at the enemy
+        self.assertAlmostEqual(actions[2]['distance'], math.hypot(434 - 73, 297 - 200))
+        self.assertEqual((algo.ticks, algo.overruns, algo.fallbacks), (1, 1, 2))
+        algo.tick_budget = None
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertLess(actions[2]['distance'], math.hypot(434 - 73, 297 - 200))
+        self.assertEqual((algo.ticks, algo.overruns, algo.fallbacks), (2, 1, 2))
+
+    def test_path_pool(self):
+        pathmap = Map((800, 450), [Obstacle('SOLID', [120, 200], [60, 360]), Obstacle('SOLID', [360, 0], [60, 120])])
+        queries = [((7, 20), (43, 29), 2.0), ((2, 9), (43, 29), 2.0), ((7, 20), (47, 19), 2.0), ((7, 20), (7, 20), 0)]
+        expected = []
+        for start, goal, radius in queries:
+            field = pathmap.get_distance_field(Map.get_cell_centre(goal), radius)
+            expected.append((field.get_distance(start), field.get_waypoint(start)))
+        pool = PathPool(2)
+        try:
+            # Already past the deadline, nothing is answered and the tasks keep running, one per worker
+            self.assertEqual(pool.solve(pathmap, queries, deadline=0), [None] * 4)
+            self.assertEqual(len(pool.running), 2)
+            # Picked up by the next batch asking the same
+            self.assertEqual(pool.solve(pathmap, queries), expected)
+            self.assertEqual((pool.submitted, pool.unfinished), (8, 4))
+            self.assertEqual(pool.running, {})
+            grid_path = pool.get_grid_path(pathmap)
+            self.assertTrue(os.path.exists(grid_path))
+
+            # The goals move while their tasks still take both workers, nothing more is queued behind them
+            pool.running[(grid_path, (43, 29), 2.0)] = [(7, 20)], pool.pool.apply_async(time.sleep, (0.5,))
+            pool.running[(grid_path, (47, 19), 2.0)] = [(7, 20)], pool.pool.apply_async(time.sleep, (0.5,))
+            self.assertEqual(pool.solve(pathmap, queries[3:], deadline=0), [None])
+            self.assertEqual(len(pool.orphaned), 2)
+            self.assertEqual(pool.running, {})
+            # Submitted once a worker is free
+            self.assertEqual(pool.solve(pathmap, queries[3:]), expected[3:])
+            self.assertTrue(len(pool.orphaned) <= 1)
+
+            players = [
+                Player('testclient', 0, [Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 0.0, 0.0, 10.0, []),
+                                         Tank('ally_2', 200.0, 2.0, 2.0, 'TankSlow', [27, 90], 0.0, 0.0, 5.0, [])]),
+                Player('testclient2', 0, [
+                    Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [434, 297], 0.0, 0.0, 10.0, []),
+                    Tank('enemy_2', 200.0, 2.0, 2.0, 'TankSlow', [479, 193], 0.0, 0.0, 5.0, [])])]
+            actions = []
+            for path_pool in (None, pool):
+                algo = Algorithm('testclient', 'client-token', path_pool=path_pool)
+                algo.map = Map((800, 450), pathmap.obstacles)
+                algo.players = players
+                actions.append([json.loads(action) for action in algo.generate_actions()])
+            self.assertEqual(actions[0], actions[1])
+        finally:
+            pool.close()
+        self.assertFalse(os.path.exists(pool.directory))
+
+    def test_generate_actions(self):
+        algo = Algorithm('testclient', 'client-token')
+        algo.map = Map((800, 450), [Obstacle('SOLID', [120, 200], [60, 360]), Obstacle('SOLID', [360, 0], [60, 120])])
+        algo.players = [
+            Player('testclient', 0, [
+                Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 0.0, 0.0, 10.0, []),
+                Tank('ally_2', 200.0, 2.0, 2.0, 'TankSlow', [27, 90], 0.0, 0.0, 5.0, [])
+            ]),
+            Player('testclient2', 0, [
+                Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [434, 297], 0.0, 0.0, 10.0, []),
+                Tank('enemy_2', 200.0, 2.0, 2.0, 'TankSlow', [479, 193], 0.0, 0.0, 5.0, [])
+            ])
+        ]
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([action['comm_type'] for action in actions],
+                         ['ROTATE_TURRET', 'ROTATE', 'MOVE', 'FIRE'] * 2)
+        self.assertEqual(set(action['tank_id'] for action in actions), {'ally_1', 'ally_2'})
+        # One field per enemy cell, shared by both of our tanks
+        self.assertEqual(algo.map.distance_fields[2.0].misses, 2)
+
+
+    def test_map_cache(self):
+        json_map = {'size': [800, 450], 'terrain': [
+            {'boundingBox': {'corner': [120, 200], 'size': [60, 360]}, 'type': 'SOLID'},
+            {'boundingBox': {'corner': [360, 0], 'size': [60, 120]}, 'type': 'IMPASSABLE'}]}
+        reordered_map = {'size': [800, 450], 'terrain': json_map['terrain'][::-1]}
+        other_map = {'size': [800, 450], 'terrain': json_map['terrain'][:1]}
+
+        cache = MapCache(capacity=1)
+        game_map = cache.get_map(json_map)
+        self.assertEqual(game_map, Map((800, 450), [Obstacle('SOLID', [120, 200], [60, 360]),
+                                                    Obstacle('IMPASSABLE', [360, 0], [60, 120])]))
+        # Maps parsed from json, with unicode terrain types, are the same maps
+        self.assertIs(cache.get_map(json.loads(json.dumps(json_map))), game_map)
+        self.assertIs(cache.get_map(reordered_map), game_map)
+        self.assertNotEqual(cache.get_map(other_map), game_map)
+        self.assertIsNot(cache.get_map(json_map), game_map)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache.cache_dir = cache_dir
+            game_map = cache.get_map(other_map)
+            persisted_map = MapCache(cache_dir=cache_dir).get_map(other_map)
+            for name in MapCache.PERSISTED_GRIDS:
+                self.assertIsInstance(getattr(persisted_map, name), numpy.memmap)
+                self.assertEqual(getattr(persisted_map, name).tostring(), getattr(game_map, name).tostring())
+            self.assertEqual(persisted_map.get_inflated_grid(20).tolist(), game_map.get_inflated_grid(20).tolist())
+            self.assertEqual(persisted_map.get_shortest_path((5, 5), (795, 445)),
+                             game_map.get_shortest_path((5, 5), (795, 445)))
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+    def test_hierarchical_pathfinding(self):
+        obstacles = [
+            Obstacle('SOLID', [120, 200], [60, 360]),
+            Obstacle('SOLID', [360, 280], [60, 400]),
+            Obstacle('SOLID', [360, 0], [60, 120]),
+            Obstacle('SOLID', [600, 0], [60, 200])
+        ]
+        original_resolution = Map.RESOLUTION
+        try:
+            for resolution in (5, 10):
+                Map.RESOLUTION = resolution
+                pathmap = Map((800, 450), obstacles)
+                for start, goal in (((774, 201), (73, 200)), ((27, 90), (434, 297)), ((563, 123), (5, 445)),
+                                    ((100, 100), (110, 110)), ((130, 300), (5, 5))):
+                    flat_path = pathmap.get_shortest_path(start, goal)
+                    hierarchical_path = pathmap.get_shortest_path(start, goal, method=PathMethod.HPA)
+                    self.assertEqual(bool(flat_path), bool(hierarchical_path))
+                    if flat_path:
+                        self.assertEqual(hierarchical_path[-1], flat_path[-1])
+                        start_cell = pathmap.get_grid_cell(start)
+                        flat_cost = path_cost(start_cell, [Map.get_cell(point) for point in flat_path])
+                        hierarchical_cost = path_cost(start_cell, [Map.get_cell(point) for point in hierarchical_path])
+                        self.assertTrue(flat_cost - 1e-9 <= hierarchical_cost <= 1.2 * flat_cost)
+        finally:
+            Map.RESOLUTION = original_resolution
+
+
+    def test_jump_point_search(self):
+        # (resolution, size, obstacles, queries) for the maps used by the other map tests
+        arena_obstacles = [
+            Obstacle('SOLID', [120, 200], [60, 360]),
+            Obstacle('SOLID', [360, 280], [60, 400]),
+            Obstacle('SOLID', [360, 0], [60, 120]),
+            Obstacle('SOLID', [600, 0], [60, 200])
+        ]
+        arena_queries = [((774, 201), (73, 200)), ((27, 90), (434, 297)), ((563, 123), (5, 445)), ((130, 300), (5, 5))]
+        maps = [
+            (1, (10, 10), [], [((0, 0), (9, 9)), ((0, 9), (5, 0))]),
+            (1, (10, 5), [Obstacle('SOLID', (0, 1), (9, 1)), Obstacle('IMPASSABLE', (1, 3), (9, 1))],
+             [((0, 0), (9, 4)), ((9, 4), (0, 0)), ((5, 2), (5, 0))]),
+            (1, (10, 5), [Obstacle('SOLID', (0, 2), (10, 1))], [((0, 0), (9, 4))]),
+            (1, (10, 50), [Obstacle('SOLID', [1, 1], [3, 5]), Obstacle('IMPASSABLE', [4, 6], [6, 20]),
+                           Obstacle('SOLID', [0, 40], [30, 1])], [((0, 0), (9, 30)), ((2, 49), (9, 0))]),
+            (5, (800, 450), arena_obstacles, arena_queries),
+            (10, (800, 450), arena_obstacles, arena_queries)
+        ]
+        original_resolution = Map.RESOLUTION
+        try:
+            for resolution, size, obstacles, queries in maps:
+                Map.RESOLUTION = resolution
+                pathmap = Map(size, obstacles, path_method=PathMethod.JPS)
+                for start, goal in queries:
+                    flat_path = pathmap.get_shortest_path(start, goal, method=PathMethod.ASTAR)
+                    jump_point_path = pathmap.get_shortest_path(start, goal)
+                    self.assertEqual(len(jump_point_path) > 0, len(flat_path) > 0)
+                    start_cell = pathmap.get_grid_cell(start)
+                    self.assertAlmostEqual(path_cost(start_cell, [Map.get_cell(point) for point in jump_point_path]),
+                                           path_cost(start_cell, [Map.get_cell(point) for point in flat_path]))
+                    if flat_path:
+                        self.assertEqual(jump_point_path[-1], flat_path[-1])
+        finally:
+            Map.RESOLUTION = original_resolution
+
+    def test_configuration_space(self):
+        original_resolution = Map.RESOLUTION
+        try:
+            Map.RESOLUTION = 1
+            pathmap = Map((20, 10), [Obstacle('SOLID', [8, 0], [4, 6])])
+            clearance = pathmap.get_clearance()
+            self.assertEqual(clearance[8][0], 0)
+            self.assertAlmostEqual(clearance[7][2], 0.5)
+            self.assertAlmostEqual(clearance[5][2], 2.5)
+            self.assertAlmostEqual(clearance[10][8], 1.5)  # top edge of the map is closer than the obstacle
+            self.assertAlmostEqual(clearance[13][7], math.hypot(1.5, 1.5))
+
+            self.assertIs(pathmap.get_inflated_grid(None), pathmap.col_grid)
+            inflated = pathmap.get_inflated_grid(2.0)
+            self.assertIs(pathmap.get_inflated_grid(2), inflated)
+            self.assertTrue(numpy.all(inflated[pathmap.col_grid != 0] == 1))
+            self.assertTrue(numpy.all((inflated == 1) == (clearance < 2.0)))
+
+            # A 2 m tank cannot squeeze past the obstacle at the top edge of the map any more
+            self.assertTrue(pathmap.get_shortest_path((2, 2), (18, 2)))
+            self.assertEqual(pathmap.get_shortest_path((2, 2), (18, 2), radius=2.0), [])
+            path = pathmap.get_shortest_path((2, 2), (18, 2), radius=1.0)
+            self.assertTrue(path)
+            self.assertTrue(all(clearance[x][y] >= 1.0 for x, y in path))
+        finally:
+            Map.RESOLUTION = original_resolution
+
+        # A 2 m tank is a fifth of a default cell: nothing is inflated, yet it may not grind between touching corners
+        pathmap = Map((100, 100), [Obstacle('SOLID', [50, 0], [50, 50]), Obstacle('SOLID', [0, 50], [50, 50])])
+        self.assertEqual(pathmap.get_distance_field((95, 95)).get_distance((4, 4)), math.hypot(5, 5))
+        self.assertEqual(pathmap.get_distance_field((95, 95), 2.0).get_distance((4, 4)), float('inf'))
+        for method in (PathMethod.ASTAR, PathMethod.JPS, PathMethod.HPA):
+            self.assertTrue(pathmap.get_shortest_path((45, 45), (95, 95), method=method))
+            self.assertEqual(pathmap.get_shortest_path((45, 45), (95, 95), method=method, radius=2.0), [])
+        # Nor may a chord pass closer than 2 m to a corner
+        pathmap = Map((100, 100), [Obstacle('SOLID', [50, 50], [10, 10])])
+        self.assertTrue(has_line_of_sight(pathmap.get_path_engine(), (0, 0), (7, 9)))
+        self.assertFalse(has_line_of_sight(pathmap.get_path_engine(2.0), (0, 0), (7, 9)))
+        self.assertTrue(has_line_of_sight(pathmap.get_path_engine(2.0), (0, 0), (9, 5)))
+
+
+    def test_any_angle_paths(self):
+        original_resolution = Map.RESOLUTION
+        try:
+            Map.RESOLUTION = 1
+            pathmap = Map((30, 20), [Obstacle('SOLID', [10, 0], [5, 15])])
+            engine = pathmap.get_path_engine()
+            self.assertTrue(has_line_of_sight(engine, (0, 0), (9, 19)))
+            self.assertFalse(has_line_of_sight(engine, (0, 0), (29, 0)))
+            self.assertFalse(has_line_of_sight(engine, (9, 16), (11, 14)))  # corner squeeze along the diagonal
+
+            path = pathmap.get_shortest_path((2, 2), (25, 2), method=PathMethod.THETA)
+            self.assertEqual(path[-1], (25, 2))
+            self.assertTrue(len(path) <= 5)
+            previous = (2, 2)
+            for point in path:
+                # Legs are straight lines in sight, single grid steps around a corner never cut it
+                self.assertTrue(has_line_of_sight(engine, previous, point))
+                previous = point
+            # The only way on is diagonally between two obstacles
+            squeeze = GridAStar(numpy.array([[0, 1, 0], [1, 0, 0], [0, 0, 0]]))
+            self.assertEqual(LazyThetaStar(squeeze).search((0, 0), (1, 1)), [])
+            self.assertEqual(LazyThetaStar(squeeze).search((2, 0), (0, 2)), [(2, 1), (0, 2)])
+            grid_path = pathmap.get_shortest_path((2, 2), (25, 2))
+            self.assertTrue(path_cost((2, 2), grid_path) > sum(
+                math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip([(2, 2)] + path, path)))
+
+            self.assertEqual(compress_path((0, 0), [(1, 0), (2, 0), (3, 1), (4, 2), (4, 3), (4, 4)]),
+                             [(2, 0), (4, 2), (4, 4)])
+            self.assertEqual(compress_path((0, 0), []), [])
+            turning_points = pathmap.compress_path((2, 2), grid_path)
+            self.assertEqual(turning_points[-1], grid_path[-1])
+            self.assertTrue(set(turning_points) <= set(grid_path))
+            smoothed = pathmap.compress_path((2, 2), grid_path, smooth=True)
+            self.assertTrue(len(smoothed) <= len(turning_points))
+            self.assertEqual(smoothed[-1], grid_path[-1])
+
+            field = pathmap.get_distance_field((25, 2))
+            waypoint = field.get_waypoint((2, 2))
+            self.assertTrue(has_line_of_sight(engine, (2, 2), waypoint))
+            self.assertIn(waypoint, field.get_path((2, 2))[1:])
+        finally:
+            Map.RESOLUTION = original_resolution
+
+    def test_fire_lanes(self):
+        pathmap = Map((400, 200), [Obstacle('SOLID', [150, 0], [20, 100]),
+                                   Obstacle('IMPASSABLE', [150, 120], [20, 80])])
+        self.assertEqual(pathmap.col_grid[15:17, :].tolist(), [[1] * 10 + [0] * 2 + [1] * 8] * 2)
+        self.assertEqual(pathmap.shot_grid[15:17, :].tolist(), [[1] * 10 + [0] * 10] * 2)
+
+        origins = [(50, 50), (50, 160), (50, 110)]
+        targets = [(300, 50), (300, 160), (300, 110)]
+        lanes = pathmap.get_fire_lanes(origins, targets)
+        self.assertEqual(lanes.shape, (3, 3))
+        # Projectiles fly over IMPASSABLE terrain and along the gap above the SOLID block, not through it
+        self.assertEqual(lanes.tolist(), [[False, False, False], [True, True, True], [False, True, True]])
+        segments = [origin + target for origin in origins for target in targets]
+        self.assertEqual([Map.get_lines_of_sight(pathmap.shot_grid, [segment], Map.RESOLUTION)[0]
+                          for segment in segments], lanes.ravel().tolist())
+        self.assertEqual(Map.get_lines_of_sight(pathmap.shot_grid, [], Map.RESOLUTION).tolist(), [])
+        self.assertTrue(Map.get_lines_of_sight(pathmap.shot_grid, [(0, 199, 400, 200)], Map.RESOLUTION)[0])
+        # Clipping the corner of a blocked cell by less than a metre still blocks the line
+        corner_grid = numpy.zeros((20, 20), dtype=int)
+        corner_grid[10, 10] = 1
+        self.assertEqual(Map.get_lines_of_sight(corner_grid, [(80, 120.5, 120.5, 80), (80, 119, 119, 80)], 10).tolist(),
+                         [False, True])
+        # Tanks right next to a wall, in cells the wall partly covers, fire past it at each other
+        walled_map = Map((400, 200), [Obstacle('SOLID', [150, 0], [20, 100]), Obstacle('SOLID', [40, 100], [5, 20]),
+                                      Obstacle('SOLID', [305, 100], [5, 20])])
+        self.assertEqual((walled_map.shot_grid[4, 11], walled_map.shot_grid[30, 11]), (1, 1))
+        self.assertTrue(walled_map.get_fire_lanes([(48, 110)], [(302, 110)])[0, 0])
+        self.assertFalse(walled_map.get_fire_lanes([(35, 110)], [(302, 110)])[0, 0])
+
+        algo = Algorithm('testclient', 'client-token')
+        algo.map = pathmap
+        algo.players = [
+            Player('testclient', 0, [Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [50, 50], 0.0, 0.0, 10.0, [])]),
+            Player('testclient2', 0, [Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [300, 50], 0.0, 0.0, 10.0, [])])
+        ]
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([action['comm_type'] for action in actions], ['ROTATE_TURRET', 'ROTATE', 'MOVE', 'STOP'])
+        self.assertEqual(actions[-1]['control'], 'FIRE')
+        algo.players[1].tanks[0].position = [300, 160]
+        algo.players[0].tanks[0].position = [50, 160]
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual(actions[-1]['comm_type'], 'FIRE')
+
+    def test_projectile_dodging(self):
+        pathmap = Map((800, 450), [Obstacle('SOLID', [200, 0], [20, 100])])
+        ally = Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [100, 50], 0.3, 0.0, 10.0,
+                    [Projectile('p_own', [101, 50], 0.0, 30.0, 30.0, 50.0)])
+        enemy = Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [700, 400], 0.0, 0.0, 10.0,
+                     [Projectile('p_hit', [130, 51], math.pi, 30.0, 30.0, 100.0),
+                      Projectile('p_wall', [300, 50], math.pi, 30.0, 30.0, 300.0),
+                      Projectile('p_short', [90, 50], 0.0, 30.0, 30.0, 5.0)])
+        projectiles = ProjectileTable.from_tanks([ally, enemy])
+        reach = pathmap.get_projectile_reach(projectiles.positions, projectiles.direction, projectiles.range)
+        self.assertEqual(reach[[0, 1, 3]].tolist(), [50.0, 100.0, 5.0])
+        # The SOLID block stops the projectile 80 m out
+        self.assertAlmostEqual(reach[2], 80)
+        impact_times = projectiles.get_impact_times(TankTable.from_tanks([ally]), reach)
+        self.assertEqual(impact_times.shape, (4, 1))
+        self.assertAlmostEqual(impact_times[1, 0], (30 - math.sqrt(3)) / 30)
+        self.assertEqual(impact_times[[0, 2, 3], 0].tolist(), [numpy.inf] * 3)
+        # Without terrain the projectile behind the block flies on into the tank
+        self.assertAlmostEqual(projectiles.get_impact_times(TankTable.from_tanks([ally]))[2, 0], (200 - 2) / 30.0)
+
+        algo = Algorithm('testclient', 'client-token')
+        algo.map = pathmap
+        algo.players = [Player('testclient', 0, [ally]), Player('testclient2', 0, [enemy])]
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([action['comm_type'] for action in actions], ['ROTATE_TURRET', 'ROTATE', 'MOVE', 'FIRE'])
+        # Square to the line of fire is a quarter turn clockwise plus the tracks angle, backing out is shorter
+        self.assertEqual(actions[1]['direction'], 'CCW')
+        self.assertAlmostEqual(actions[1]['rads'], math.pi / 2 - 0.3)
+        self.assertEqual(actions[2]['direction'], 'REV')
+        self.assertAlmostEqual(actions[2]['distance'], 2.0)
+        enemy.projectiles = []
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual(actions[2]['direction'], 'FWD')
+
+    def test_incremental_planning(self):
+        pathmap = Map((800, 450), [Obstacle('SOLID', [120, 200], [60, 360]), Obstacle('SOLID', [360, 0], [60, 120])])
+        engine = pathmap.get_path_engine()
+        planner = DStarLite(engine)
+        start, goal = (5, 22), (45, 5)
+        for tick in xrange(30):
+            path = planner.search(start, goal)
+            self.assertEqual(path[-1], goal)
+            self.assertAlmostEqual(path_cost(start, path), path_cost(start, engine.search(start, goal)))
+            # Start follows its path, the goal drifts away along the bottom edge
+            start = path[0]
+            goal = (goal[0] + tick % 2, goal[1])
+        self.assertEqual(planner.search(start, start), [])
+        # Nothing moved, nothing to repair
+        planner.search(start, goal)
+        planner.search(start, goal)
+        self.assertEqual(planner.last_expansions, 0)
+
+        path = pathmap.get_incremental_path(('ally_1', 'enemy_1'), (73, 200), (434, 297))
+        shortest = pathmap.get_shortest_path((73, 200), (434, 297))
+        self.assertEqual(path[-1], shortest[-1])
+        self.assertAlmostEqual(path_cost((7, 20), [Map.get_cell(point) for point in path]),
+                               path_cost((7, 20), [Map.get_cell(point) for point in shortest]))
+        self.assertIn((('ally_1', 'enemy_1'), 0.0), pathmap.incremental_planners)
+        self.assertEqual(pathmap.get_incremental_path(('ally_1', 'enemy_1'), (73, 200), (73, 200)), [])
+
+        algo = Algorithm('testclient', 'client-token', incremental=True)
+        algo.map = pathmap
+        algo.players = [
+            Player('testclient', 0, [Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 0.0, 0.0, 10.0, [])]),
+            Player('testclient2', 0, [Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [434, 297], 0.0, 0.0, 10.0, []),
+                                      Tank('enemy_2', 100.0, 2.0, 2.0, 'TankFast', [700, 50], 0.0, 0.0, 10.0, [])])]
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([action['comm_type'] for action in actions], ['ROTATE_TURRET', 'ROTATE', 'MOVE', 'STOP'])
+        self.assertEqual(algo.fallbacks, 0)
+        # Every pair got its planner, kept for the next tick
+        self.assertEqual(len(pathmap.incremental_planners), 3)
+        planner = pathmap.get_incremental_planner(('ally_1', 'enemy_1'), 2.0)
+        algo.players[0].tanks[0].position = [80, 200]
+        algo.generate_actions()
+        self.assertIs(pathmap.get_incremental_planner(('ally_1', 'enemy_1'), 2.0), planner)
+        self.assertLess(planner.last_expansions, 10)
+
+    def test_game_state_deltas(self):
+        def raw_tank(tank_id, tank_type, position, alive=True, projectiles=()):
+            return {'id': tank_id, 'type': tank_type, 'alive': alive, 'health': 100.0, 'hitRadius': 2.0,
+                    'collisionRadius': 2.0, 'speed': 10.0, 'position': position, 'tracks': 0.0, 'turret': 0.0,
+                    'projectiles': [{'id': projectile_id, 'position': position, 'direction': 0.0, 'speed': 30.0,
+                                     'damage': 30.0, 'range': 50.0} for projectile_id in projectiles]}
+
+        def raw_state(ally_tanks, enemy_tanks):
+            return {'players': [{'name': 'testclient', 'score': 0, 'tanks': ally_tanks},
+                                {'name': 'testclient2', 'score': 0, 'tanks': enemy_tanks}]}
+
+        state = GameState()
+        delta = state.update(raw_state([raw_tank('a', 'TankFast', [1, 1]), raw_tank('b', 'TankSlow', [2, 2])],
+                                       [raw_tank('c', 'TankFast', [3, 3])]))
+        self.assertEqual(sorted(tank.id for tank in delta.spawned), ['a', 'b', 'c'])
+        tank_a = state.tanks['a']
+        player = state.players[0]
+
+        delta = state.update(raw_state([raw_tank('a', 'TankFast', [5, 1], projectiles=['p']),
+                                        raw_tank('b', 'TankSlow', [2, 2], alive=False)],
+                                       [raw_tank('c', 'TankFast', [3, 3])]))
+        self.assertIs(state.tanks['a'], tank_a)
+        self.assertIs(state.players[0], player)
+        self.assertEqual(tank_a.position, [5, 1])
+        self.assertEqual([projectile.id for projectile in tank_a.projectiles], ['p'])
+        self.assertEqual([tank.id for tank in delta.died], ['b'])
+        self.assertEqual([projectile.id for projectile in delta.fired], ['p'])
+        self.assertFalse(delta.spawned or delta.respawned)
+
+        # The dead slow tank respawns under a new id, the enemy tank disappears
+        delta = state.update(raw_state([raw_tank('a', 'TankFast', [6, 1]), raw_tank('d', 'TankSlow', [9, 9])],
+                                       []))
+        self.assertEqual([(dead.id, new.id) for dead, new in delta.respawned], [('b', 'd')])
+        self.assertEqual([tank.id for tank in delta.died], ['c'])
+        self.assertEqual([projectile.id for projectile in delta.expired], ['p'])
+        self.assertEqual(delta.spawned, [])
+        self.assertEqual([tank.id for tank in state.players[0].tanks], ['a', 'd'])
+
+        delta = state.update(raw_state([raw_tank('a', 'TankFast', [6, 1]), raw_tank('d', 'TankSlow', [9, 9])],
+                                       [raw_tank('e', 'TankSlow', [3, 3])]))
+        self.assertEqual([tank.id for tank in delta.spawned], ['e'])
+        self.assertFalse(delta.died or delta.respawned)
+        self.assertTrue(state.update(raw_state([raw_tank('a', 'TankFast', [7, 1]), raw_tank('d', 'TankSlow', [9, 9])],
+                                               [raw_tank('e', 'TankSlow', [3, 3])])).is_empty())
+
+        # The enemy tank drops out of one GAMESTATE and comes back under the same id
+        allies = [raw_tank('a', 'TankFast', [7, 1]), raw_tank('d', 'TankSlow', [9, 9])]
+        self.assertEqual([tank.id for tank in state.update(raw_state(allies, [])).died], ['e'])
+        delta = state.update(raw_state(allies, [raw_tank('e', 'TankSlow', [3, 3])]))
+        self.assertEqual([(dead.id, new.id) for dead, new in delta.respawned], [('e', 'e')])
+        self.assertFalse(delta.spawned or delta.died)
+        self.assertTrue(state.update(raw_state(allies, [raw_tank('e', 'TankSlow', [3, 3])])).is_empty())
+        # So a new tank of the same type is not taken as its respawn, a tank first reported dead just spawned dead
+        delta = state.update(raw_state(allies, [raw_tank('e', 'TankSlow', [3, 3]), raw_tank('f', 'TankSlow', [4, 4]),
+                                                raw_tank('g', 'TankFast', [5, 5], alive=False)]))
+        self.assertEqual([tank.id for tank in delta.spawned], ['f', 'g'])
+        self.assertEqual([tank.id for tank in delta.died], ['g'])
+        self.assertEqual(delta.respawned, [])
+
+    def test_tank_tables(self):
+        allies = [Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 0.3, 5.9, 10.0, []),
+                  Tank('ally_2', 200.0, 2.0, 3.0, 'TankSlow', [27, 90], 4.0, 1.0, 5.0, [])]
+        enemies = [Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [434, 297], 0.0, 0.0, 10.0, []),
+                   Tank('enemy_2', 200.0, 2.0, 2.0, 'TankSlow', [479, 193], 0.0, 0.0, 5.0, []),
+                   Tank('enemy_3', 100.0, 2.0, 2.0, 'TankFast', [30, 120], 0.0, 0.0, 10.0, [])]
+        ally_table = TankTable.from_tanks(allies)
+        enemy_table = TankTable.from_tanks(enemies)
+        distances = ally_table.get_distances(enemy_table)
+        bearings = ally_table.get_bearings(enemy_table)
+        turret_rotations = ally_table.get_turret_rotations(enemy_table)
+        track_rotations = ally_table.get_track_rotations(enemy_table)
+        for i, ally in enumerate(allies):
+            for j, enemy in enumerate(enemies):
+                self.assertAlmostEqual(distances[i, j], ally.get_dist_to_tank(enemy))
+                self.assertAlmostEqual(bearings[i, j], ally.get_rads_to_tank(enemy) % (2 * math.pi))
+                direction, rads = TankTable.get_direction_rotation(turret_rotations[i, j])
+                expected_direction, expected_rads = ally.get_direction_rotation_turret_to_tank(enemy)
+                self.assertEqual(direction, expected_direction)
+                self.assertAlmostEqual(rads, expected_rads)
+                self.assertEqual(TankTable.get_direction_rotation(track_rotations[i, j])[0],
+                                 ally.get_direction_rotation_track_to_tank(enemy)[0])
+            rows, nearest = ally_table.get_nearest(enemy_table, k=2)
+            self.assertEqual([enemies[j] for j in rows[i]], [tank for _, tank in ally.get_all_dist_tank(enemies)[:2]])
+            self.assertAlmostEqual(nearest[i, 0], ally.get_closest_dist_tank(enemies)[0])
+        self.assertEqual(ally_table.get_nearest(enemy_table, k=5)[0].shape, (2, 3))
+        self.assertEqual(ally_table.get_distances(TankTable.from_tanks([])).shape, (2, 0))
+
+        raw_players = [{'name': 'testclient', 'tanks': [
+            {'id': 'ally_1', 'position': [73, 200], 'tracks': 0.3, 'turret': 5.9, 'health': 100.0, 'hitRadius': 2.0,
+             'collisionRadius': 2.0, 'speed': 10.0, 'projectiles': [
+                {'id': 'p', 'position': [80, 200], 'direction': math.pi / 2, 'speed': 30.0, 'damage': 30.0,
+                 'range': 50.0}]}]}]
+        table = TankTable.from_json(raw_players[0]['tanks'], dtype=numpy.float32)
+        self.assertEqual(table.positions.dtype, numpy.float32)
+        self.assertEqual(table.index, {'ally_1': 0})
+        projectiles = ProjectileTable.from_json(raw_players)
+        self.assertEqual((projectiles.ids, projectiles.owners), (['p'], ['ally_1']))
+        numpy.testing.assert_allclose(projectiles.get_velocities(), [[0.0, 30.0]], atol=1e-9)
+        self.assertAlmostEqual(projectiles.get_distances(table)[0, 0], 7.0)
+
+    def test_intercepts(self):
+        shooters = TankTable.from_tanks([Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [0, 0], 0.0, 0.5, 10.0, [])])
+        targets = TankTable.from_tanks([Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [100, 0], 0.0, 0.0, 10.0, []),
+                                        Tank('enemy_2', 100.0, 2.0, 2.0, 'TankFast', [0, 100], 0.0, 0.0, 10.0, []),
+                                        Tank('enemy_3', 100.0, 2.0, 2.0, 'TankFast', [-50, 0], 0.0, 0.0, 10.0, [])])
+        velocities = [[0, 10], [0, 0], [-40, 0]]
+        rotations, times, in_range = shooters.get_intercepts(targets, velocities, 30.0, 100.0)
+        # |(100, 10 t)| = 30 t
+        self.assertAlmostEqual(times[0, 0], math.sqrt(12.5))
+        self.assertAlmostEqual(rotations[0, 0], math.atan2(10 * math.sqrt(12.5), 100) - 0.5)
+        self.assertFalse(in_range[0, 0])
+        self.assertTrue(shooters.get_intercepts(targets, velocities, 30.0, 110.0)[2][0, 0])
+        # A standing target is aimed at directly
+        self.assertAlmostEqual(times[0, 1], 100 / 30.0)
+        self.assertAlmostEqual(rotations[0, 1], shooters.get_turret_rotations(targets)[0, 1])
+        self.assertTrue(in_range[0, 1])
+        # Too fast to catch
+        self.assertEqual(times[0, 2], numpy.inf)
+        self.assertFalse(in_range[0, 2])
+        self.assertAlmostEqual(rotations[0, 2], shooters.get_turret_rotations(targets)[0, 2])
+
+        state = GameState()
+        for tick in xrange(4):
+            state.update({'timestamp': 1000.0 + 100 * tick, 'players': [{'name': 'testclient2', 'score': 0, 'tanks': [
+                {'id': 'enemy_1', 'type': 'TankFast', 'alive': True, 'health': 100.0, 'hitRadius': 2.0,
+                 'collisionRadius': 2.0, 'speed': 10.0, 'position': [100 + tick, 50 - 0.5 * tick], 'tracks': 0.0,
+                 'turret': 0.0, 'projectiles': [{'id': 'p', 'position': [0, 0], 'direction': 0.0, 'speed': 30.0,
+                                                 'damage': 30.0, 'range': 100.0 - 3 * tick}]}]}]})
+        numpy.testing.assert_allclose(state.get_velocities(['enemy_1', 'unknown']), [[10, -5], [0, 0]])
+        self.assertEqual(state.projectile_specs, {'TankFast': (30.0, 100.0)})
+
+    def test_target_assignment(self):
+        costs = numpy.array([[4.0, 1.0, 3.0], [2.0, 0.0, 5.0], [3.0, 2.0, 2.0]])
+        # Greedy would give the second column to the first row and pay 1 + 2 + 2
+        self.assertEqual(solve_assignment(costs).tolist(), [1, 0, 2])
+        self.assertEqual(solve_assignment(costs[:, :2]).tolist(), [1, 0, -1])
+        self.assertEqual(solve_assignment(costs[:2]).tolist(), [1, 0])
+
+        assigner = TargetAssigner(focus_limit=2, threshold=0.1)
+        allies = ['ally_1', 'ally_2', 'ally_3']
+        enemies = ['enemy_1', 'enemy_2']
+        # Everyone prefers the first enemy, at most two tanks go after it
+        costs = numpy.array([[10.0, 50.0], [20.0, 30.0], [10.0, 100.0]])
+        self.assertEqual(assigner.assign(allies, enemies, costs).tolist(), [0, 1, 0])
+        self.assertEqual(TargetAssigner(focus_limit=1).assign(allies, enemies, costs).tolist(), [0, 1, -1])
+        self.assertEqual(TargetAssigner(focus_limit=3).assign(allies, enemies, costs).tolist(), [0, 0, 0])
+        # Small cost changes keep the assignment, a big one or other tanks solve again
+        assigner.assign(allies, enemies, costs * 1.05)
+        self.assertEqual((assigner.solves, assigner.reuses), (1, 1))
+        self.assertEqual(assigner.assign(allies, enemies, costs + [[0, 0], [50, 0], [0, 0]]).tolist(), [0, 1, 0])
+        assigner.assign(allies[:2], enemies, costs[:2])
+        self.assertEqual((assigner.solves, assigner.reuses), (3, 1))
+
+    def test_safe_shots(self):
+        allies = TankTable.from_tanks([
+            Tank('shooter', 100.0, 2.0, 2.0, 'TankFast', [0, 0], 0.0, 0.0, 10.0, []),
+            Tank('in_line', 100.0, 2.0, 5.0, 'TankFast', [50, 1.5], 0.0, 0.0, 10.0, []),
+            Tank('behind', 100.0, 2.0, 2.0, 'TankFast', [-50, 0], 0.0, 0.0, 10.0, [])])
+        enemies = TankTable.from_tanks([
+            Tank('ahead', 100.0, 2.0, 2.0, 'TankFast', [100, 0], 0.0, 0.0, 10.0, []),
+            Tank('before_ally', 100.0, 2.0, 2.0, 'TankFast', [30, 0], 0.0, 0.0, 10.0, []),
+            Tank('clear', 100.0, 2.0, 2.0, 'TankFast', [0, 100], 0.0, 0.0, 10.0, []),
+            Tank('wide', 100.0, 2.0, 2.0, 'TankFast', [100, 8], 0.0, 0.0, 10.0, [])])
+        safe = allies.get_safe_shots(enemies)
+        # The ally 1.5 m off the line is inside its 2 m hit radius, its 5 m collision radius doesn't matter
+        self.assertEqual(safe[0].tolist(), [False, True, True, True])
+        # The shooter is in the way of the tank behind it, not of the tank in line which shoots away from it
+        self.assertEqual(safe[2].tolist(), [False, False, True, True])
+        self.assertEqual(safe[1].tolist(), [True, True, True, True])
+        self.assertEqual(allies.get_safe_shots(TankTable.from_tanks([])).shape, (3, 0))
+
+    def test_value_objects(self):
+        tank = Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 0.0, 0.0, 10.0,
+                    [Projectile('p2', [1, 1], 0.0, 30.0, 30.0, 50.0), Projectile('p1', [2, 2], 0.0, 30.0, 30.0, 50.0)])
+        copy = Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', (73, 200), 0.0, 0.0, 10.0, tank.projectiles[::-1])
+        self.assertEqual(tank, copy)
+        self.assertEqual(len(set([tank, copy])), 1)
+        self.assertFalse(hasattr(tank, '__dict__'))
+        tanks = set([tank])
+        # Hashed by id, so a tank can be updated in place while it is in a set
+        tank.position = [80, 200]
+        self.assertIn(tank, tanks)
+        self.assertNotEqual(tank, copy)
+        self.assertEqual([value.id for value in sorted([Tank('b', 1, 1, 1, 'T', [0, 0], 0, 0, 1, []), copy])],
+                         ['ally_1', 'b'])
+        self.assertEqual(Obstacle(u'SOLID', [1, 2], [3, 4]), Obstacle('SOLID', (1, 2), (3, 4)))
+        self.assertEqual(hash(Obstacle(u'SOLID', [1, 2], [3, 4])), hash(Obstacle('SOLID', (1, 2), (3, 4))))
+        self.assertEqual(Player('testclient', 0, [tank]), Player('testclient', 0, [tank]))
+        self.assertNotEqual(Player('testclient', 0, [tank]), Player('testclient', 1, [tank]))
+        self.assertNotEqual(tank, None)
+
+    def test_receive_latest(self):
+        messages = ['{"comm_type": "GAMESTATE", "timeRemaining": 3}', '{"comm_type":"GAME_END"}', 'match-token',
+                    '{"timeRemaining": 2, "comm_type": "GAMESTATE"}', '{"comm_type": "GAME_START"}',
+                    '{"comm_type": "GAMESTATE", "timeRemaining": 1}', '{"comm_type": "MatchEnd"}']
+        self.assertEqual(Communication.get_comm_type(messages[1]), 'GAME_END')
+        self.assertIsNone(Communication.get_comm_type(messages[2]))
+        # Only the newest game state is left, every control message stays in order
+        self.assertEqual(Communication.conflate(messages), [messages[i] for i in (1, 2, 4, 5, 6)])
+        self.assertEqual(Communication.conflate(messages[:1]), messages[:1])
+
+        comm = Communication('localhost')
+        publisher = comm.context.socket(zmq.PUB)
+        try:
+            publisher.bind('inproc://test_receive_latest')
+            comm.pub_socket.close(linger=0)
+            comm.pub_socket = comm.context.socket(zmq.SUB)
+            comm.pub_socket.connect('inproc://test_receive_latest')
+            comm.set_subscription('')
+            time.sleep(0.1)
+            for message in messages:
+                publisher.send(message)
+            time.sleep(0.1)
+            self.assertEqual(comm.receive_latest(), [messages[i] for i in (1, 2, 4, 5, 6)])
+            self.assertEqual((comm.received, comm.dropped), (7, 2))
+        finally:
+            publisher.close(linger=0)
+            comm.cmd_socket.setsockopt(zmq.LINGER, 0)
+            comm.close()
+
+    def test_command_encoder(self):
+        encoder = CommandEncoder(u'client-token')
+        tank_id = u'a"b\\c%s'
+        for value in (0, 1.5, 0.1 + 0.2, 1e-17, numpy.float64(math.pi), numpy.float32(2.5), float('inf')):
+            self.assertEqual(json.loads(encoder.encode('MOVE', tank_id, 'FWD', value)),
+                             json.loads(Command.get_movement_command(tank_id, 'FWD', float(value), 'client-token')))
+            self.assertEqual(json.loads(encoder.encode('ROTATE', tank_id, 'CW', value)),
+                             json.loads(Command.get_tank_rotation_command(tank_id, 'CW', float(value), 'client-token')))
+            self.assertEqual(json.loads(encoder.encode('ROTATE_TURRET', tank_id, 'CCW', value)), json.loads(
+                Command.get_turret_rotation_command(tank_id, 'CCW', float(value), 'client-token')))
+        self.assertEqual(json.loads(encoder.encode('FIRE', tank_id)),
+                         json.loads(Command.get_fire_command(tank_id, 'client-token')))
+        self.assertEqual(json.loads(encoder.encode('STOP', tank_id, 'ROTATE')),
+                         json.loads(Command.get_stop_command(tank_id, 'ROTATE', 'client-token')))
+        # Unknown directions go through the builders
+        self.assertEqual(json.loads(encoder.encode('MOVE', tank_id, 'SIDEWAYS', 1.0)),
+                         json.loads(Command.get_movement_command(tank_id, 'SIDEWAYS', 1.0, 'client-token')))
+        self.assertRaises(ValueError, encoder.encode, 'GAMESTATE', tank_id)
+        actions = [('MOVE', 'b', 'REV', 2.0), ('STOP', 'b', 'FIRE', None), ('ROTATE', 'b', 'CW', numpy.float32(0.1)),
+                   ('MOVE', 'b', 'SIDEWAYS', 1.0)]
+        frames = encoder.encode_actions(actions)
+        self.assertEqual([json.loads(frame)['comm_type'] for frame in frames], ['MOVE', 'STOP', 'ROTATE', 'MOVE'])
+        self.assertEqual(frames, [encoder.encode(*action) for action in actions])
+        self.assertTrue(all(isinstance(frame, str) for frame in frames))
+        self.assertEqual(sorted(encoder.templates), [tank_id, 'b'])
+
+    def test_command_filter(self):
+        keep = CommandFilter(angle_tolerance=0.02, distance_tolerance=0.5, refresh_ticks=3)
+        self.assertTrue(keep.keep_rotation('a', 'ROTATE_TURRET', 0.0, 'CCW', 1.0))
+        keep.next_tick()
+        # Turned half way, the same target is a repeat, a different one or the other way round is not
+        self.assertFalse(keep.keep_rotation('a', 'ROTATE_TURRET', 0.5, 'CCW', 0.51))
+        self.assertTrue(keep.keep_rotation('a', 'ROTATE_TURRET', 0.5, 'CCW', 0.6))
+        self.assertTrue(keep.keep_rotation('a', 'ROTATE_TURRET', 0.5, 'CW', 0.5))
+        self.assertTrue(keep.keep_rotation('a', 'ROTATE', 0.0, 'CW', 2 * math.pi - 0.5))
+        self.assertFalse(keep.keep_rotation('a', 'ROTATE', 0.0, 'CW', 2 * math.pi - 0.49))
+        self.assertTrue(keep.keep_movement('a', (0, 0), 'FWD', 10.0))
+        self.assertFalse(keep.keep_movement('a', (3, 4), 'FWD', 5.2))
+        self.assertTrue(keep.keep_movement('a', (3, 4), 'REV', 5.0))
+        self.assertTrue(keep.keep_movement('b', (3, 4), 'FWD', 5.0))
+        self.assertTrue(keep.keep_fire('a', True))
+        self.assertTrue(keep.keep_fire('a', True))
+        self.assertTrue(keep.keep_fire('a', False))
+        self.assertFalse(keep.keep_fire('a', False))
+        # Sent again once refresh_ticks went by
+        for _ in xrange(3):
+            keep.next_tick()
+        self.assertTrue(keep.keep_fire('a', False))
+        self.assertEqual(keep.suppressed, {'ROTATE_TURRET': 1, 'ROTATE': 1, 'MOVE': 1, 'STOP': 1})
+        self.assertAlmostEqual(keep.get_saving(), 4.0 / 15)
+
+        algo = Algorithm('testclient', 'client-token', command_filter=CommandFilter())
+        algo.map = Map((800, 450), [Obstacle('SOLID', [120, 200], [60, 360]), Obstacle('SOLID', [360, 0], [60, 120])])
+        algo.players = [
+            Player('testclient', 0, [Tank('ally_1', 100.0, 2.0, 2.0, 'TankFast', [73, 200], 0.0, 0.0, 10.0, []),
+                                     Tank('ally_2', 200.0, 2.0, 2.0, 'TankSlow', [27, 90], 0.0, 0.0, 5.0, [])]),
+            Player('testclient2', 0, [Tank('enemy_1', 100.0, 2.0, 2.0, 'TankFast', [434, 297], 0.0, 0.0, 10.0, [])])]
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([action['comm_type'] for action in actions],
+                         ['ROTATE_TURRET', 'ROTATE', 'MOVE', 'STOP', 'ROTATE_TURRET', 'ROTATE', 'MOVE', 'FIRE'])
+        # Nothing moved, only the FIRE command is repeated
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([(action['comm_type'], action['tank_id']) for action in actions], [('FIRE', 'ally_2')])
+        # Turned past the enemy, the turret has to come back the other way
+        algo.players[0].tanks[0].turret = 0.5
+        actions = [json.loads(action) for action in algo.generate_actions()]
+        self.assertEqual([(action['comm_type'], action['tank_id']) for action in actions],
+                         [('ROTATE_TURRET', 'ally_1'), ('FIRE', 'ally_2')])
+
+    def test_client_pipeline(self):
+        queue = StageQueue(2)
+        queue.put('GAMESTATE 1', True)
+        queue.put('GAMESTATE 2', True)
+        queue.put('GAME_END')
+        self.assertEqual(queue.dropped, 1)
+        # Full, a stopped producer gives up
+        stop = threading.Event()
+        stop.set()
+        self.assertFalse(queue.put('GAME_START', stop=stop))
+        self.assertEqual([queue.get(), queue.get()], ['GAMESTATE 2', 'GAME_END'])
+        self.assertRaises(Queue.Empty, queue.get, 0)
+
+        class Planner(object):
+            command_filter = None
+
+            def __init__(self):
+                self.states = []
+
+            def parse_game_state(self, json_state_message, parse_map=False):
+                self.states.append((json_state_message['tick'], parse_map))
+
+            def generate_actions(self):
+                return ['{"comm_type": "FIRE", "tick": %d}' % self.states[-1][0]]
+
+        planner = Planner()
+        messages = []
+        comm = Communication('localhost')
+        publisher = comm.context.socket(zmq.PUB)
+        server = comm.context.socket(zmq.REP)
+        try:
+            publisher.bind('inproc://test_client_pipeline')
+            server.bind('inproc://test_client_pipeline_commands')
+            comm.pub_socket.close(linger=0)
+            comm.pub_socket = comm.context.socket(zmq.SUB)
+            comm.pub_socket.connect('inproc://test_client_pipeline')
+            comm.set_subscription('')
+            comm.cmd_socket.close(linger=0)
+            comm.cmd_socket = comm.context.socket(zmq.DEALER)
+            comm.cmd_socket.connect('inproc://test_client_pipeline_commands')
+            time.sleep(0.1)
+            pipeline = ClientPipeline(comm, planner, messages.append)
+            pipeline.start()
+            for message in ['match-token', '{"comm_type": "GAMESTATE", "tick": 1, "map": {"terrain": []}}',
+                            '{"comm_type": "GAME_END"}', '{"comm_type": "GAMESTATE", "tick": 2, "map": {}}',
+                            '{"comm_type": "MatchEnd"}']:
+                publisher.send(message)
+                if 'GAMESTATE' in message:
+                    self.assertTrue(server.poll(1000))
+                    self.assertIn('"tick": %d' % json.loads(message)['tick'], server.recv())
+                    server.send('{"resp": "ok"}')
+            self.assertTrue(pipeline.join(2))
+            # Every game parses its map, control messages reach on_message in order
+            self.assertEqual(planner.states, [(1, True), (2, True)])
+            self.assertEqual(messages, ['match-token', {'comm_type': 'GAME_END'}, {'comm_type': 'MatchEnd'}])
+            self.assertEqual([stage.processed for stage in pipeline.stages], [5, 5, 2])
+            self.assertEqual([stage.error for stage in pipeline.stages], [None, None, None])
+            self.assertEqual(comm.replies, 2)
+            self.assertEqual(comm.errors, {})
+
+            # Cancelled while waiting
+            pipeline = ClientPipeline(comm, planner, messages.append)
+            pipeline.start()
+            pipeline.cancel()
+            self.assertTrue(pipeline.join(2))
+        finally:
+            publisher.close(linger=0)
+            server.close(linger=0)
+            comm.cmd_socket.setsockopt(zmq.LINGER, 0)
+            comm.close()
+
+        class FilteredPlanner(object):
+            # Every tick asks for the same movement
+            def __init__(self):
+                self.command_filter = CommandFilter()
+
+            def parse_game_state(self, json_state_message, parse_map=False):
+                pass
+
+            def generate_actions(self):
+                keep = self.command_filter.keep_movement('a', (0, 0), 'FWD', 10.0)
+                self.command_filter.next_tick()
+                return ['MOVE'] if keep else []
+
+        class Sender(object):
+            def __init__(self):
+                self.batches = []
+
+            def send_batch(self, batch):
+                self.batches.append(batch)
+
+            def collect_replies(self):
+                pass
+
+        planner = FilteredPlanner()
+        sender = Sender()
+        pipeline = ClientPipeline(sender, planner, messages.append)
+        game_state = {'comm_type': 'GAMESTATE'}
+        for _ in xrange(2):
+            pipeline.states.put((game_state, False), True)
+            self.assertTrue(pipeline.planner.step())
+        # The first batch was superseded before it was sent, so the second one still has to move the tank
+        self.assertEqual(pipeline.commands.dropped, 1)
+        self.assertTrue(pipeline.sender.step())
+        self.assertEqual(sender.batches, [['MOVE']])
+        pipeline.states.put((game_state, False), True)
+        self.assertTrue(pipeline.planner.step())
+        self.assertTrue(pipeline.sender.step())
+        self.assertEqual(sender.batches, [['MOVE'], []])
+
+    def test_pipelined_commands(self):
+        commands = ['{"comm_type": "MOVE", "tank_id": "a"}', '{"comm_type": "FIRE", "tank_id": "a"}',
+                    '{"comm_type": "STOP", "tank_id": "b"}', 'not json']
+        for pipelined in (True, False):
+            comm = Communication('localhost', pipelined=pipelined)
+            server = comm.context.socket(zmq.REP)
+
+            def serve():
+                # Only the FIRE command and the invalid one fail
+                for _ in xrange(len(commands) + 1):
+                    message = server.recv()
+                    resp = 'ok' if 'MOVE' in message or 'STOP' in message or 'CONNECT' in message else 'error'
+                    server.send(json.dumps({'resp': resp, 'client_token': 'token'}))
+
+            try:
+                server.bind('inproc://test_pipelined_commands')
+                comm.cmd_socket.close(linger=0)
+                comm.cmd_socket = comm.context.socket(zmq.DEALER if pipelined else zmq.REQ)
+                comm.cmd_socket.connect('inproc://test_pipelined_commands')
+                thread = threading.Thread(target=serve)
+                thread.start()
+                self.assertEqual(comm.send('{"comm_type": "CONNECT"}', 'client_token'), 'token')
+                comm.send_batch(commands)
+                comm.collect_replies(block=True)
+                thread.join()
+                self.assertEqual(len(comm.in_flight), 0)
+                self.assertEqual(comm.replies, len(commands))
+                self.assertEqual(comm.errors, {'FIRE': 1, None: 1})
+            finally:
+                server.close(linger=0)
+                comm.cmd_socket.setsockopt(zmq.LINGER, 0)
+                comm.close()
+
+    def test_state_decoder(self):
+        json_message = {'timeRemaining': 12.5, 'comm_type': 'GAMESTATE', 'players': [
+            {'name': 'testclient', 'score': 0, 'tanks': []}],
+            'map': {'size': [800, 450], 'terrain': [
+                {'boundingBox': {'corner': [120, 200], 'size': [60, 360]}, 'type': 'SOLID'},
+                {'boundingBox': {'corner': [360, 280], 'size': [60, 400]}, 'type': 'IMPASSABLE'}]}}
+        raw_message = json.dumps(json_message)
+        decoder = StateDecoder()
+        self.assertEqual(decoder.decode(raw_message), json_message)
+        skipped = dict(json_message)
+        del skipped['map']
+        self.assertEqual(decoder.decode(raw_message, skip_map=True), skipped)
+        self.assertEqual(decoder.decode(json.dumps(json_message, indent=2), skip_map=True), skipped)
+        empty_map = dict(json_message, map={'terrain': [], 'size': [800, 450]})
+        self.assertEqual(decoder.decode(json.dumps(empty_map), skip_map=True), skipped)
+        self.assertEqual(decoder.fallbacks, 0)
+        # A terrain list that doesn't end at the first '}]' is decoded in full
+        odd_map = dict(json_message, map={'terrain': [{'type': '}]'}], 'size': [800, 450]})
+        self.assertEqual(decoder.decode(json.dumps(odd_map), skip_map=True), skipped)
+        self.assertEqual(decoder.fallbacks, 1)
+        self.assertEqual(decoder.decode('{"comm_type": "GAMEEND"}', skip_map=True), {'comm_type': 'GAMEEND'})
+        self.assertRaises(ValueError, decoder.decode, 'match-token', skip_map=True)
+
+
 if __name__ == '__main__':
     unittest.main()